@@ -1,18 +1,36 @@
+import click
 from flask import Flask
 from config import Config
-from extensions import db, migrate, limiter
-from models import Admin
-from sqlalchemy.exc import ProgrammingError, OperationalError
+from extensions import db, limiter
 
 
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
     app.config.from_object(Config)
 
+    # create_app не ходит в БД и не хэширует паролей: воркер gunicorn
+    # стартует за миллисекунды (админ — `flask admin ensure`, app/admins.py)
     db.init_app(app)
-    migrate.init_app(app, db)
     limiter.init_app(app)
 
+    if click.get_current_context(silent=True) is not None:
+        # Flask-Migrate тянет за собой alembic, а нужен только командам
+        # `flask db …` — приложение, созданное не из CLI, его не импортирует
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from app import admins, answers, schema_cache, page_cache, results_cache, search, survey_purge, tallies
+    from app.journal import journal
+    admins.init_app(app)
+    answers.init_app(app)
+    schema_cache.init_app(app)
+    page_cache.init_app(app)
+    results_cache.init_app(app)
+    search.init_app(app)
+    survey_purge.init_app(app)
+    tallies.init_app(app)
+    journal.init_app(app)
+
     from app.views.admin import admin_bp
     from app.views.public import public_bp
     from app.views.api import api_bp
@@ -21,20 +39,4 @@ def create_app():
     app.register_blueprint(public_bp)
     app.register_blueprint(api_bp, url_prefix="/api")
 
-    # ---- создание / обновление админа ----
-    with app.app_context():
-        try:
-            admin = Admin.query.filter_by(username="admin").first()
-            if admin is None:
-                admin = Admin(username="admin")
-                admin.set_password("admin")
-                db.session.add(admin)
-            else:
-                admin.set_password("admin")  # обновим пароль на 'admin'
-            db.session.commit()
-        except (ProgrammingError, OperationalError):
-            # Таблиц ещё нет (fresh DB, до миграций) – просто игнорируем
-            db.session.rollback()
-    # --------------------------------------
-
     return app
@@ -0,0 +1,65 @@
+"""
+Учётные записи админки.
+
+Админ создаётся явной командой `flask admin ensure` (в docker compose — сразу
+после `flask db upgrade`), а не в create_app: хэширование пароля намеренно
+медленное, и раньше его вместе с записью в БД выполнял каждый стартующий
+воркер gunicorn, наперегонки обновляя одну и ту же строку.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import Admin
+
+admin_cli = AppGroup("admin", help="Учётные записи админки.")
+
+
+def init_app(app):
+    app.cli.add_command(admin_cli)
+
+
+def ensure_admin(username, password, reset_password=False):
+    """
+    Создаёт админа, если его ещё нет; существующему пароль меняется только
+    при reset_password. Повторный и параллельный запуск безопасны
+    (INSERT … ON CONFLICT DO NOTHING). Возвращает "created", "updated" или
+    "exists". Коммит — за вызывающим.
+    """
+    password_hash = generate_password_hash(password)
+    created = db.session.execute(
+        pg_insert(Admin)
+        .values(username=username, password_hash=password_hash)
+        .on_conflict_do_nothing(index_elements=[Admin.username])
+        .returning(Admin.id)
+    ).scalar()
+    if created is not None:
+        return "created"
+    if reset_password:
+        db.session.execute(
+            update(Admin).where(Admin.username == username).values(password_hash=password_hash)
+        )
+        return "updated"
+    return "exists"
+
+
+@admin_cli.command("ensure")
+@click.option("--username", default="admin", show_default=True)
+@click.option(
+    "--password", envvar="ADMIN_PASSWORD", default="admin",
+    help="Пароль нового админа (или переменная ADMIN_PASSWORD); по умолчанию admin.",
+)
+@click.option("--reset-password", is_flag=True, help="Сменить пароль, если админ уже есть.")
+def ensure_command(username, password, reset_password):
+    """Создать админа, если его ещё нет."""
+    status = ensure_admin(username, password, reset_password)
+    db.session.commit()
+    messages = {
+        "created": "создан",
+        "updated": "пароль обновлён",
+        "exists": "уже есть, пароль не менялся",
+    }
+    click.echo(f"Админ {username}: {messages[status]}")
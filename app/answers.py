@@ -0,0 +1,202 @@
+"""
+Хранение ответов: построчно (answer) или упакованно (response.packed_answers).
+
+ANSWER_STORAGE=rows — по строке answer на каждый ответ (как раньше).
+ANSWER_STORAGE=packed — все ответы респондента одним JSONB-массивом в
+response.packed_answers: [[question_id, option_id | "текст"], ...]. Для
+опроса из 60 вопросов это одна строка и ни одной записи индексов answer
+вместо 60+.
+
+Результаты считаются по счётчикам (app/tallies.py), которые обновляются
+при записи в любом режиме. Всё, что читает сырые ответы, читает их через
+answer_rows() — объединение обоих хранилищ, — поэтому опрос может
+содержать ответы в обоих видах одновременно. Перевод накопленных ответов
+между режимами — `flask answers pack` / `flask answers unpack`.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import (
+    Integer, case, column, func, insert, select, text, true, union_all, update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from extensions import db
+from models import Question, Response, Answer
+
+answers_cli = AppGroup("answers", help="Хранилище ответов респондентов.")
+
+# респондентов, переносимых за одну транзакцию командами pack/unpack
+CONVERT_CHUNK_SIZE = 5000
+
+
+def init_app(app):
+    app.cli.add_command(answers_cli)
+
+
+def pack_answers(answers):
+    """Кортежи (question_id, option_id, text_answer) → значение packed_answers."""
+    return [
+        [q_id, option_id if option_id is not None else text_answer]
+        for q_id, option_id, text_answer in answers
+    ]
+
+
+def unpack_answers(packed):
+    """Значение packed_answers → кортежи (question_id, option_id, text_answer)."""
+    return [
+        (q_id, value, None) if isinstance(value, int) else (q_id, None, value)
+        for q_id, value in packed or ()
+    ]
+
+
+# ---------- ЧТЕНИЕ ОБОИХ ХРАНИЛИЩ ----------
+
+def _packed_rows(survey_id=None, question_ids=None, with_key=False):
+    """Упакованные ответы, развёрнутые jsonb_array_elements в строки."""
+    elements = (
+        func.jsonb_array_elements(Response.packed_answers)
+        .table_valued(column("element", JSONB), with_ordinality="ordinal")
+        .render_derived(name="elements")
+    )
+    element = elements.c.element
+    value = element[1]
+    question_id = element[0].astext.cast(Integer)
+
+    stmt = select(
+        Response.id.label("response_id"),
+        question_id.label("question_id"),
+        case((func.jsonb_typeof(value) == "number", value.astext.cast(Integer))).label("option_id"),
+        case((func.jsonb_typeof(value) == "string", value.astext)).label("text_answer"),
+        *([elements.c.ordinal.label("answer_key")] if with_key else []),
+    ).join_from(Response, elements, true()).where(Response.packed_answers.isnot(None))
+    if survey_id is not None:
+        stmt = stmt.where(Response.survey_id == survey_id)
+    elif question_ids is not None:
+        # опрос выводим из вопросов — иначе пришлось бы разворачивать
+        # packed_answers всех респондентов всех опросов
+        stmt = stmt.where(
+            Response.survey_id.in_(select(Question.survey_id).where(Question.id.in_(question_ids)))
+        )
+    if question_ids is not None:
+        stmt = stmt.where(question_id.in_(question_ids))
+    return stmt
+
+
+def answer_rows(survey_id=None, question_ids=None, with_key=False):
+    """
+    Подзапрос ответов из обоих хранилищ с колонками
+    response_id, question_id, option_id, text_answer.
+
+    with_key добавляет answer_key — ключ ответа, уникальный в пределах
+    респондента: answer.id или номер элемента в packed_answers.
+
+    Фильтры по опросу и вопросам применяются внутри каждой ветви, чтобы
+    они работали по индексам answer и response.
+    """
+    rows = select(
+        Answer.response_id, Answer.question_id, Answer.option_id, Answer.text_answer,
+        *([Answer.id.label("answer_key")] if with_key else []),
+    )
+    if question_ids is not None:
+        rows = rows.where(Answer.question_id.in_(question_ids))
+    elif survey_id is not None:
+        rows = rows.where(
+            Answer.question_id.in_(select(Question.id).where(Question.survey_id == survey_id))
+        )
+
+    return union_all(rows, _packed_rows(survey_id, question_ids, with_key)).subquery()
+
+
+# ---------- ПЕРЕВОД МЕЖДУ РЕЖИМАМИ ----------
+
+def _response_chunks(survey_id, condition):
+    """Границы (первый, последний id) порций респондентов, подходящих под condition."""
+    last_id = 0
+    while True:
+        stmt = (
+            select(Response.id)
+            .where(Response.id > last_id, condition)
+            .order_by(Response.id)
+            .limit(CONVERT_CHUNK_SIZE)
+        )
+        if survey_id is not None:
+            stmt = stmt.where(Response.survey_id == survey_id)
+        ids = db.session.execute(stmt).scalars().all()
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last_id = ids[-1]
+
+
+def pack_existing(survey_id=None):
+    """
+    Переносит строки answer в response.packed_answers порциями по
+    CONVERT_CHUNK_SIZE респондентов; каждая порция — своя транзакция.
+    Возвращает число перенесённых респондентов.
+    """
+    has_rows = select(Answer.id).where(Answer.response_id == Response.id).exists()
+    moved = 0
+    for first_id, last_id in _response_chunks(survey_id, has_rows):
+        params = {"first_id": first_id, "last_id": last_id, "survey_id": survey_id}
+        result = db.session.execute(text("""
+            UPDATE response r
+            SET packed_answers = coalesce(r.packed_answers, '[]'::jsonb) || packed.items
+            FROM (
+                SELECT a.response_id,
+                       jsonb_agg(
+                           jsonb_build_array(a.question_id, coalesce(to_jsonb(a.option_id), to_jsonb(a.text_answer)))
+                           ORDER BY a.id
+                       ) AS items
+                FROM answer a
+                WHERE a.response_id BETWEEN :first_id AND :last_id
+                GROUP BY a.response_id
+            ) packed
+            WHERE r.id = packed.response_id
+              AND (CAST(:survey_id AS integer) IS NULL OR r.survey_id = :survey_id)
+        """), params)
+        db.session.execute(text("""
+            DELETE FROM answer a USING response r
+            WHERE a.response_id = r.id
+              AND a.response_id BETWEEN :first_id AND :last_id
+              AND (CAST(:survey_id AS integer) IS NULL OR r.survey_id = :survey_id)
+        """), params)
+        db.session.commit()
+        moved += result.rowcount
+    return moved
+
+
+def unpack_existing(survey_id=None):
+    """Обратный перенос: packed_answers → строки answer. Возвращает число респондентов."""
+    moved = 0
+    for first_id, last_id in _response_chunks(survey_id, Response.packed_answers.isnot(None)):
+        packed = _packed_rows(survey_id).where(Response.id.between(first_id, last_id)).subquery()
+        db.session.execute(insert(Answer).from_select(
+            ["response_id", "question_id", "option_id", "text_answer"],
+            select(packed.c.response_id, packed.c.question_id, packed.c.option_id, packed.c.text_answer),
+        ))
+
+        stmt = (
+            update(Response)
+            .where(Response.id.between(first_id, last_id), Response.packed_answers.isnot(None))
+            .values(packed_answers=None)
+        )
+        if survey_id is not None:
+            stmt = stmt.where(Response.survey_id == survey_id)
+        result = db.session.execute(stmt)
+        db.session.commit()
+        moved += result.rowcount
+    return moved
+
+
+@answers_cli.command("pack")
+@click.option("--survey-id", type=int, default=None, help="Только этот опрос.")
+def pack_command(survey_id):
+    """Перенести ответы из таблицы answer в упакованный вид."""
+    click.echo(f"Упаковано респондентов: {pack_existing(survey_id)}")
+
+
+@answers_cli.command("unpack")
+@click.option("--survey-id", type=int, default=None, help="Только этот опрос.")
+def unpack_command(survey_id):
+    """Перенести упакованные ответы обратно в таблицу answer."""
+    click.echo(f"Распаковано респондентов: {unpack_existing(survey_id)}")
@@ -0,0 +1,330 @@
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from extensions import db
+from models import Response, Answer
+from app.answers import unpack_answers
+
+
+# строк, которые курсор на сервере отдаёт за одно обращение
+EXPORT_FETCH_SIZE = 2000
+
+# строк CSV/NDJSON в одном куске потокового ответа
+EXPORT_CHUNK_ROWS = 500
+
+# строк в одной группе строк (row group) Parquet
+PARQUET_BATCH_ROWS = 10000
+
+# сколько последних поколений Parquet-файла опроса не удалять: прежний
+# может ещё отдавать другой воркер или только что выбрать по имени
+PARQUET_KEEP_GENERATIONS = 2
+# более старые удаляются, только если не менялись столько секунд
+PARQUET_STALE_SECONDS = 600
+# фоновая сборка, чей маркер старше этого (сек), считается оборванной
+PARQUET_BUILD_TIMEOUT = 3600
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- ЧТЕНИЕ ОТВЕТОВ ПОТОКОМ ----------
+
+def iter_response_rows(compiled):
+    """
+    Ответы опроса по одному респонденту: (response_id, created_at, values),
+    values — {question_id: значение}; для вариантов — текст варианта,
+    для multiple_choice — список текстов.
+
+    Строки читаются серверным курсором (yield_per) в порядке response_id,
+    так что в памяти всегда только текущий ответ и одна порция курсора.
+    """
+    option_text = {
+        o.id: o.text for q in compiled.questions for o in q.options
+    }
+    multi = {q.id for q in compiled.questions if q.type == "multiple_choice"}
+
+    stmt = (
+        select(
+            Response.id,
+            Response.created_at,
+            Response.packed_answers,
+            Answer.question_id,
+            Answer.option_id,
+            Answer.text_answer,
+        )
+        .outerjoin(Answer, Answer.response_id == Response.id)
+        .where(Response.survey_id == compiled.id)
+        .order_by(Response.id, Answer.id)
+        .execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+
+    def add(values, q_id, option_id, text_answer):
+        value = option_text.get(option_id) if option_id is not None else text_answer
+        if q_id in multi:
+            values.setdefault(q_id, []).append(value)
+        else:
+            values[q_id] = value
+
+    current_id, current_created, values = None, None, {}
+    for response_id, created_at, packed, q_id, option_id, text_answer in db.session.execute(stmt):
+        if response_id != current_id:
+            if current_id is not None:
+                yield current_id, current_created, values
+            current_id, current_created, values = response_id, created_at, {}
+            # упакованные ответы (app/answers.py) приходят целиком в первой строке
+            for answer in unpack_answers(packed):
+                add(values, *answer)
+
+        if q_id is not None:
+            add(values, q_id, option_id, text_answer)
+
+    if current_id is not None:
+        yield current_id, current_created, values
+
+
+# ---------- ФОРМАТЫ ----------
+
+def _chunked(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= EXPORT_CHUNK_ROWS:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def generate_ndjson(compiled):
+    """По строке JSON на респондента: {"response_id", "created_at", "answers"}."""
+    def lines():
+        for response_id, created_at, values in iter_response_rows(compiled):
+            yield json.dumps({
+                "response_id": response_id,
+                "created_at": created_at.isoformat() if created_at else None,
+                "answers": {str(q_id): value for q_id, value in values.items()},
+            }, ensure_ascii=False) + "\n"
+
+    return _chunked(lines())
+
+
+def generate_csv(compiled):
+    """CSV: response_id, created_at и по колонке на вопрос."""
+    question_ids = [q.id for q in compiled.questions]
+
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return line
+
+        writer.writerow(
+            ["response_id", "created_at"]
+            + [f"{q.id}: {q.text}" for q in compiled.questions]
+        )
+        yield flush()
+
+        for response_id, created_at, values in iter_response_rows(compiled):
+            row = [response_id, created_at.isoformat() if created_at else ""]
+            for q_id in question_ids:
+                value = values.get(q_id)
+                if isinstance(value, list):
+                    value = "; ".join(v for v in value if v is not None)
+                row.append("" if value is None else value)
+            writer.writerow(row)
+            yield flush()
+
+    return _chunked(lines())
+
+
+# ---------- PARQUET ----------
+# Колоночная выгрузка для BI: по колонке на вопрос (q<id>), варианты —
+# их тексты со словарным кодированием. Файл собирается пачками по
+# PARQUET_BATCH_ROWS из того же серверного курсора, что и CSV, и хранится
+# на диске, пока не придёт новый ответ или не изменится схема опроса
+# (и ещё немного после — см. PARQUET_KEEP_GENERATIONS).
+# pyarrow импортируется только здесь — остальному приложению он не нужен.
+
+def _parquet_schema(compiled):
+    import pyarrow as pa
+
+    labels = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        pa.field("response_id", pa.int64(), nullable=False),
+        pa.field("created_at", pa.timestamp("us")),
+    ]
+    for q in compiled.questions:
+        if q.type == "multiple_choice":
+            column_type = pa.list_(labels)
+        elif q.type == "long_text":
+            column_type = pa.string()
+        else:
+            column_type = labels
+        fields.append(pa.field(f"q{q.id}", column_type, metadata={"question": q.text, "type": q.type}))
+    return pa.schema(fields, metadata={"survey_id": str(compiled.id), "title": compiled.title})
+
+
+def _record_batches(compiled, schema):
+    import pyarrow as pa
+
+    question_ids = [q.id for q in compiled.questions]
+
+    def empty():
+        return [], [], {q_id: [] for q_id in question_ids}
+
+    def batch(ids, created, answers):
+        arrays = [pa.array(ids, pa.int64()), pa.array(created, pa.timestamp("us"))]
+        arrays += [
+            pa.array(answers[q_id], schema.field(f"q{q_id}").type) for q_id in question_ids
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    ids, created, answers = empty()
+    for response_id, created_at, values in iter_response_rows(compiled):
+        ids.append(response_id)
+        created.append(created_at)
+        for q_id in question_ids:
+            answers[q_id].append(values.get(q_id))
+
+        if len(ids) >= PARQUET_BATCH_ROWS:
+            yield batch(ids, created, answers)
+            ids, created, answers = empty()
+
+    if ids:
+        yield batch(ids, created, answers)
+
+
+def write_parquet(compiled, path):
+    """Пишет ответы опроса в Parquet пачками — в памяти не больше одной пачки."""
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(compiled)
+    with pq.ParquetWriter(path, schema, compression="zstd", use_dictionary=True) as writer:
+        for batch in _record_batches(compiled, schema):
+            writer.write_batch(batch)
+
+
+def parquet_export(compiled, watermark):
+    """
+    Путь к Parquet-файлу опроса или None, если готового файла ещё нет.
+
+    Файлы лежат в EXPORT_CACHE_DIR (по умолчанию <instance>/exports), имя
+    содержит водяной знак (app.results_cache.ResultsWatermark), поэтому
+    новый ответ сам делает файл устаревшим. Опрос, в котором ответов не
+    больше EXPORT_PARQUET_SYNC_MAX_RESPONSES, собирается прямо в запросе.
+    Больший — в фоновом потоке, не больше одной сборки опроса на все
+    воркеры (маркер survey-<id>.building); пока она идёт, отдаётся последнее
+    готовое поколение файла, а None — только если его нет совсем. Новая
+    сборка начинается не раньше, чем закончится текущая, так что на живом
+    опросе выгрузка отстаёт не больше чем на одну сборку.
+    """
+    # ImportError без pyarrow — в запросе, а не в фоновом потоке
+    import pyarrow.parquet  # noqa: F401
+
+    directory = current_app.config.get("EXPORT_CACHE_DIR") or os.path.join(
+        current_app.instance_path, "exports"
+    )
+    prefix = f"survey-{compiled.id}-"
+    path = os.path.join(
+        directory,
+        f"{prefix}{watermark.schema_version}-{watermark.responses_count}"
+        f"-{watermark.last_response_id or 0}.parquet",
+    )
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    if watermark.responses_count <= current_app.config["EXPORT_PARQUET_SYNC_MAX_RESPONSES"]:
+        _build_parquet(compiled, path)
+        _remove_stale(directory, prefix)
+        return path
+
+    marker = os.path.join(directory, f"survey-{compiled.id}.building")
+    if _claim_build(marker):
+        threading.Thread(
+            target=_build_in_app,
+            args=(current_app._get_current_object(), compiled, path, marker),
+            name=f"parquet-export-{compiled.id}",
+            daemon=True,
+        ).start()
+
+    generations = _generations(directory, prefix)
+    return generations[0][1] if generations else None
+
+
+def _build_parquet(compiled, path):
+    # пишем во временный файл: другие воркеры и потоки видят только готовый
+    partial = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        write_parquet(compiled, partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _claim_build(marker):
+    """Захватывает фоновую сборку опроса; False — её уже ведёт другой поток или воркер."""
+    for _ in range(2):
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(marker) < PARQUET_BUILD_TIMEOUT:
+                    return False
+                os.remove(marker)  # сборщик умер — перехватываем
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _build_in_app(app, compiled, path, marker):
+    directory = os.path.dirname(path)
+    with app.app_context():
+        try:
+            _build_parquet(compiled, path)
+            _remove_stale(directory, f"survey-{compiled.id}-")
+        except Exception:
+            logger.exception("Не удалось собрать Parquet-выгрузку %s", path)
+        finally:
+            try:
+                os.remove(marker)
+            except FileNotFoundError:
+                pass
+
+
+def _generations(directory, prefix):
+    """Готовые файлы опроса [(mtime, путь)], новые первыми."""
+    files = []
+    for name in glob.glob(os.path.join(directory, f"{prefix}*.parquet")):
+        try:
+            files.append((os.path.getmtime(name), name))
+        except FileNotFoundError:
+            pass
+    files.sort(reverse=True)
+    return files
+
+
+def _remove_stale(directory, prefix):
+    """Удаляет старые поколения файлов опроса, кроме последних и недавних."""
+    now = time.time()
+    for modified, name in _generations(directory, prefix)[PARQUET_KEEP_GENERATIONS:]:
+        if now - modified < PARQUET_STALE_SECONDS:
+            continue
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
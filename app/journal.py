@@ -0,0 +1,359 @@
+"""
+Журнал ответов для режима отложенной записи (SUBMISSION_INGEST_MODE=journal).
+
+Проверенный ответ дописывается строкой JSON в сегмент журнала на локальном
+диске, и респондент сразу получает подтверждение. Фоновый поток воркера не
+реже раза в JOURNAL_MAX_FLUSH_DELAY секунд закрывает текущий сегмент и
+переносит накопленное в БД пачками (app.submissions.save_responses).
+
+Жизненный цикл сегмента (имя — <метка писателя>-<номер>, метка процесса —
+<pid>_<время запуска процесса>, чтобы после рестарта контейнера воркер с тем
+же pid, часто 1, не принял сегменты умершего предшественника за свои):
+    <метка>-<n>.open            — в него пишет воркер
+    <метка>-<n>.ready           — закрыт, ждёт записи в БД
+    <метка>-<n>.ready.<метка2>  — захвачен воркером <метка2> (атомарный rename)
+    <метка>-<n>.dead            — записи, которые БД не приняла (dead letter)
+После коммита сегмент удаляется. Сегменты, оставшиеся после падения воркера
+(.open и захваченные умершим процессом), подбирает любой живой воркер — сразу
+при старте приложения в режиме journal — или команда `flask journal flush`.
+
+Если пачка не записалась, записи сегмента пишутся по одной: запись, которую
+БД отвергла (например, опрос или вопрос успели удалить), уходит в .dead
+с ошибкой в логе и не задерживает остальные. При недоступной БД сегмент
+возвращается в очередь.
+
+Доставка «как минимум один раз»: если процесс упадёт между коммитом и
+удалением сегмента, он будет записан повторно; для ответов с is_unique
+повтор отсечёт уникальный индекс.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from extensions import db
+from app.submissions import save_responses
+
+logger = logging.getLogger(__name__)
+
+journal_cli = AppGroup("journal", help="Журнал отложенной записи ответов.")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (ProcessLookupError, OverflowError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Время запуска процесса (в тиках с загрузки ОС) или None, если не узнать."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+            # имя процесса в скобках может содержать пробелы — поля после ")"
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _process_token():
+    pid = os.getpid()
+    # без /proc — время старта воркера: уникально для процесса, но у чужих
+    # процессов его не проверить, и жив ли чужой писатель, решает только pid
+    start = _process_start(pid) or str(time.time_ns())
+    return f"{pid}_{start}"
+
+
+def _token_alive(token):
+    """Жив ли процесс, оставивший метку (свой процесс сюда не попадает)."""
+    pid, _, start = token.partition("_")
+    pid = int(pid)
+    if pid == os.getpid():
+        # pid наш, а метка чужая — это прошлый процесс с тем же pid
+        return False
+    if not _pid_alive(pid):
+        return False
+    current = _process_start(pid)
+    # метка без времени — сегмент старого формата, сверяем только pid
+    return not start or current is None or current == start
+
+
+class SubmissionJournal:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["submission_journal"] = self
+        app.cli.add_command(journal_cli)
+        if (app.config.get("SUBMISSION_INGEST_MODE") == "journal"
+                and click.get_current_context(silent=True) is None):
+            self.start()
+
+    def _reset(self):
+        # состояние, принадлежащее конкретному процессу (после fork — заново)
+        self._pid = os.getpid()
+        self._token = _process_token()
+        self._thread = None
+        self._fd = None
+        self._segment = None
+        self._seq = 0
+        self._pending = 0
+
+    # ---------- НАСТРОЙКИ ----------
+
+    @property
+    def directory(self):
+        return self.app.config.get("JOURNAL_DIR") or os.path.join(
+            self.app.instance_path, "journal"
+        )
+
+    @property
+    def max_flush_delay(self):
+        return float(self.app.config.get("JOURNAL_MAX_FLUSH_DELAY", 2.0))
+
+    @property
+    def batch_size(self):
+        return int(self.app.config.get("JOURNAL_BATCH_SIZE", 500))
+
+    # ---------- ЗАПИСЬ ----------
+
+    def append(self, record):
+        """
+        Дописывает запись в текущий сегмент.
+
+        Данные уходят в ОС системным вызовом write (O_APPEND) и переживают
+        падение процесса; fsync делается только при закрытии сегмента.
+        """
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._fd is None:
+                self._open_segment()
+            os.write(self._fd, line)
+            self._pending += 1
+            pending = self._pending
+            self._ensure_worker()
+
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        self._segment = os.path.join(self.directory, f"{self._token}-{self._seq}.open")
+        self._fd = os.open(self._segment, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _rotate(self):
+        """Закрывает текущий сегмент и помечает его готовым к записи в БД."""
+        with self._lock:
+            if self._fd is None or self._pid != os.getpid():
+                return
+            os.fsync(self._fd)
+            os.close(self._fd)
+            os.rename(self._segment, self._segment[:-len(".open")] + ".ready")
+            self._fd = None
+            self._segment = None
+            self._pending = 0
+
+    # ---------- ФОНОВЫЙ СБРОС ----------
+
+    def start(self):
+        """
+        Запускает фоновый поток, не дожидаясь первого ответа, и сразу
+        подбирает сегменты, оставшиеся от прошлого запуска. Сам create_app
+        при этом в БД не ходит — всё делает поток.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._ensure_worker(recover=True)
+
+    def _ensure_worker(self, recover=False):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(recover,), name="submission-journal", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self, recover=False):
+        if recover:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось сбросить журнал ответов")
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.max_flush_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось сбросить журнал ответов")
+
+    def close(self):
+        """Останавливает фоновый поток и сбрасывает всё накопленное в БД."""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join()
+        self.flush()
+        self._thread = None
+
+    def flush(self):
+        """
+        Закрывает текущий сегмент и записывает в БД все готовые сегменты,
+        включая оставшиеся от упавших процессов. Возвращает число записей.
+        """
+        self._rotate()
+
+        written = 0
+        for claimed in self._claim_segments():
+            written += self._replay(claimed)
+        return written
+
+    def _claim_segments(self):
+        directory = self.directory
+        if not os.path.isdir(directory):
+            return []
+
+        me = self._token
+        claimed = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            base, _, suffix = name.partition(".")
+
+            if suffix == "open":
+                # сегмент писателя, который умер, не успев его закрыть
+                writer = base.split("-")[0]
+                if writer == me or _token_alive(writer):
+                    continue
+                source = path
+            elif suffix == "ready":
+                source = path
+            elif suffix.startswith("ready."):
+                # захвачен процессом, который умер до коммита
+                owner = suffix.split(".", 1)[1]
+                if owner == me or _token_alive(owner):
+                    continue
+                source = path
+            else:
+                continue
+
+            target = os.path.join(directory, f"{base}.ready.{me}")
+            try:
+                os.rename(source, target)
+            except FileNotFoundError:
+                continue  # сегмент успел захватить другой воркер
+            claimed.append(target)
+
+        return claimed
+
+    def _replay(self, path):
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # недописанная строка после падения — ответ не был подтверждён
+                    logger.warning("Пропущена повреждённая строка в %s", path)
+
+        with self.app.app_context():
+            try:
+                save_responses(records)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.warning("Пачка из %s не записалась, пишем по одной записи", path,
+                               exc_info=True)
+                return self._replay_one_by_one(path, records)
+
+        os.remove(path)
+        return len(records)
+
+    def _replay_one_by_one(self, path, records):
+        written = 0
+        dead = []
+        for index, record in enumerate(records):
+            try:
+                save_responses([record])
+                db.session.commit()
+            except DBAPIError as exc:
+                db.session.rollback()
+                if isinstance(exc, OperationalError) or exc.connection_invalidated:
+                    # БД недоступна: незаписанное — обратно в очередь, попробуем позже
+                    self._requeue(path, records[index:])
+                    self._write_dead(path, dead)
+                    raise
+                logger.error("Ответ из %s отвергнут БД, перенесён в dead letter",
+                             path, exc_info=True)
+                dead.append(record)
+            except Exception:
+                db.session.rollback()
+                logger.error("Ответ из %s не записан, перенесён в dead letter",
+                             path, exc_info=True)
+                dead.append(record)
+            else:
+                written += 1
+
+        self._write_dead(path, dead)
+        os.remove(path)
+        return written
+
+    @staticmethod
+    def _write_lines(path, records, flags):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | flags, 0o644)
+        try:
+            os.write(fd, "".join(
+                json.dumps(record, ensure_ascii=False) + "\n" for record in records
+            ).encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _requeue(self, path, records):
+        """Оставляет в сегменте только незаписанные записи и возвращает его в очередь."""
+        base = os.path.basename(path).partition(".")[0]
+        pending = os.path.join(os.path.dirname(path), f"{base}.requeue")
+        self._write_lines(pending, records, os.O_TRUNC)
+        os.rename(pending, os.path.join(os.path.dirname(path), f"{base}.ready"))
+        os.remove(path)
+
+    def _write_dead(self, path, records):
+        if not records:
+            return
+        base = os.path.basename(path).partition(".")[0]
+        dead_path = os.path.join(os.path.dirname(path), f"{base}.dead")
+        self._write_lines(dead_path, records, os.O_APPEND)
+        logger.error("%s ответ(ов) не записано в БД, сохранены в %s", len(records), dead_path)
+
+
+journal = SubmissionJournal()
+
+
+@journal_cli.command("flush")
+def flush_command():
+    """Записать в БД все накопленные сегменты журнала."""
+    written = journal.flush()
+    click.echo(f"Записано ответов: {written}")
@@ -0,0 +1,52 @@
+import hashlib
+
+from flask import current_app, make_response, request
+
+from app.cache import LRUCache
+
+
+# ---------- КЭШ ОТРЕНДЕРЕННЫХ СТРАНИЦ ----------
+
+def init_app(app):
+    app.extensions["page_cache"] = LRUCache(app.config["PAGE_CACHE_SIZE"])
+
+
+def cached_page(key, render):
+    """
+    (etag, body) страницы из кэша воркера; при промахе вызывает render().
+
+    key обязан включать всё, от чего зависит разметка (версия схемы,
+    состояние сессии и т.п.) — инвалидации по времени нет.
+    """
+    cache = current_app.extensions["page_cache"]
+    entry = cache.get(key)
+    if entry is None:
+        body = render().encode("utf-8")
+        entry = (hashlib.sha1(body).hexdigest(), body)
+        cache.set(key, entry)
+    return entry
+
+
+def conditional_response(etag, body, mimetype="text/html"):
+    """Ответ со строгим ETag; при совпадении If-None-Match — 304 без тела."""
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    # браузер обязан перепроверять страницу: «уже отвечал» решается динамически
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def session_page_response(body, mimetype="text/html"):
+    """
+    Ответ для страницы, зависящей от сессии (вошедший админ, flash-сообщения,
+    CSRF-токен): слабый ETag по отрендеренному телу и Cache-Control:
+    private, no-cache. 304 — только если страница совпала целиком, поэтому
+    устаревшую разметку сессии браузер не получит.
+    """
+    data = body.encode("utf-8")
+    response = make_response(data)
+    response.mimetype = mimetype
+    response.set_etag(hashlib.sha1(data).hexdigest(), weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
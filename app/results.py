@@ -0,0 +1,415 @@
+import math
+from bisect import bisect_right
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import select, func, tuple_, BigInteger, Text
+
+from extensions import db
+from models import SurveyTally, OptionTally, ValueTally
+from app.answers import answer_rows
+from app.submissions import CHOICE_TYPES, VALUE_TYPES
+
+
+# свободные ответы, по которым считается числовая сводка (дата — как номер дня)
+NUMERIC_TYPES = ("number", "range", "date")
+
+
+# ---------- СТАТИСТИКА ПО ОПРОСУ ----------
+# Общая для admin.survey_results и api.api_survey_results: весь опрос
+# читается двумя запросами к счётчикам (app/tallies.py) — время зависит
+# от числа вариантов и различных значений, а не от числа ответов.
+
+def _percent(count, total):
+    return round(count * 100.0 / (total or 1), 2)
+
+
+def _sum(column):
+    # sum(bigint) в PostgreSQL — numeric; возвращаем целое
+    return func.sum(column).cast(BigInteger)
+
+
+def _option_counts(survey_id):
+    """{option_id: число выборов} по всем вариантным вопросам опроса."""
+    rows = db.session.execute(
+        select(OptionTally.option_id, _sum(OptionTally.answer_count))
+        .where(OptionTally.survey_id == survey_id)
+        .group_by(OptionTally.option_id)
+    )
+    return dict(rows.all())
+
+
+def _value_counts(survey_id):
+    """
+    [(question_id, value, count)] по свободным ответам опроса.
+
+    Для VALUE_TYPES — по строке на значение; для long_text значения не
+    группируются (value = None), остаётся только общее число ответов.
+    """
+    count = _sum(ValueTally.answer_count)
+    return db.session.execute(
+        select(ValueTally.question_id, ValueTally.value, count)
+        .where(ValueTally.survey_id == survey_id)
+        .group_by(ValueTally.question_id, ValueTally.value_key, ValueTally.value)
+        .order_by(ValueTally.question_id, count.desc(), ValueTally.value)
+    ).all()
+
+
+def response_stats(survey_id):
+    """(число ответов, id последнего, время последнего) по счётчикам опроса."""
+    count, last_id, last_at = db.session.execute(
+        select(
+            func.coalesce(_sum(SurveyTally.response_count), 0),
+            func.max(SurveyTally.last_response_id),
+            func.max(SurveyTally.last_response_at),
+        ).where(SurveyTally.survey_id == survey_id)
+    ).one()
+    return count, last_id, last_at
+
+
+def surveys_response_stats(survey_ids):
+    """{survey_id: (число ответов, время последнего)} для списка опросов — один запрос."""
+    if not survey_ids:
+        return {}
+    rows = db.session.execute(
+        select(
+            SurveyTally.survey_id,
+            _sum(SurveyTally.response_count),
+            func.max(SurveyTally.last_response_at),
+        )
+        .where(SurveyTally.survey_id.in_(survey_ids))
+        .group_by(SurveyTally.survey_id)
+    )
+    return {survey_id: (count, last_at) for survey_id, count, last_at in rows}
+
+
+def survey_results(compiled, with_values=True):
+    """
+    Статистика по опросу — список блоков в порядке вопросов:
+
+        question      — CompiledQuestion
+        type          — тип вопроса
+        options_stats — [{option_id, option_text, count, percent}] для вариантных
+        value_stats   — [{value, count, percent}] для VALUE_TYPES
+                        (для NUMERIC_TYPES — только при with_values)
+        numeric_stats — сводка numeric_summary() для NUMERIC_TYPES, иначе None
+        text_count    — число непустых свободных ответов
+    """
+    percentiles = current_app.config["RESULTS_PERCENTILES"]
+    bins = current_app.config["RESULTS_HISTOGRAM_BINS"]
+
+    option_counts = _option_counts(compiled.id)
+
+    values = {}
+    text_counts = {}
+    for q_id, value, count in _value_counts(compiled.id):
+        text_counts[q_id] = text_counts.get(q_id, 0) + count
+        if value is not None:
+            values.setdefault(q_id, []).append((value, count))
+
+    blocks = []
+    for question in compiled.questions:
+        block = {
+            "question": question,
+            "type": question.type,
+            "options_stats": [],
+            "value_stats": [],
+            "numeric_stats": None,
+            "text_count": 0,
+        }
+
+        if question.type in CHOICE_TYPES:
+            total = sum(option_counts.get(o.id, 0) for o in question.options)
+            block["options_stats"] = [
+                {
+                    "option_id": o.id,
+                    "option_text": o.text,
+                    "count": option_counts.get(o.id, 0),
+                    "percent": _percent(option_counts.get(o.id, 0), total),
+                }
+                for o in question.options
+            ]
+        else:
+            total = text_counts.get(question.id, 0)
+            block["text_count"] = total
+            if question.type in NUMERIC_TYPES:
+                block["numeric_stats"] = numeric_summary(
+                    question.type, values.get(question.id, []), percentiles, bins
+                )
+            if with_values or question.type not in NUMERIC_TYPES:
+                block["value_stats"] = [
+                    {"value": value, "count": count, "percent": _percent(count, total)}
+                    for value, count in values.get(question.id, [])
+                ]
+
+        blocks.append(block)
+
+    return blocks
+
+
+# ---------- ЧИСЛОВАЯ СВОДКА ----------
+# Считается по парам (значение, количество) из счётчиков, то есть за
+# O(различных значений): 10 000 ответов «30» — одна точка с весом 10 000.
+
+def _parse_number(value):
+    try:
+        number = float(value.replace(",", "."))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _parse_date(value):
+    try:
+        return float(date.fromisoformat(value).toordinal())
+    except ValueError:
+        return None
+
+
+def _weighted_percentile(points, cumulative, total, p):
+    """Процентиль с линейной интерполяцией — как у выборки, развёрнутой по весам."""
+    position = p / 100.0 * (total - 1)
+    lower = math.floor(position)
+
+    def at(rank):
+        # первое значение, накопленный вес которого покрывает rank
+        return points[bisect_right(cumulative, rank)][0]
+
+    low_value = at(lower)
+    high_value = at(min(lower + 1, total - 1))
+    return low_value + (high_value - low_value) * (position - lower)
+
+
+def numeric_summary(question_type, value_counts, percentiles, bins):
+    """
+    Сводка по числовым ответам: {count, invalid, mean, stddev, min, max,
+    percentiles: {"p50": ..}, histogram: [{from, to, count}]} или None,
+    если разобрать нечего. Для дат min/max/mean/процентили и границы
+    корзин — ISO-даты, stddev — в днях.
+    """
+    parse = _parse_date if question_type == "date" else _parse_number
+
+    points = []
+    invalid = 0
+    for raw, count in value_counts:
+        value = parse(raw)
+        if value is None:
+            invalid += count
+        else:
+            points.append((value, count))
+    if not points:
+        return None
+
+    points.sort()
+    total = 0
+    cumulative = []
+    for _, count in points:
+        total += count
+        cumulative.append(total)
+
+    mean = sum(value * count for value, count in points) / total
+    variance = sum(count * (value - mean) ** 2 for value, count in points) / total
+    low, high = points[0][0], points[-1][0]
+
+    width = (high - low) / bins if high > low else 0
+    histogram = [0] * (bins if width else 1)
+    for value, count in points:
+        index = min(int((value - low) / width), bins - 1) if width else 0
+        histogram[index] += count
+
+    if question_type == "date":
+        def out(value):
+            return date.fromordinal(round(value)).isoformat()
+    else:
+        def out(value):
+            return round(value, 4)
+
+    return {
+        "count": total,
+        "invalid": invalid,
+        "mean": out(mean),
+        "stddev": round(math.sqrt(variance), 4),
+        "min": out(low),
+        "max": out(high),
+        "percentiles": {
+            f"p{p:g}": out(_weighted_percentile(points, cumulative, total, p))
+            for p in percentiles
+        },
+        "histogram": [
+            {"from": out(low + i * width), "to": out(low + (i + 1) * width if width else high), "count": count}
+            for i, count in enumerate(histogram)
+        ],
+    }
+
+
+# ---------- ТАБЛИЦА СОПРЯЖЁННОСТИ ----------
+# «Ответ на вопрос A в разрезе ответа на вопрос B». Считается одним
+# самосоединением answer по response_id с GROUP BY по паре значений;
+# в Python приходит только таблица размером строки × столбцы.
+
+# вопросы, которые можно положить на ось
+CROSSTAB_TYPES = CHOICE_TYPES + VALUE_TYPES
+
+
+def _axis(question, keys):
+    """Метки оси: варианты в порядке вопроса (включая невыбранные) или значения."""
+    if question.type in CHOICE_TYPES:
+        return [(o.id, o.text) for o in question.options]
+    return [(value, value) for value in keys]
+
+
+def _axis_key(question, rows):
+    """
+    Ключ оси и условие на строки: у вопросов с вариантами — option_id, а
+    свободный текст (его принимает JSON API, и тип вопроса можно сменить
+    при уже собранных ответах) в таблицу не попадает.
+    """
+    if question.type in CHOICE_TYPES:
+        return rows.c.option_id, [rows.c.option_id.isnot(None)]
+    return func.coalesce(rows.c.option_id.cast(Text), rows.c.text_answer), []
+
+
+def crosstab(row_question, col_question):
+    """
+    Таблица сопряжённости двух вопросов (CompiledQuestion из CROSSTAB_TYPES).
+
+    Ячейка — число респондентов с этой парой ответов; для multiple_choice
+    респондент попадает во все выбранные им строки/столбцы. Возвращает dict:
+    rows/cols (метки осей), counts, row_totals, col_totals, total,
+    row_percent, col_percent, chi_square и dof (критерий независимости Пирсона).
+
+    Таблица плотная (строки × столбцы), поэтому у оси со свободными
+    значениями их не больше CROSSTAB_MAX_VALUES; иначе — ValueError,
+    и таблица не строится.
+    """
+    row_answer = answer_rows(question_ids=[row_question.id])
+    col_answer = answer_rows(question_ids=[col_question.id])
+    row_key, row_filter = _axis_key(row_question, row_answer)
+    col_key, col_filter = _axis_key(col_question, col_answer)
+
+    max_values = current_app.config["CROSSTAB_MAX_VALUES"]
+    for question, rows, key, condition in (
+        (row_question, row_answer, row_key, row_filter),
+        (col_question, col_answer, col_key, col_filter),
+    ):
+        if question.type in CHOICE_TYPES:
+            continue
+        # считаем не дальше max_values + 1 разных значений
+        distinct = select(key).select_from(rows).where(*condition).group_by(key).limit(max_values + 1)
+        if db.session.scalar(select(func.count()).select_from(distinct.subquery())) > max_values:
+            raise ValueError(f"вопрос {question.id}: больше {max_values} разных значений")
+
+    cells = db.session.execute(
+        select(row_key, col_key, func.count())
+        .select_from(row_answer)
+        .join(col_answer, col_answer.c.response_id == row_answer.c.response_id)
+        .where(*row_filter, *col_filter)
+        .group_by(row_key, col_key)
+    ).all()
+
+    counts = {}
+    row_seen, col_seen = {}, {}
+    for r, c, count in cells:
+        counts[(r, c)] = count
+        row_seen[r] = row_seen.get(r, 0) + count
+        col_seen[c] = col_seen.get(c, 0) + count
+
+    # свободные значения — по убыванию частоты
+    rows = _axis(row_question, sorted(row_seen, key=lambda k: (-row_seen[k], k)))
+    cols = _axis(col_question, sorted(col_seen, key=lambda k: (-col_seen[k], k)))
+
+    matrix = [[counts.get((r, c), 0) for c, _ in cols] for r, _ in rows]
+    row_totals = [sum(line) for line in matrix]
+    col_totals = [sum(column) for column in zip(*matrix)] if matrix else []
+    total = sum(row_totals)
+
+    chi_square = 0.0
+    for i, line in enumerate(matrix):
+        for j, observed in enumerate(line):
+            expected = row_totals[i] * col_totals[j] / total if total else 0
+            if expected:
+                chi_square += (observed - expected) ** 2 / expected
+    dof = max(sum(1 for t in row_totals if t) - 1, 0) * max(sum(1 for t in col_totals if t) - 1, 0)
+
+    return {
+        "rows": [{"key": k, "label": label} for k, label in rows],
+        "cols": [{"key": k, "label": label} for k, label in cols],
+        "counts": matrix,
+        "row_totals": row_totals,
+        "col_totals": col_totals,
+        "total": total,
+        "row_percent": [
+            [_percent(count, row_totals[i]) for count in line] for i, line in enumerate(matrix)
+        ],
+        "col_percent": [
+            [_percent(count, col_totals[j]) for j, count in enumerate(line)] for line in matrix
+        ],
+        "chi_square": round(chi_square, 4),
+        "dof": dof,
+    }
+
+
+# ---------- ТЕКСТОВЫЕ ОТВЕТЫ ----------
+
+def _non_empty_text(rows):
+    return (rows.c.text_answer.isnot(None), rows.c.text_answer != "")
+
+
+def text_answer_samples(question_ids, per_question):
+    """
+    Первые per_question текстовых ответов каждого вопроса — одним запросом
+    (row_number() по вопросу). Возвращает {question_id: [тексты]}.
+    """
+    if not question_ids:
+        return {}
+
+    rows = answer_rows(question_ids=question_ids)
+    position = func.row_number().over(
+        partition_by=rows.c.question_id, order_by=rows.c.response_id,
+    ).label("position")
+    numbered = (
+        select(rows.c.question_id, rows.c.text_answer, position)
+        .where(*_non_empty_text(rows))
+        .subquery()
+    )
+    result = db.session.execute(
+        select(numbered.c.question_id, numbered.c.text_answer)
+        .where(numbered.c.position <= per_question)
+        .order_by(numbered.c.question_id, numbered.c.position)
+    )
+
+    samples = {}
+    for q_id, text_answer in result:
+        samples.setdefault(q_id, []).append(text_answer)
+    return samples
+
+
+def text_answers_page(question_id, after=None, limit=100):
+    """
+    Страница текстовых ответов на вопрос по ключу (keyset) в порядке
+    (id респондента, answer_key): у респондента может быть несколько
+    текстовых ответов на один вопрос (их принимает JSON API), поэтому
+    курсор — пара, а не id респондента. Читаются только response_id,
+    ключ ответа и text_answer.
+
+    after — курсор предыдущей страницы. Возвращает (тексты, курсор
+    следующей страницы (response_id, answer_key) или None).
+    """
+    rows = answer_rows(question_ids=[question_id], with_key=True)
+    stmt = select(rows.c.response_id, rows.c.answer_key, rows.c.text_answer).where(
+        *_non_empty_text(rows)
+    )
+    if after is not None:
+        response_id, answer_key = after
+        stmt = stmt.where(
+            # первое условие — для индекса (question_id, response_id)
+            rows.c.response_id >= response_id,
+            tuple_(rows.c.response_id, rows.c.answer_key) > tuple_(response_id, answer_key),
+        )
+    page = db.session.execute(
+        stmt.order_by(rows.c.response_id, rows.c.answer_key).limit(limit + 1)
+    ).all()
+
+    last = page[limit - 1] if len(page) > limit else None
+    next_cursor = (last.response_id, last.answer_key) if last else None
+    return [row.text_answer for row in page[:limit]], next_cursor
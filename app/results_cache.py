@@ -0,0 +1,61 @@
+import hashlib
+import time
+from typing import NamedTuple, Optional
+
+from flask import current_app
+
+from app.cache import LRUCache
+from app.results import response_stats
+
+
+# ---------- КЭШ ПОСЧИТАННЫХ РЕЗУЛЬТАТОВ ----------
+# Дашборды опрашивают результаты каждые несколько секунд. Результаты опроса
+# меняются только с новой версией схемы или новым ответом, поэтому кэш
+# воркера хранит посчитанное вместе с «водяным знаком» — и отдаёт его, пока
+# знак не сдвинулся. Тот же знак даёт ETag: клиент, у которого всё актуально,
+# получает 304 без тела.
+
+
+class ResultsWatermark(NamedTuple):
+    schema_version: int
+    responses_count: int
+    last_response_id: Optional[int]
+
+
+def init_app(app):
+    app.extensions["results_cache"] = LRUCache(app.config["RESULTS_CACHE_SIZE"])
+
+
+def results_watermark(survey):
+    """Текущий водяной знак опроса — один запрос к survey_tally."""
+    count, last_id, _ = response_stats(survey.id)
+    return ResultsWatermark(survey.schema_version, count, last_id)
+
+
+def cached_results(kind, survey, compute):
+    """
+    (etag, данные) результатов опроса; при промахе — compute(watermark).
+
+    kind различает представления (API, админка), которые кэшируют разное.
+    Пока версия схемы прежняя, запись младше RESULTS_CACHE_STALE_SECONDS
+    отдаётся и после новых ответов — у очень активных опросов результаты
+    пересчитываются не чаще раза в это окно.
+    """
+    cache = current_app.extensions["results_cache"]
+    key = (kind, survey.id)
+    watermark = results_watermark(survey)
+    now = time.monotonic()
+
+    entry = cache.get(key)
+    if entry is not None:
+        entry_watermark, computed_at, etag, data = entry
+        if entry_watermark == watermark:
+            return etag, data
+        stale_for = current_app.config["RESULTS_CACHE_STALE_SECONDS"]
+        if entry_watermark.schema_version == watermark.schema_version and now - computed_at < stale_for:
+            return etag, data
+
+    data = compute(watermark)
+    etag = hashlib.sha1(repr(key + tuple(watermark)).encode("utf-8")).hexdigest()
+    cache.set(key, (watermark, now, etag, data))
+    return etag, data
@@ -0,0 +1,162 @@
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+from models import Survey, Question, Option
+from app.cache import LRUCache, TTLCache
+
+
+# ---------- СКОМПИЛИРОВАННАЯ СХЕМА ОПРОСА ----------
+# Неизменяемые кортежи: их можно безопасно делить между запросами и потоками,
+# а шаблоны обращаются к полям так же, как к атрибутам моделей.
+
+class CompiledOption(NamedTuple):
+    id: int
+    text: str
+
+
+class CompiledQuestion(NamedTuple):
+    id: int
+    text: str
+    type: str
+    options: tuple
+
+
+class CompiledSurvey(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    is_active: bool
+    version: int
+    questions: tuple
+    # {question_id: (type, frozenset(option_ids))} — для валидации ответов
+    answer_schema: MappingProxyType
+
+
+def compile_survey(survey: Survey) -> CompiledSurvey:
+    """Собирает дерево вопросов и вариантов опроса одним запросом."""
+    rows = (
+        db.session.query(
+            Question.id, Question.text, Question.type, Option.id, Option.text,
+        )
+        .outerjoin(Option, Option.question_id == Question.id)
+        .filter(Question.survey_id == survey.id)
+        .order_by(Question.id, Option.id)
+        .all()
+    )
+
+    questions = {}
+    options = {}
+    for q_id, q_text, q_type, o_id, o_text in rows:
+        questions[q_id] = (q_text, q_type)
+        bucket = options.setdefault(q_id, [])
+        if o_id is not None:
+            bucket.append(CompiledOption(o_id, o_text))
+
+    compiled_questions = tuple(
+        CompiledQuestion(q_id, q_text, q_type, tuple(options[q_id]))
+        for q_id, (q_text, q_type) in questions.items()
+    )
+    answer_schema = {
+        q.id: (q.type, frozenset(o.id for o in q.options))
+        for q in compiled_questions
+    }
+
+    return CompiledSurvey(
+        id=survey.id,
+        title=survey.title,
+        description=survey.description,
+        is_active=survey.is_active,
+        version=survey.schema_version,
+        questions=compiled_questions,
+        answer_schema=MappingProxyType(answer_schema),
+    )
+
+
+def load_survey_tree(survey_id: int) -> Optional[Survey]:
+    """
+    Опрос с вопросами (question_list) и их вариантами (option_list) —
+    модели ORM для страниц, которым нужны не кортежи схемы, а сами объекты
+    (редактирование в админке). Три запроса при любом числе вопросов:
+    опрос, его вопросы и варианты всех вопросов (selectinload).
+    Помеченный удалённым опрос — как несуществующий (None).
+    """
+    return db.session.scalars(
+        select(Survey)
+        .where(Survey.id == survey_id, Survey.deleted_at.is_(None))
+        .options(selectinload(Survey.question_list).selectinload(Question.option_list))
+    ).first()
+
+
+# ---------- КЭШ ----------
+
+def init_app(app):
+    app.extensions["schema_cache"] = LRUCache(app.config["SCHEMA_CACHE_SIZE"])
+    app.extensions["active_surveys_cache"] = TTLCache(
+        maxsize=1, ttl=app.config["ACTIVE_SURVEYS_TTL"]
+    )
+
+
+def _cache() -> LRUCache:
+    return current_app.extensions["schema_cache"]
+
+
+def get_compiled_survey(survey: Survey) -> CompiledSurvey:
+    """
+    Скомпилированная схема опроса из кэша воркера.
+
+    Ключ — (id, schema_version): версия приходит вместе со строкой опроса,
+    поэтому при неизменной схеме запросов к вопросам и вариантам нет вовсе.
+    """
+    key = (survey.id, survey.schema_version)
+    compiled = _cache().get(key)
+    if compiled is None:
+        compiled = compile_survey(survey)
+        _cache().set(key, compiled)
+    return compiled
+
+
+def bump_schema_version(survey_id):
+    """
+    Увеличивает версию схемы опроса (вызывать в транзакции изменения).
+
+    Остальные воркеры увидят новую версию в строке опроса и перекомпилируют
+    схему сами; из локального кэша старые версии убираем сразу.
+    """
+    db.session.execute(
+        update(Survey)
+        .where(Survey.id == survey_id)
+        .values(schema_version=Survey.schema_version + 1)
+    )
+    _cache().discard_where(lambda key: key[0] == survey_id)
+
+
+# ---------- СПИСОК АКТИВНЫХ ОПРОСОВ ----------
+
+def get_active_surveys():
+    """
+    Активные опросы (id, title, description, is_active) — общий для всех
+    запросов воркера список с коротким TTL (ACTIVE_SURVEYS_TTL).
+    """
+    cache = current_app.extensions["active_surveys_cache"]
+    surveys = cache.get("active")
+    if surveys is None:
+        surveys = tuple(
+            db.session.query(
+                Survey.id, Survey.title, Survey.description, Survey.is_active,
+            )
+            .filter(Survey.is_active.is_(True))
+            .order_by(Survey.id)
+            .all()
+        )
+        cache.set("active", surveys)
+    return surveys
+
+
+def invalidate_active_surveys():
+    """Сбрасывает список в этом воркере; остальные обновятся по TTL."""
+    current_app.extensions["active_surveys_cache"].clear()
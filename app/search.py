@@ -0,0 +1,166 @@
+"""
+Полнотекстовый поиск по свободным ответам (text, long_text) опроса.
+
+Основной вариант (TEXT_SEARCH_BACKEND=postgres) — колонка
+answer.text_search (tsvector, конфигурация russian) с GIN-индексом:
+вектор при вставке считает триггер в БД (models.py), поиск — websearch_to_tsquery с
+ранжированием ts_rank. Ищутся ответы, хранящиеся строками answer:
+упакованные (ANSWER_STORAGE=packed, app/answers.py) в поиск не попадают.
+
+Запасной вариант для локальной разработки и тестов (memory) —
+инвертированный индекс в памяти воркера на каждый опрос. Он дочитывает
+только ответы с id больше уже проиндексированных, так что поиск не
+пересматривает все ответы на каждый запрос. Индекс без стемминга и может
+пропустить ответ, закоммиченный позже ответа с большим id, — для
+продакшена он не предназначен.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from flask import current_app
+from sqlalchemy import cast, func, literal, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from extensions import db
+from models import Answer
+from app.cache import LRUCache
+
+
+# типы вопросов, ответы на которые ищутся
+SEARCH_TYPES = ("text", "long_text")
+
+# конфигурация текстового поиска — та же, что в триггере answer.text_search
+SEARCH_CONFIG = "russian"
+
+# индексов опросов в памяти воркера (запасной вариант)
+MEMORY_INDEX_SURVEYS = 32
+
+_TOKEN = re.compile(r"\w+")
+
+
+def init_app(app):
+    app.extensions["search_indexes"] = LRUCache(MEMORY_INDEX_SURVEYS)
+
+
+def search_answers(compiled, query, question_id=None, limit=20):
+    """
+    Ответы опроса, подходящие под запрос, по убыванию релевантности:
+    [{answer_id, response_id, question_id, text, rank}].
+
+    question_id сужает поиск до одного вопроса.
+    """
+    question_ids = [
+        q.id for q in compiled.questions
+        if q.type in SEARCH_TYPES and (question_id is None or q.id == question_id)
+    ]
+    if not question_ids or not query.strip():
+        return []
+
+    if current_app.config["TEXT_SEARCH_BACKEND"] == "memory":
+        return _memory_search(compiled, question_ids, query, limit)
+    return _postgres_search(question_ids, query, limit)
+
+
+# ---------- POSTGRESQL ----------
+
+def _postgres_search(question_ids, query, limit):
+    tsquery = func.websearch_to_tsquery(cast(literal(SEARCH_CONFIG), REGCONFIG), query)
+    rank = func.ts_rank(Answer.text_search, tsquery)
+
+    rows = db.session.execute(
+        select(Answer.id, Answer.response_id, Answer.question_id, Answer.text_answer, rank)
+        .where(
+            Answer.question_id.in_(question_ids),
+            Answer.text_search.op("@@")(tsquery),
+        )
+        .order_by(rank.desc(), Answer.id)
+        .limit(limit)
+    )
+    return [_hit(*row) for row in rows]
+
+
+def _hit(answer_id, response_id, question_id, text, rank):
+    return {
+        "answer_id": answer_id,
+        "response_id": response_id,
+        "question_id": question_id,
+        "text": text,
+        "rank": round(float(rank), 6),
+    }
+
+
+# ---------- ЗАПАСНОЙ ИНДЕКС В ПАМЯТИ ----------
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    """Термин → {answer_id: частота} по ответам одного опроса."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def add(self, answer_id, response_id, question_id, text):
+        self.documents[answer_id] = (response_id, question_id, text)
+        for term, frequency in Counter(tokenize(text)).items():
+            self.postings[term][answer_id] = frequency
+        self.last_id = max(self.last_id, answer_id)
+
+    def search(self, query, question_ids, limit):
+        """Ответы, содержащие все слова запроса; ранг — сумма tf·idf."""
+        terms = set(tokenize(query))
+        postings = [self.postings.get(term) for term in terms]
+        if not postings or not all(postings):
+            return []
+
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        allowed = set(question_ids)
+        total = len(self.documents)
+
+        scored = []
+        for answer_id in candidates:
+            response_id, question_id, text = self.documents[answer_id]
+            if question_id not in allowed:
+                continue
+            rank = sum(p[answer_id] * math.log(1 + total / len(p)) for p in postings)
+            scored.append((-rank, answer_id, response_id, question_id, text))
+
+        scored.sort()
+        return [
+            _hit(answer_id, response_id, question_id, text, -rank)
+            for rank, answer_id, response_id, question_id, text in scored[:limit]
+        ]
+
+
+def _memory_search(compiled, question_ids, query, limit):
+    cache = current_app.extensions["search_indexes"]
+    key = (compiled.id, compiled.version)
+    index = cache.get(key)
+    if index is None:
+        index = InvertedIndex()
+        cache.set(key, index)
+
+    with index.lock:
+        # дочитываем ответы, появившиеся после прошлого поиска
+        rows = db.session.execute(
+            select(Answer.id, Answer.response_id, Answer.question_id, Answer.text_answer)
+            .where(
+                Answer.question_id.in_(
+                    [q.id for q in compiled.questions if q.type in SEARCH_TYPES]
+                ),
+                Answer.id > index.last_id,
+                Answer.text_answer.isnot(None),
+            )
+            .order_by(Answer.id)
+        )
+        for row in rows:
+            index.add(*row)
+
+        return index.search(query, question_ids, limit)
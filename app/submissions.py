@@ -0,0 +1,245 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from extensions import db
+from models import Response, Answer
+from app.answers import pack_answers
+
+
+# типы вопросов, ответ на которые — вариант(ы) из списка
+CHOICE_TYPES = ("single_choice", "multiple_choice")
+
+# типы вопросов со свободным ответом
+TEXT_TYPES = ("text", "long_text", "number", "range", "date")
+
+# свободные ответы, которые в результатах группируются по значению (long_text — нет)
+VALUE_TYPES = ("text", "number", "range", "date")
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- РАЗБОР ОТВЕТОВ ----------
+# schema — CompiledSurvey.answer_schema: {question_id: (type, frozenset(option_ids))}.
+# Ответ — кортеж (question_id, option_id, text_answer).
+
+def parse_form_answers(schema, form):
+    """Ответы из HTML-формы public/survey_fill.html, проверенные по схеме в памяти."""
+    answers = []
+
+    for q_id, (q_type, option_ids) in schema.items():
+        if q_type == "single_choice":
+            option_id = _to_int(form.get(f"question_{q_id}"))
+            if option_id in option_ids:
+                answers.append((q_id, option_id, None))
+
+        elif q_type == "multiple_choice":
+            chosen = (_to_int(v) for v in form.getlist(f"question_{q_id}_multi"))
+            # dict.fromkeys — убираем повторы, сохраняя порядок
+            for option_id in dict.fromkeys(chosen):
+                if option_id in option_ids:
+                    answers.append((q_id, option_id, None))
+
+        elif q_type in TEXT_TYPES:
+            value = form.get(f"question_{q_id}", "").strip()
+            if value:
+                answers.append((q_id, None, value))
+
+    return answers
+
+
+def parse_json_answers(schema, items):
+    """Ответы из JSON API ([{"question_id": .., "option_id" | "text_answer": ..}])."""
+    answers = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        q_id = _to_int(item.get("question_id"))
+        if q_id not in schema:
+            continue
+
+        q_type, option_ids = schema[q_id]
+
+        if q_type == "single_choice":
+            option_id = _to_int(item.get("option_id"))
+            if option_id in option_ids:
+                answers.append((q_id, option_id, None))
+
+        else:  # text
+            text_answer = item.get("text_answer", "")
+            if not text_answer or not isinstance(text_answer, str):
+                continue
+            text_answer = text_answer.strip()
+            if text_answer:
+                answers.append((q_id, None, text_answer))
+
+    return answers
+
+
+# ---------- СОХРАНЕНИЕ ----------
+
+def _packed():
+    return current_app.config["ANSWER_STORAGE"] == "packed"
+
+
+def save_response(survey_id, ip_address, answers, client_token=None, unique=True):
+    """
+    Записывает Response и все его Answer.
+
+    Число запросов не зависит от количества ответов: один INSERT … RETURNING
+    для Response и один пакетный INSERT для всех Answer. При
+    ANSWER_STORAGE=packed ответы пишутся в сам Response (app/answers.py),
+    и второго INSERT нет. Коммит — за вызывающим.
+
+    При unique=True повтор (тот же IP или client_token в этом опросе) отсекает
+    уникальный частичный индекс: INSERT … ON CONFLICT DO NOTHING не вставит
+    строку, и функция вернёт None — «уже отвечал».
+
+    Счётчики результатов (app/tallies.py) обновляются в той же транзакции.
+    """
+    # app.tallies сам импортирует типы вопросов из этого модуля
+    from app.tallies import record_responses
+
+    packed = _packed()
+    created_at = datetime.utcnow()
+    response_id = db.session.execute(
+        pg_insert(Response)
+        .values(
+            survey_id=survey_id,
+            ip_address=ip_address,
+            client_token=client_token,
+            is_unique=unique,
+            created_at=created_at,
+            packed_answers=pack_answers(answers) if packed else None,
+        )
+        .on_conflict_do_nothing()
+        .returning(Response.id)
+    ).scalar_one_or_none()
+
+    if response_id is None:
+        return None
+
+    if answers and not packed:
+        db.session.execute(
+            insert(Answer),
+            [
+                {
+                    "response_id": response_id,
+                    "question_id": q_id,
+                    "option_id": option_id,
+                    "text_answer": text_answer,
+                }
+                for q_id, option_id, text_answer in answers
+            ],
+        )
+
+    record_responses([(survey_id, response_id, created_at, answers)])
+
+    return response_id
+
+
+# ---------- ПАКЕТНАЯ ЗАПИСЬ ----------
+# Запись (record) — проверенный ответ респондента в JSON-совместимом виде:
+# так он хранится в журнале и приходит в пакетной загрузке.
+
+# строк на один многострочный INSERT
+INSERT_CHUNK_SIZE = 1000
+
+
+def make_record(survey_id, ip_address, answers, client_token=None, unique=True,
+                created_at=None):
+    return {
+        "survey_id": survey_id,
+        "ip_address": ip_address,
+        "client_token": client_token,
+        "is_unique": unique,
+        "created_at": (created_at or datetime.utcnow()).isoformat(),
+        "answers": [list(answer) for answer in answers],
+    }
+
+
+def allocate_ids(table_name, count):
+    """Резервирует count значений из sequence первичного ключа таблицы одним запросом."""
+    return db.session.execute(
+        text(
+            "SELECT nextval(pg_get_serial_sequence(:table_name, 'id')) "
+            "FROM generate_series(1, :count)"
+        ),
+        {"table_name": table_name, "count": count},
+    ).scalars().all()
+
+
+def save_responses(records):
+    """
+    Записывает пачку ответов за фиксированное число запросов на каждые
+    INSERT_CHUNK_SIZE записей: nextval для id, многострочный INSERT Response
+    с ON CONFLICT DO NOTHING и один пакетный INSERT всех Answer.
+
+    Id заранее берутся из sequence, поэтому по RETURNING видно, какие именно
+    записи отсек уникальный индекс. Возвращает список id (None — «уже отвечал»)
+    в порядке records. Счётчики результатов обновляются в той же транзакции.
+    Коммит — за вызывающим.
+    """
+    from app.tallies import record_responses
+
+    packed = _packed()
+    result = []
+
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        chunk = records[start:start + INSERT_CHUNK_SIZE]
+        ids = allocate_ids(Response.__tablename__, len(chunk))
+
+        created = [datetime.fromisoformat(record["created_at"]) for record in chunk]
+
+        inserted = set(db.session.execute(
+            pg_insert(Response)
+            .values([
+                {
+                    "id": response_id,
+                    "survey_id": record["survey_id"],
+                    "ip_address": record.get("ip_address"),
+                    "client_token": record.get("client_token"),
+                    "is_unique": record.get("is_unique", True),
+                    "created_at": created_at,
+                    "packed_answers": pack_answers(record["answers"]) if packed else None,
+                }
+                for response_id, record, created_at in zip(ids, chunk, created)
+            ])
+            .on_conflict_do_nothing()
+            .returning(Response.id)
+        ).scalars())
+
+        answer_rows = [] if packed else [
+            {
+                "response_id": response_id,
+                "question_id": q_id,
+                "option_id": option_id,
+                "text_answer": text_answer,
+            }
+            for response_id, record in zip(ids, chunk)
+            if response_id in inserted
+            for q_id, option_id, text_answer in record["answers"]
+        ]
+        if answer_rows:
+            db.session.execute(insert(Answer), answer_rows)
+
+        record_responses([
+            (record["survey_id"], response_id, created_at, record["answers"])
+            for response_id, record, created_at in zip(ids, chunk, created)
+            if response_id in inserted
+        ])
+
+        result.extend(
+            response_id if response_id in inserted else None for response_id in ids
+        )
+
+    return result
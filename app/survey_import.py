@@ -0,0 +1,175 @@
+"""
+Импорт опроса из JSON-описания и копирование опроса.
+
+Описание — как GET /api/surveys/<id> (лишние поля, например id, игнорируются):
+    {
+      "title": "...", "description": "...", "is_active": false,
+      "questions": [
+        {"text": "...", "type": "single_choice", "options": ["Да", {"text": "Нет"}]},
+        {"text": "...", "type": "long_text"}
+      ]
+    }
+
+Импорт заранее резервирует id опроса, вопросов и вариантов из sequence
+(как save_responses) и вставляет всё тремя пакетными INSERT в одной
+транзакции — вместо сотен отправок форм с коммитом на каждую. Копирование
+выполняется целиком в БД: INSERT … SELECT опроса и одного запроса с CTE для
+вопросов и вариантов, ничего не загружая в сессию.
+"""
+from flask import current_app
+from sqlalchemy import insert, text
+
+from extensions import db
+from models import Survey, Question, Option
+from app.submissions import CHOICE_TYPES, TEXT_TYPES, allocate_ids
+
+
+# допустимые типы вопросов
+QUESTION_TYPES = CHOICE_TYPES + TEXT_TYPES
+
+# длины строк — как у колонок моделей
+_TITLE_LENGTH = Survey.title.type.length
+_QUESTION_LENGTH = Question.text.type.length
+_OPTION_LENGTH = Option.text.type.length
+
+
+def _string(value, length, what):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{what}: нужна непустая строка")
+    value = value.strip()
+    if len(value) > length:
+        raise ValueError(f"{what}: длиннее {length} символов")
+    return value
+
+
+def parse_definition(data):
+    """
+    Проверенное описание опроса:
+    {"title", "description", "is_active", "questions": [(текст, тип, [варианты])]}.
+    ValueError — с описанием первой найденной ошибки.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("описание опроса должно быть JSON-объектом")
+
+    description = data.get("description")
+    if description is not None and not isinstance(description, str):
+        raise ValueError("description: нужна строка")
+
+    # строго bool: "false", "0" или [0] не должны случайно опубликовать опрос
+    is_active = data.get("is_active", False)
+    if not isinstance(is_active, bool):
+        raise ValueError("is_active: нужно true или false")
+
+    items = data.get("questions")
+    if not isinstance(items, list) or not items:
+        raise ValueError("questions: нужен непустой список вопросов")
+    max_questions = current_app.config["SURVEY_IMPORT_MAX_QUESTIONS"]
+    if len(items) > max_questions:
+        raise ValueError(f"questions: больше {max_questions} вопросов")
+
+    questions = []
+    for number, item in enumerate(items, start=1):
+        where = f"вопрос {number}"
+        if not isinstance(item, dict):
+            raise ValueError(f"{where}: нужен объект")
+        q_text = _string(item.get("text"), _QUESTION_LENGTH, f"{where}, text")
+        q_type = item.get("type", "single_choice")
+        if q_type not in QUESTION_TYPES:
+            raise ValueError(f"{where}: неизвестный тип {q_type!r}")
+
+        raw_options = item.get("options") or []
+        if not isinstance(raw_options, list):
+            raise ValueError(f"{where}, options: нужен список")
+        if raw_options and q_type not in CHOICE_TYPES:
+            raise ValueError(f"{where}: варианты бывают только у {', '.join(CHOICE_TYPES)}")
+        if not raw_options and q_type in CHOICE_TYPES:
+            # без вариантов на вопрос нельзя ответить
+            raise ValueError(f"{where}: у {q_type} нужен хотя бы один вариант")
+        options = [
+            _string(
+                option.get("text") if isinstance(option, dict) else option,
+                _OPTION_LENGTH, f"{where}, вариант {o_number}",
+            )
+            for o_number, option in enumerate(raw_options, start=1)
+        ]
+        questions.append((q_text, q_type, options))
+
+    return {
+        "title": _string(data.get("title"), _TITLE_LENGTH, "title"),
+        "description": description.strip() if description else None,
+        "is_active": is_active,
+        "questions": questions,
+    }
+
+
+def import_survey(definition):
+    """
+    Создаёт опрос по описанию из parse_definition: три пакетных INSERT
+    с заранее зарезервированными id. Возвращает id опроса. Коммит — за вызывающим.
+    """
+    questions = definition["questions"]
+    (survey_id,) = allocate_ids(Survey.__tablename__, 1)
+    question_ids = sorted(allocate_ids(Question.__tablename__, len(questions)))
+
+    option_rows = [
+        {"question_id": q_id, "text": o_text}
+        for q_id, (_, _, options) in zip(question_ids, questions)
+        for o_text in options
+    ]
+    option_ids = sorted(allocate_ids(Option.__tablename__, len(option_rows))) if option_rows else []
+
+    db.session.execute(insert(Survey).values(
+        id=survey_id,
+        title=definition["title"],
+        description=definition["description"],
+        is_active=definition["is_active"],
+    ))
+    db.session.execute(insert(Question), [
+        {"id": q_id, "survey_id": survey_id, "text": q_text, "type": q_type}
+        for q_id, (q_text, q_type, _) in zip(question_ids, questions)
+    ])
+    if option_rows:
+        db.session.execute(insert(Option), [
+            dict(row, id=o_id) for o_id, row in zip(option_ids, option_rows)
+        ])
+    return survey_id
+
+
+def clone_survey(source_id, title=None):
+    """
+    Копия опроса с вопросами и вариантами (без ответов) — двумя запросами
+    INSERT … SELECT. Копия создаётся выключенной. Возвращает id копии
+    или None, если исходного опроса нет. Коммит — за вызывающим.
+    """
+    (survey_id,) = allocate_ids(Survey.__tablename__, 1)
+    params = {"source_id": source_id, "survey_id": survey_id, "title": title}
+
+    created = db.session.execute(text("""
+        INSERT INTO survey (id, title, description, is_active, schema_version, purged_responses)
+        SELECT :survey_id, left(coalesce(:title, title || ' (копия)'), :title_length),
+               description, false, 1, 0
+        FROM survey
+        WHERE id = :source_id AND deleted_at IS NULL
+    """), dict(params, title_length=_TITLE_LENGTH)).rowcount
+    if not created:
+        return None
+
+    # новые id вопросов выдаются в порядке старых; варианты вставляются
+    # тем же запросом по соответствию старый id → новый id из CTE
+    db.session.execute(text("""
+        WITH source_question AS MATERIALIZED (
+            SELECT q.id AS old_id,
+                   nextval(pg_get_serial_sequence('question', 'id')) AS new_id,
+                   q.text, q.type
+            FROM (SELECT * FROM question WHERE survey_id = :source_id ORDER BY id) q
+        ), new_question AS (
+            INSERT INTO question (id, survey_id, text, type)
+            SELECT new_id, :survey_id, text, type FROM source_question
+        )
+        INSERT INTO option (question_id, text)
+        SELECT sq.new_id, o.text
+        FROM option o
+        JOIN source_question sq ON sq.old_id = o.question_id
+        ORDER BY o.id
+    """), params)
+    return survey_id
@@ -0,0 +1,213 @@
+"""
+Удаление опроса со всеми ответами без загрузки их в сессию.
+
+Удаление в админке только помечает опрос (deleted_at, is_active=False) —
+с этого момента он скрыт от респондентов, API и админки — и запускает
+фоновый поток. Поток удаляет ответы порциями по PURGE_CHUNK_SIZE
+респондентов множественным DELETE (строки answer уходят по ON DELETE
+CASCADE), каждая порция — своя короткая транзакция, и после каждой
+увеличивает survey.purged_responses — прогресс, который видит любой воркер.
+Когда ответов не осталось, удаляется сам опрос; вопросы, варианты и
+счётчики уходят каскадом.
+
+Поток живёт внутри воркера: перезапуск или падение воркера обрывает
+удаление на середине. Пометка и прогресс при этом сохраняются в БД, и
+воркер после рестарта на первом запросе сам доудаляет все помеченные опросы
+(SURVEY_PURGE_RESUME); то же делает `flask surveys purge`. Один опрос
+удаляет один процесс — это держит advisory-блокировка PostgreSQL, которую
+БД снимает сама, если процесс умер.
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+
+from extensions import db
+from models import Survey, Response
+from app.results import response_stats
+
+logger = logging.getLogger(__name__)
+
+surveys_cli = AppGroup("surveys", help="Опросы.")
+
+# респондентов, удаляемых за одну транзакцию
+PURGE_CHUNK_SIZE = 2000
+
+# первый ключ advisory-блокировки удаления (второй — id опроса)
+_PURGE_LOCK_SPACE = 2867
+
+# pid процесса, который уже запустил доудаление после старта
+_resumed_in = None
+
+
+def init_app(app):
+    app.cli.add_command(surveys_cli)
+    # не в create_app: он не ходит в БД, а под gunicorn --preload выполняется
+    # ещё в мастере — доудаление запускает первый запрос каждого воркера
+    app.before_request(_resume_after_restart)
+
+
+def _resume_after_restart():
+    global _resumed_in
+    if _resumed_in == os.getpid():
+        return
+    _resumed_in = os.getpid()
+    if current_app.config["SURVEY_PURGE_RESUME"]:
+        resume_in_background(current_app._get_current_object())
+
+
+@contextmanager
+def _purge_lock(survey_id):
+    """
+    Сессионная advisory-блокировка на отдельном соединении: True, если
+    опрос удаляет этот процесс, False — если уже удаляет другой.
+    """
+    with db.engine.connect() as conn:
+        locked = conn.scalar(select(func.pg_try_advisory_lock(_PURGE_LOCK_SPACE, survey_id)))
+        try:
+            yield locked
+        finally:
+            if locked:
+                conn.execute(select(func.pg_advisory_unlock(_PURGE_LOCK_SPACE, survey_id)))
+
+
+def mark_deleted(survey):
+    """Скрывает опрос до фонового удаления. Коммит — за вызывающим."""
+    survey.deleted_at = datetime.utcnow()
+    survey.is_active = False
+
+
+def purge_survey(survey_id):
+    """
+    Удаляет помеченный опрос порциями, коммитя каждую.
+    Возвращает число удалённых респондентов (опросы без пометки не трогает)
+    или None, если опрос уже удаляет другой поток или процесс.
+    """
+    with _purge_lock(survey_id) as locked:
+        if not locked:
+            return None
+        return _purge_locked(survey_id)
+
+
+def _purge_locked(survey_id):
+    marked = db.session.scalar(
+        select(Survey.id).where(Survey.id == survey_id, Survey.deleted_at.isnot(None))
+    )
+    if marked is None:
+        return 0
+
+    purged = 0
+    while True:
+        chunk = (
+            select(Response.id)
+            .where(Response.survey_id == survey_id)
+            .order_by(Response.id)
+            .limit(PURGE_CHUNK_SIZE)
+            .scalar_subquery()
+        )
+        deleted = db.session.execute(delete(Response).where(Response.id.in_(chunk))).rowcount
+        if not deleted:
+            break
+        db.session.execute(
+            update(Survey)
+            .where(Survey.id == survey_id)
+            .values(purged_responses=Survey.purged_responses + deleted)
+        )
+        db.session.commit()
+        purged += deleted
+
+    db.session.execute(delete(Survey).where(Survey.id == survey_id))
+    db.session.commit()
+    return purged
+
+
+def _purge_in_app(app, survey_id):
+    with app.app_context():
+        try:
+            purged = purge_survey(survey_id)
+            if purged is not None:
+                logger.info("Опрос %s удалён, респондентов: %s", survey_id, purged)
+        except Exception:
+            # пометка осталась — доудалит `flask surveys purge`
+            logger.exception("Не удалось удалить опрос %s", survey_id)
+            db.session.rollback()
+
+
+def purge_in_background(app, survey_id):
+    """Запускает purge_survey в фоновом потоке воркера; возвращает поток."""
+    thread = threading.Thread(
+        target=_purge_in_app,
+        args=(app, survey_id),
+        name=f"survey-purge-{survey_id}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _marked_survey_ids(survey_id=None):
+    stmt = select(Survey.id).where(Survey.deleted_at.isnot(None)).order_by(Survey.id)
+    if survey_id is not None:
+        stmt = stmt.where(Survey.id == survey_id)
+    return db.session.scalars(stmt).all()
+
+
+def _resume_in_app(app):
+    with app.app_context():
+        try:
+            survey_ids = _marked_survey_ids()
+        except Exception:
+            logger.exception("Не удалось найти опросы, ожидающие удаления")
+            db.session.rollback()
+            return
+        if survey_ids:
+            logger.info("Доудаляем опросы после рестарта: %s", survey_ids)
+    for survey_id in survey_ids:
+        _purge_in_app(app, survey_id)
+
+
+def resume_in_background(app):
+    """Доудаляет в фоновом потоке все помеченные опросы; возвращает поток."""
+    thread = threading.Thread(
+        target=_resume_in_app, args=(app,), name="survey-purge-resume", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def purge_status(survey_id):
+    """
+    Прогресс удаления: {"status": "deleting", "purged_responses", "total_responses"}
+    или {"status": "deleted"}, если опроса уже нет.
+    """
+    survey = db.session.get(Survey, survey_id)
+    if survey is None:
+        return {"status": "deleted"}
+    if survey.deleted_at is None:
+        return {"status": "active"}
+    # счётчик ответов (survey_tally) при удалении не уменьшается — это
+    # число ответов на момент пометки
+    total, _, _ = response_stats(survey_id)
+    return {
+        "status": "deleting",
+        "purged_responses": survey.purged_responses,
+        "total_responses": max(total, survey.purged_responses),
+    }
+
+
+@surveys_cli.command("purge")
+@click.option("--survey-id", type=int, default=None, help="Только этот опрос.")
+def purge_command(survey_id):
+    """Доудалить опросы, помеченные удалёнными."""
+    for marked_id in _marked_survey_ids(survey_id):
+        purged = purge_survey(marked_id)
+        if purged is None:
+            click.echo(f"Опрос {marked_id}: уже удаляется другим процессом")
+        else:
+            click.echo(f"Опрос {marked_id}: удалено респондентов {purged}")
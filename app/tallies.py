@@ -0,0 +1,260 @@
+"""
+Счётчики результатов (SurveyTally, OptionTally, ValueTally) и почасовые
+свёртки для временных рядов (SurveyHourlyTally, OptionHourlyTally).
+
+Результаты опроса читаются из них за O(вариантов + различных значений),
+а не пересчётом всех ответов. Счётчики обновляются в той же транзакции, что
+и запись ответов (save_response / save_responses): ответы пачки сначала
+сворачиваются в памяти, затем по одному INSERT … ON CONFLICT DO UPDATE
+(count = count + excluded.count) на каждую таблицу.
+
+Строка счётчика разложена на TALLY_SHARDS «шардов»: транзакция выбирает
+шард случайно, поэтому параллельные ответы на один и тот же вариант
+обновляют разные строки и не ждут блокировки друг друга. Строки в INSERT
+отсортированы по ключу — транзакции берут блокировки в одном порядке и не
+попадают во взаимную блокировку.
+
+`flask tallies rebuild` пересчитывает счётчики из сохранённых ответов.
+"""
+import random
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Integer, Text, case, column, delete, func, literal, select, text, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from extensions import db
+from models import (
+    Question, Response,
+    SurveyTally, OptionTally, ValueTally, SurveyHourlyTally, OptionHourlyTally,
+)
+from app.answers import answer_rows
+from app.submissions import CHOICE_TYPES, VALUE_TYPES
+
+tallies_cli = AppGroup("tallies", help="Счётчики результатов опросов.")
+
+
+def init_app(app):
+    app.cli.add_command(tallies_cli)
+
+
+def _value_key(question_type, value):
+    """Ключ значения в ValueTally: md5 для VALUE_TYPES, '' для long_text."""
+    return case((question_type.in_(VALUE_TYPES), func.md5(value)), else_="")
+
+
+def _grouped_value(question_type, value):
+    return case((question_type.in_(VALUE_TYPES), value), else_=None)
+
+
+# ---------- ОБНОВЛЕНИЕ ПРИ ЗАПИСИ ----------
+
+def record_responses(rows):
+    """
+    Прибавляет к счётчикам только что вставленные ответы.
+
+    rows — [(survey_id, response_id, created_at, answers)], answers — кортежи
+    (question_id, option_id, text_answer). Не больше пяти запросов на вызов.
+    Коммит — за вызывающим.
+    """
+    if not rows:
+        return
+
+    shard = random.randrange(current_app.config["TALLY_SHARDS"])
+
+    surveys = {}
+    options = Counter()
+    texts = Counter()
+    survey_hours = Counter()
+    option_hours = Counter()
+    for survey_id, response_id, created_at, answers in rows:
+        count, last_id, last_at = surveys.get(survey_id, (0, response_id, created_at))
+        surveys[survey_id] = (count + 1, max(last_id, response_id), max(last_at, created_at))
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        survey_hours[(survey_id, hour)] += 1
+        for q_id, option_id, text_answer in answers:
+            if option_id is not None:
+                options[(option_id, survey_id)] += 1
+                option_hours[(option_id, hour, survey_id)] += 1
+            elif text_answer:
+                texts[(q_id, text_answer)] += 1
+
+    stmt = pg_insert(SurveyTally).values([
+        {
+            "survey_id": survey_id,
+            "shard": shard,
+            "response_count": count,
+            "last_response_id": last_id,
+            "last_response_at": last_at,
+        }
+        for survey_id, (count, last_id, last_at) in sorted(surveys.items())
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[SurveyTally.survey_id, SurveyTally.shard],
+        set_={
+            "response_count": SurveyTally.response_count + stmt.excluded.response_count,
+            "last_response_id": func.greatest(
+                SurveyTally.last_response_id, stmt.excluded.last_response_id
+            ),
+            "last_response_at": func.greatest(
+                SurveyTally.last_response_at, stmt.excluded.last_response_at
+            ),
+        },
+    ))
+
+    stmt = pg_insert(SurveyHourlyTally).values([
+        {"survey_id": survey_id, "bucket": hour, "shard": shard, "response_count": count}
+        for (survey_id, hour), count in sorted(survey_hours.items())
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[SurveyHourlyTally.survey_id, SurveyHourlyTally.bucket, SurveyHourlyTally.shard],
+        set_={"response_count": SurveyHourlyTally.response_count + stmt.excluded.response_count},
+    ))
+
+    if options:
+        stmt = pg_insert(OptionHourlyTally).values([
+            {
+                "option_id": option_id,
+                "bucket": hour,
+                "shard": shard,
+                "survey_id": survey_id,
+                "answer_count": count,
+            }
+            for (option_id, hour, survey_id), count in sorted(option_hours.items())
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[OptionHourlyTally.option_id, OptionHourlyTally.bucket, OptionHourlyTally.shard],
+            set_={"answer_count": OptionHourlyTally.answer_count + stmt.excluded.answer_count},
+        ))
+
+        stmt = pg_insert(OptionTally).values([
+            {"option_id": option_id, "shard": shard, "survey_id": survey_id, "answer_count": count}
+            for (option_id, survey_id), count in sorted(options.items())
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[OptionTally.option_id, OptionTally.shard],
+            set_={"answer_count": OptionTally.answer_count + stmt.excluded.answer_count},
+        ))
+
+    if texts:
+        # тип вопроса (группировать ли значения) берём соединением в самом
+        # INSERT … SELECT — журналу при записи схема опроса не нужна
+        batch = values(
+            column("question_id", Integer),
+            column("text_answer", Text),
+            column("answer_count", Integer),
+            name="batch",
+        ).data([(q_id, value, count) for (q_id, value), count in sorted(texts.items())])
+        value_key = _value_key(Question.type, batch.c.text_answer)
+        value = _grouped_value(Question.type, batch.c.text_answer)
+
+        stmt = pg_insert(ValueTally).from_select(
+            ["question_id", "value_key", "shard", "survey_id", "value", "answer_count"],
+            select(
+                batch.c.question_id,
+                value_key,
+                literal(shard),
+                Question.survey_id,
+                value,
+                func.sum(batch.c.answer_count),
+            )
+            .join(Question, Question.id == batch.c.question_id)
+            .where(Question.type.notin_(CHOICE_TYPES))
+            .group_by(batch.c.question_id, value_key, Question.survey_id, value)
+            .order_by(batch.c.question_id, value_key),
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ValueTally.question_id, ValueTally.value_key, ValueTally.shard],
+            set_={"answer_count": ValueTally.answer_count + stmt.excluded.answer_count},
+        ))
+
+
+# ---------- ПЕРЕСЧЁТ ----------
+
+def rebuild_tallies(survey_id=None):
+    """
+    Пересчитывает счётчики из сохранённых ответов (одного опроса или всех),
+    в каком бы виде они ни хранились (app/answers.py).
+
+    На время пересчёта таблица response блокируется от вставок (SHARE),
+    чтобы параллельные ответы не учлись дважды или не потерялись.
+    Коммит — за вызывающим.
+    """
+    db.session.execute(text("LOCK TABLE response IN SHARE MODE"))
+
+    for model in (SurveyTally, OptionTally, ValueTally, SurveyHourlyTally, OptionHourlyTally):
+        stmt = delete(model)
+        if survey_id is not None:
+            stmt = stmt.where(model.survey_id == survey_id)
+        db.session.execute(stmt)
+
+    def only_survey(stmt, column_):
+        return stmt if survey_id is None else stmt.where(column_ == survey_id)
+
+    db.session.execute(pg_insert(SurveyTally).from_select(
+        ["survey_id", "shard", "response_count", "last_response_id", "last_response_at"],
+        only_survey(
+            select(
+                Response.survey_id,
+                literal(0),
+                func.count(),
+                func.max(Response.id),
+                func.max(Response.created_at),
+            ),
+            Response.survey_id,
+        ).group_by(Response.survey_id),
+    ))
+
+    answers = answer_rows(survey_id)
+
+    db.session.execute(pg_insert(OptionTally).from_select(
+        ["option_id", "shard", "survey_id", "answer_count"],
+        select(answers.c.option_id, literal(0), Question.survey_id, func.count())
+        .join(Question, Question.id == answers.c.question_id)
+        .where(answers.c.option_id.isnot(None))
+        .group_by(answers.c.option_id, Question.survey_id),
+    ))
+
+    hour = func.date_trunc("hour", Response.created_at)
+    db.session.execute(pg_insert(SurveyHourlyTally).from_select(
+        ["survey_id", "bucket", "shard", "response_count"],
+        only_survey(
+            select(Response.survey_id, hour, literal(0), func.count())
+            .where(Response.created_at.isnot(None)),
+            Response.survey_id,
+        ).group_by(Response.survey_id, hour),
+    ))
+
+    db.session.execute(pg_insert(OptionHourlyTally).from_select(
+        ["option_id", "bucket", "shard", "survey_id", "answer_count"],
+        select(answers.c.option_id, hour, literal(0), Response.survey_id, func.count())
+        .join(Response, Response.id == answers.c.response_id)
+        .where(answers.c.option_id.isnot(None), Response.created_at.isnot(None))
+        .group_by(answers.c.option_id, hour, Response.survey_id),
+    ))
+
+    value_key = _value_key(Question.type, answers.c.text_answer)
+    value = _grouped_value(Question.type, answers.c.text_answer)
+    db.session.execute(pg_insert(ValueTally).from_select(
+        ["question_id", "value_key", "shard", "survey_id", "value", "answer_count"],
+        select(answers.c.question_id, value_key, literal(0), Question.survey_id, value, func.count())
+        .join(Question, Question.id == answers.c.question_id)
+        .where(
+            Question.type.notin_(CHOICE_TYPES),
+            answers.c.option_id.is_(None),
+            answers.c.text_answer.isnot(None),
+            answers.c.text_answer != "",
+        )
+        .group_by(answers.c.question_id, value_key, Question.survey_id, value),
+    ))
+
+
+@tallies_cli.command("rebuild")
+@click.option("--survey-id", type=int, default=None, help="Только этот опрос.")
+def rebuild_command(survey_id):
+    """Пересчитать счётчики результатов из сохранённых ответов."""
+    rebuild_tallies(survey_id)
+    db.session.commit()
+    click.echo("Счётчики пересчитаны")
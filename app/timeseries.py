@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from sqlalchemy import select, func, BigInteger
+
+from extensions import db
+from models import Response, SurveyHourlyTally, OptionHourlyTally
+from app.answers import answer_rows
+
+
+# ---------- ВРЕМЕННЫЕ РЯДЫ ОТВЕТОВ ----------
+# Часовые и дневные ряды читаются из почасовых свёрток (app/tallies.py) —
+# за месяцы это сотни строк, а не все ответы. Поминутные — из response по
+# индексу (survey_id, created_at), поэтому их диапазон по умолчанию короткий.
+
+BUCKETS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# диапазон по умолчанию, если не задано начало
+DEFAULT_SPANS = {
+    "minute": timedelta(hours=6),
+    "hour": timedelta(days=7),
+    "day": timedelta(days=90),
+}
+
+# больше точек в одном ряду не отдаём
+MAX_POINTS = 5000
+
+
+def truncate(moment, bucket):
+    """Начало корзины, в которую попадает moment (как date_trunc в PostgreSQL)."""
+    moment = moment.replace(second=0, microsecond=0)
+    if bucket in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if bucket == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def points_count(bucket, start, end):
+    return int((end - truncate(start, bucket)) / BUCKETS[bucket]) + 1
+
+
+def response_series(survey_id, bucket, start, end, option_id=None):
+    """
+    [(начало корзины, число)] за [start, end) с нулями в пустых корзинах.
+
+    option_id — считать не ответы опроса, а выборы этого варианта.
+    Время — naive UTC, как Response.created_at.
+    """
+    start = truncate(start, bucket)
+
+    if bucket == "minute":
+        moment = func.date_trunc("minute", Response.created_at)
+        stmt = (
+            select(moment, func.count())
+            .where(
+                Response.survey_id == survey_id,
+                Response.created_at >= start,
+                Response.created_at < end,
+            )
+            .group_by(moment)
+        )
+        if option_id is not None:
+            answers = answer_rows(survey_id)
+            stmt = stmt.join(answers, answers.c.response_id == Response.id).where(
+                answers.c.option_id == option_id
+            )
+    else:
+        if option_id is None:
+            tally, count, owner = (
+                SurveyHourlyTally, SurveyHourlyTally.response_count,
+                SurveyHourlyTally.survey_id == survey_id,
+            )
+        else:
+            tally, count, owner = (
+                OptionHourlyTally, OptionHourlyTally.answer_count,
+                OptionHourlyTally.option_id == option_id,
+            )
+        moment = func.date_trunc(bucket, tally.bucket)
+        stmt = (
+            select(moment, func.sum(count).cast(BigInteger))
+            .where(owner, tally.bucket >= start, tally.bucket < end)
+            .group_by(moment)
+        )
+
+    counts = dict(db.session.execute(stmt).all())
+
+    series = []
+    step = BUCKETS[bucket]
+    moment = start
+    while moment < end:
+        series.append((moment, counts.get(moment, 0)))
+        moment += step
+    return series
@@ -1,12 +1,25 @@
 from flask import (
     Blueprint, render_template, request,
-    redirect, url_for, abort, session
+    redirect, url_for, abort, session, current_app, jsonify
 )
-from sqlalchemy import func
 from functools import wraps
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
 
 from extensions import db
-from models import Survey, Question, Option, Answer, Response, Admin
+from models import Survey, Question, Option, Admin
+from app import results
+from app.page_cache import session_page_response
+from app.results_cache import cached_results
+from app.schema_cache import (
+    bump_schema_version, invalidate_active_surveys, get_compiled_survey, load_survey_tree,
+)
+from app.search import SEARCH_TYPES, search_answers
+from app.submissions import CHOICE_TYPES, VALUE_TYPES
+from app.survey_import import QUESTION_TYPES, clone_survey, import_survey, parse_definition
+from app.survey_purge import mark_deleted, purge_in_background, purge_status
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -51,11 +64,48 @@ def logout():
 
 # ---------- ОПРОСЫ ----------
 
+def get_survey_or_404(survey_id):
+    """Опрос по id; помеченный удалённым — как несуществующий."""
+    survey = db.session.get(Survey, survey_id)
+    if survey is None or survey.deleted_at is not None:
+        abort(404)
+    return survey
+
+
 @admin_bp.route("/surveys")
 @admin_required
 def surveys_list():
-    surveys = Survey.query.all()
-    return render_template("admin/surveys_list.html", surveys=surveys)
+    """
+    Опросы от новых к старым, страницами по ключу (?before=<id>): страница
+    читается по первичному ключу за одно и то же время, сколько бы опросов
+    ни было. Число ответов и время последнего — одним запросом к счётчикам.
+    """
+    per_page = current_app.config["ADMIN_SURVEYS_PER_PAGE"]
+    before = request.args.get("before", type=int)
+
+    stmt = (
+        select(Survey)
+        .options(load_only(
+            Survey.id, Survey.title, Survey.is_active, Survey.deleted_at, Survey.purged_responses,
+        ))
+        .order_by(Survey.id.desc())
+        .limit(per_page + 1)
+    )
+    if before is not None:
+        stmt = stmt.where(Survey.id < before)
+    surveys = db.session.scalars(stmt).all()
+
+    next_cursor = surveys[per_page - 1].id if len(surveys) > per_page else None
+    # удаляемые опросы остаются в списке до конца удаления — с прогрессом
+    surveys = surveys[:per_page]
+
+    return render_template(
+        "admin/surveys_list.html",
+        surveys=surveys,
+        stats=results.surveys_response_stats([s.id for s in surveys]),
+        next_cursor=next_cursor,
+        is_first_page=before is None,
+    )
 
 
 @admin_bp.route("/surveys/new", methods=["GET", "POST"])
@@ -76,21 +126,64 @@ def survey_create():
         survey = Survey(title=title, description=description, is_active=is_active)
         db.session.add(survey)
         db.session.commit()
+        invalidate_active_surveys()
         return redirect(url_for("admin.surveys_list"))
 
     return render_template("admin/survey_form.html", survey=None)
 
 
+@admin_bp.route("/surveys/import", methods=["GET", "POST"])
+@admin_required
+def survey_import():
+    """Создание опроса целиком из JSON-описания (файл или текст формы)."""
+    definition = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        definition = (
+            upload.read().decode("utf-8", errors="replace") if upload and upload.filename
+            else request.form.get("definition", "")
+        )
+        try:
+            survey_id = import_survey(parse_definition(json.loads(definition)))
+        except ValueError as exc:  # в том числе JSONDecodeError
+            return render_template(
+                "admin/survey_import.html",
+                definition=definition,
+                question_types=QUESTION_TYPES,
+                error=f"Описание не принято: {exc}",
+            )
+        db.session.commit()
+        invalidate_active_surveys()
+        return redirect(url_for("admin.questions_list", survey_id=survey_id))
+
+    return render_template(
+        "admin/survey_import.html", definition=definition, question_types=QUESTION_TYPES,
+    )
+
+
+@admin_bp.route("/surveys/<int:survey_id>/clone", methods=["POST"])
+@admin_required
+def survey_clone(survey_id):
+    """Копия опроса с вопросами и вариантами, без ответов; копия выключена."""
+    clone_id = clone_survey(survey_id)
+    if clone_id is None:
+        abort(404)
+    db.session.commit()
+    return redirect(url_for("admin.survey_edit", survey_id=clone_id))
+
+
 @admin_bp.route("/surveys/<int:survey_id>/edit", methods=["GET", "POST"])
 @admin_required
 def survey_edit(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
+    survey = get_survey_or_404(survey_id)
 
     if request.method == "POST":
         survey.title = request.form.get("title")
         survey.description = request.form.get("description")
         survey.is_active = bool(request.form.get("is_active"))
+        bump_schema_version(survey.id)
         db.session.commit()
+        invalidate_active_surveys()
         return redirect(url_for("admin.surveys_list"))
 
     return render_template("admin/survey_form.html", survey=survey)
@@ -99,30 +192,42 @@ def survey_edit(survey_id):
 @admin_bp.route("/surveys/<int:survey_id>/delete", methods=["POST"])
 @admin_required
 def survey_delete(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
-    db.session.delete(survey)
+    survey = get_survey_or_404(survey_id)
+    # ответов может быть миллионы: опрос сразу скрываем, а удаляем порциями в фоне
+    mark_deleted(survey)
     db.session.commit()
+    invalidate_active_surveys()
+    purge_in_background(current_app._get_current_object(), survey.id)
     return redirect(url_for("admin.surveys_list"))
 
 
+@admin_bp.route("/surveys/<int:survey_id>/delete/status")
+@admin_required
+def survey_delete_status(survey_id):
+    """Прогресс фонового удаления опроса (JSON)."""
+    return jsonify(purge_status(survey_id))
+
+
 # ---------- ВОПРОСЫ ----------
 
 @admin_bp.route("/surveys/<int:survey_id>/questions")
 @admin_required
 def questions_list(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
-    questions = survey.questions.all()
+    # дерево целиком — фиксированным числом запросов, без запроса на вопрос
+    survey = load_survey_tree(survey_id)
+    if survey is None:
+        abort(404)
     return render_template(
         "admin/questions_list.html",
         survey=survey,
-        questions=questions
+        questions=survey.question_list
     )
 
 
 @admin_bp.route("/surveys/<int:survey_id>/questions/new", methods=["GET", "POST"])
 @admin_required
 def question_create(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
+    survey = get_survey_or_404(survey_id)
     if request.method == "POST":
         text = request.form.get("text")
         q_type = request.form.get("type", "single_choice")
@@ -135,6 +240,7 @@ def question_create(survey_id):
             )
         q = Question(survey_id=survey.id, text=text, type=q_type)
         db.session.add(q)
+        bump_schema_version(survey.id)
         db.session.commit()
         return redirect(url_for("admin.questions_list", survey_id=survey.id))
 
@@ -163,6 +269,7 @@ def question_edit(question_id):
             )
         question.text = text
         question.type = q_type
+        bump_schema_version(survey.id)
         db.session.commit()
         return redirect(url_for("admin.questions_list", survey_id=survey.id))
 
@@ -179,6 +286,7 @@ def question_delete(question_id):
     question = Question.query.get_or_404(question_id)
     survey_id = question.survey_id
     db.session.delete(question)
+    bump_schema_version(survey_id)
     db.session.commit()
     return redirect(url_for("admin.questions_list", survey_id=survey_id))
 
@@ -200,6 +308,7 @@ def option_create(question_id):
             )
         option = Option(question_id=question.id, text=text)
         db.session.add(option)
+        bump_schema_version(question.survey_id)
         db.session.commit()
         return redirect(url_for("admin.questions_list", survey_id=question.survey_id))
 
@@ -222,6 +331,7 @@ def option_edit(option_id):
                 error="Текст варианта обязателен",
             )
         option.text = text
+        bump_schema_version(question.survey_id)
         db.session.commit()
         return redirect(url_for("admin.questions_list", survey_id=question.survey_id))
 
@@ -234,114 +344,67 @@ def option_delete(option_id):
     option = Option.query.get_or_404(option_id)
     survey_id = option.question.survey_id
     db.session.delete(option)
+    bump_schema_version(survey_id)
     db.session.commit()
     return redirect(url_for("admin.questions_list", survey_id=survey_id))
 
 
 # ---------- СТАТИСТИКА (ПОЧИНЕННАЯ + ТЕКСТОВЫЕ ОТВЕТЫ) ----------
 
+# сколько длинных ответов показывать на странице результатов
+RESULTS_TEXT_SAMPLE = 50
+
+
 @admin_bp.route("/surveys/<int:survey_id>/results")
 @admin_required
 def survey_results(survey_id):
-    from models import Question  # если выше уже импортировано, можно убрать
-
-    survey = Survey.query.get_or_404(survey_id)
-
-    questions_stats = []
-
-    for question in survey.questions.order_by(Question.id).all():
-        qtype = question.type
-
-        # Вариантные вопросы: один или несколько вариантов
-        if qtype in ["single_choice", "multiple_choice"]:
-            stats = (
-                db.session.query(
-                    Option.id,
-                    Option.text,
-                    func.count(Answer.id).label("answers_count"),
-                )
-                .outerjoin(Answer, Answer.option_id == Option.id)
-                .filter(Option.question_id == question.id)
-                .group_by(Option.id, Option.text)
-                .all()
-            )
+    survey = get_survey_or_404(survey_id)
+
+    def compute(watermark):
+        # весь опрос — двумя запросами к счётчикам (app/results.py)
+        # для чисел и дат — сводка вместо перечня значений
+        questions_stats = results.survey_results(get_compiled_survey(survey), with_values=False)
+
+        # длинные ответы — первые RESULTS_TEXT_SAMPLE каждого вопроса одним запросом
+        samples = results.text_answer_samples(
+            [b["question"].id for b in questions_stats if b["type"] not in VALUE_TYPES + CHOICE_TYPES],
+            RESULTS_TEXT_SAMPLE,
+        )
+        for block in questions_stats:
+            block["text_answers"] = samples.get(block["question"].id, [])
+        return questions_stats, watermark.responses_count
+
+    # пересчёт — только после нового ответа или правки опроса (app/results_cache.py).
+    # ETag водяного знака здесь не годится: разметка зависит ещё и от сессии
+    _, (questions_stats, responses_count) = cached_results("admin", survey, compute)
+
+    return session_page_response(render_template(
+        "admin/results.html",
+        survey=survey,
+        questions_stats=questions_stats,
+        responses_count=responses_count,
+    ))
 
-            total = sum(row.answers_count for row in stats) or 1
-            options_stats = [
-                {
-                    "option_id": row.id,
-                    "option_text": row.text,
-                    "count": row.answers_count,
-                    "percent": round(row.answers_count * 100.0 / total, 2),
-                }
-                for row in stats
-            ]
-
-            questions_stats.append({
-                "question": question,
-                "type": qtype,
-                "options_stats": options_stats,
-                "value_stats": [],
-                "text_answers": [],
-            })
-
-        # Короткий текст / число / шкала / дата — группируем одинаковые ответы с процентами
-        elif qtype in ["text", "number", "range", "date"]:
-            rows = (
-                db.session.query(
-                    Answer.text_answer,
-                    func.count(Answer.id).label("answers_count"),
-                )
-                .filter(
-                    Answer.question_id == question.id,
-                    Answer.text_answer.isnot(None),
-                    Answer.text_answer != "",
-                )
-                .group_by(Answer.text_answer)
-                .all()
-            )
 
-            total = sum(row.answers_count for row in rows) or 1
-            value_stats = [
-                {
-                    "value": row.text_answer,
-                    "count": row.answers_count,
-                    "percent": round(row.answers_count * 100.0 / total, 2),
-                }
-                for row in rows
-            ]
-
-            questions_stats.append({
-                "question": question,
-                "type": qtype,
-                "options_stats": [],
-                "value_stats": value_stats,
-                "text_answers": [],
-            })
-
-        # Длинный текст — показываем как список
-        else:  # long_text или неизвестный
-            answers = (
-                Answer.query
-                .filter(
-                    Answer.question_id == question.id,
-                    Answer.text_answer.isnot(None),
-                    Answer.text_answer != "",
-                )
-                .all()
-            )
-            questions_stats.append({
-                "question": question,
-                "type": qtype,
-                "options_stats": [],
-                "value_stats": [],
-                "text_answers": [a.text_answer for a in answers],
-            })
+# ---------- ПОИСК ПО ОТВЕТАМ ----------
+
+@admin_bp.route("/surveys/<int:survey_id>/search")
+@admin_required
+def survey_search(survey_id):
+    survey = get_survey_or_404(survey_id)
+    compiled = get_compiled_survey(survey)
 
+    query = request.args.get("q", "").strip()
+    question_id = request.args.get("question", type=int)
+    limit = current_app.config["SEARCH_MAX_RESULTS"]
+    hits = search_answers(compiled, query, question_id=question_id, limit=limit) if query else []
+
+    questions = {q.id: q for q in compiled.questions}
     return render_template(
-        "admin/results.html",
+        "admin/search.html",
         survey=survey,
-        questions_stats=questions_stats
+        query=query,
+        question_id=question_id,
+        search_questions=[q for q in compiled.questions if q.type in SEARCH_TYPES],
+        hits=[dict(hit, question=questions[hit["question_id"]]) for hit in hits],
     )
-
-
@@ -1,10 +1,29 @@
-from flask import Blueprint, request, jsonify, current_app
-from sqlalchemy import func
+import json
+import os
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify, current_app, send_file, stream_with_context, url_for
 from extensions import db, limiter
-from models import Survey, Question, Option, Response, Answer
+from models import Survey, Question
+from app import timeseries
+from app.exports import generate_csv, generate_ndjson, parquet_export
+from app.page_cache import conditional_response
+from app.results import CROSSTAB_TYPES, NUMERIC_TYPES, crosstab, survey_results, text_answers_page
+from app.results_cache import cached_results, results_watermark
+from app.schema_cache import get_compiled_survey, invalidate_active_surveys
+from app.search import search_answers
+from app.journal import journal
+from app.submissions import CHOICE_TYPES, parse_json_answers, save_response, save_responses, make_record
+from app.survey_import import clone_survey, import_survey, parse_definition
 
 api_bp = Blueprint("api", __name__)
 
+# формат выгрузки -> (генератор, MIME-тип)
+EXPORT_FORMATS = {
+    "ndjson": (generate_ndjson, "application/x-ndjson"),
+    "csv": (generate_csv, "text/csv"),
+}
+
 
 # ---------- ПРОСТАЯ API-АВТОРИЗАЦИЯ ПО ТОКЕНУ ----------
 
@@ -26,7 +45,19 @@ def api_auth_required(func):
 
 # ---------- ВСПОМОГАТЕЛЬНЫЕ СЕРИАЛИЗАТОРЫ ----------
 
-def survey_to_dict(survey: Survey, include_questions=False):
+def _get_survey(survey_id):
+    """Опрос по id (в том числе выключенный); помеченный удалённым — None."""
+    survey = db.session.get(Survey, survey_id)
+    if survey is None or survey.deleted_at is not None:
+        return None
+    return survey
+
+
+def survey_to_dict(survey, include_questions=False):
+    """
+    survey — модель Survey или CompiledSurvey; вопросы берутся только
+    из скомпилированной схемы.
+    """
     data = {
         "id": survey.id,
         "title": survey.title,
@@ -35,16 +66,15 @@ def survey_to_dict(survey: Survey, include_questions=False):
     }
     if include_questions:
         questions = []
-        for q in survey.questions.order_by(Question.id).all():
+        for q in survey.questions:
             q_data = {
                 "id": q.id,
                 "text": q.text,
-                "type": q.type,  # single_choice / text
+                "type": q.type,
             }
-            if q.type == "single_choice":
+            if q.type in CHOICE_TYPES:
                 q_data["options"] = [
-                    {"id": o.id, "text": o.text}
-                    for o in q.options.order_by(Option.id).all()
+                    {"id": o.id, "text": o.text} for o in q.options
                 ]
             else:
                 q_data["options"] = []
@@ -63,6 +93,45 @@ def api_surveys_list():
     return jsonify([survey_to_dict(s) for s in surveys])
 
 
+@api_bp.route("/surveys:import", methods=["POST"])
+@api_auth_required
+def api_import_survey():
+    """
+    Создание опроса целиком из JSON-описания (формат — app/survey_import.py,
+    как ответ GET /surveys/<id>). Вставка — в одной транзакции.
+    Ответ: 201 {"id": <id опроса>} или 400 {"error": "invalid_definition", "detail": ...}.
+    """
+    try:
+        definition = parse_definition(request.get_json(silent=True))
+    except ValueError as exc:
+        return jsonify({"error": "invalid_definition", "detail": str(exc)}), 400
+
+    survey_id = import_survey(definition)
+    db.session.commit()
+    invalidate_active_surveys()
+    return jsonify({"id": survey_id}), 201
+
+
+@api_bp.route("/surveys/<int:survey_id>:clone", methods=["POST"])
+@api_auth_required
+def api_clone_survey(survey_id):
+    """
+    Копия опроса с вопросами и вариантами, без ответов (INSERT … SELECT в БД).
+    Копия выключена; {"title": ...} в теле задаёт её название.
+    Ответ: 201 {"id": <id копии>}.
+    """
+    data = request.get_json(silent=True) or {}
+    title = data.get("title") if isinstance(data, dict) else None
+    if title is not None and (not isinstance(title, str) or not title.strip()):
+        return jsonify({"error": "invalid_title"}), 400
+
+    clone_id = clone_survey(survey_id, title=title.strip() if title else None)
+    if clone_id is None:
+        return jsonify({"error": "not_found"}), 404
+    db.session.commit()
+    return jsonify({"id": clone_id}), 201
+
+
 @api_bp.route("/surveys/<int:survey_id>", methods=["GET"])
 @api_auth_required
 def api_survey_detail(survey_id):
@@ -71,7 +140,7 @@ def api_survey_detail(survey_id):
     if not survey:
         return jsonify({"error": "not_found"}), 404
 
-    return jsonify(survey_to_dict(survey, include_questions=True))
+    return jsonify(survey_to_dict(get_compiled_survey(survey), include_questions=True))
 
 
 # ограничим частоту, чтобы не долбили POST бесконечно
@@ -107,140 +176,403 @@ def api_submit_response(survey_id):
 
     ip = request.remote_addr
 
-    # защита от накрутки: один ответ на опрос с одного client_token или IP
-    query = Response.query.filter_by(survey_id=survey_id)
-    if client_token:
-        query = query.filter(
-            (Response.client_token == client_token) | (Response.ip_address == ip)
-        )
-    else:
-        query = query.filter(Response.ip_address == ip)
+    # валидируем ответы по скомпилированной схеме опроса и сохраняем пакетно
+    compiled = get_compiled_survey(survey)
+    answers = parse_json_answers(compiled.answer_schema, answers_payload)
+
+    if current_app.config.get("SUBMISSION_INGEST_MODE") == "journal":
+        # повторы отсекутся при сбросе журнала в БД
+        journal.append(make_record(survey_id, ip, answers, client_token=client_token))
+        return jsonify({"status": "accepted"}), 202
 
-    existing = query.first()
-    if existing:
+    # защита от накрутки: один ответ на опрос с одного client_token или IP —
+    # обеспечивается уникальными индексами (INSERT … ON CONFLICT DO NOTHING)
+    response_id = save_response(survey_id, ip, answers, client_token=client_token)
+    if response_id is None:
         return jsonify({"status": "already_answered"}), 200
 
-    response = Response(
-        survey_id=survey_id,
-        ip_address=ip,
-        client_token=client_token,
-    )
-    db.session.add(response)
-    db.session.flush()
+    db.session.commit()
+    return jsonify({"status": "ok"}), 201
 
-    # валидируем и сохраняем ответы
-    questions_by_id = {
-        q.id: q for q in survey.questions.order_by(Question.id).all()
-    }
 
-    for item in answers_payload:
-        try:
-            q_id = int(item.get("question_id"))
-        except (TypeError, ValueError):
+def _parse_utc(value):
+    """ISO-время в naive UTC, как хранится Response.created_at; ValueError — если не разобрать."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _read_batch_items():
+    """
+    Элементы пакета: JSON-массив, {"responses": [...]} или NDJSON
+    (Content-Type: application/x-ndjson, по объекту на строку).
+    Нечитаемая строка NDJSON становится элементом None.
+    """
+    if request.mimetype == "application/x-ndjson":
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("responses")
+    return data if isinstance(data, list) else None
+
+
+@api_bp.route("/surveys/<int:survey_id>/responses:batch", methods=["POST"])
+@api_auth_required
+@limiter.limit("30/hour")
+def api_submit_responses_batch(survey_id):
+    """
+    Пакетная загрузка ответов (киоски, офлайн-планшеты).
+
+    Каждый элемент — как в /responses, client_token обязателен, можно
+    указать время заполнения "created_at" (ISO 8601). Повторы client_token
+    отсекаются и внутри пакета, и по уже сохранённым ответам. IP загрузчика
+    к ответам не привязывается — это адрес устройства, а не респондента.
+
+    Возвращает статус каждого элемента в порядке пакета:
+    ok / already_answered / duplicate / invalid (+ error).
+    """
+    survey = Survey.query.filter_by(id=survey_id, is_active=True).first()
+    if not survey:
+        return jsonify({"error": "not_found"}), 404
+
+    items = _read_batch_items()
+    if not items:
+        return jsonify({"error": "responses_required"}), 400
+    if len(items) > current_app.config["API_BATCH_MAX_SIZE"]:
+        return jsonify({"error": "batch_too_large"}), 413
+
+    # одна схема на весь пакет
+    compiled = get_compiled_survey(survey)
+
+    statuses = [None] * len(items)
+    records = []
+    record_positions = []
+    seen_tokens = set()
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            statuses[i] = {"status": "invalid", "error": "invalid_json"}
             continue
 
-        question = questions_by_id.get(q_id)
-        if not question:
+        client_token = item.get("client_token")
+        if not client_token or not isinstance(client_token, str):
+            statuses[i] = {"status": "invalid", "error": "client_token_required"}
             continue
 
-        if question.type == "single_choice":
-            option_id = item.get("option_id")
-            if option_id is None:
-                continue
+        answers_payload = item.get("answers")
+        if not isinstance(answers_payload, list) or len(answers_payload) == 0:
+            statuses[i] = {"status": "invalid", "error": "answers_required"}
+            continue
+
+        created_at = None
+        if item.get("created_at") is not None:
             try:
-                option_id = int(option_id)
+                created_at = _parse_utc(item["created_at"])
             except (TypeError, ValueError):
+                statuses[i] = {"status": "invalid", "error": "invalid_created_at"}
                 continue
 
-            option = Option.query.filter_by(
-                id=option_id,
-                question_id=question.id,
-            ).first()
-            if not option:
-                continue
+        if client_token in seen_tokens:
+            statuses[i] = {"status": "duplicate"}
+            continue
+        seen_tokens.add(client_token)
 
-            answer = Answer(
-                response_id=response.id,
-                question_id=question.id,
-                option_id=option.id,
-            )
-            db.session.add(answer)
+        answers = parse_json_answers(compiled.answer_schema, answers_payload)
+        records.append(make_record(
+            survey_id, None, answers,
+            client_token=client_token, created_at=created_at,
+        ))
+        record_positions.append(i)
 
-        else:  # text
-            text_answer = item.get("text_answer", "")
-            if not text_answer or not isinstance(text_answer, str):
-                continue
-            text_answer = text_answer.strip()
-            if not text_answer:
-                continue
+    # многострочные INSERT; повторы по БД отсекает уникальный индекс
+    response_ids = save_responses(records)
+    db.session.commit()
 
-            answer = Answer(
-                response_id=response.id,
-                question_id=question.id,
-                text_answer=text_answer,
-            )
-            db.session.add(answer)
+    for i, response_id in zip(record_positions, response_ids):
+        statuses[i] = {"status": "ok" if response_id else "already_answered"}
 
-    db.session.commit()
-    return jsonify({"status": "ok"}), 201
+    return jsonify({"items": statuses}), 200
 
 
 @api_bp.route("/surveys/<int:survey_id>/results", methods=["GET"])
 @api_auth_required
 def api_survey_results(survey_id):
-    """JSON-статистика по опросу: выборочные и текстовые ответы."""
-    survey = Survey.query.get(survey_id)
+    """
+    JSON-статистика по опросу: выборочные и текстовые ответы.
+
+    Для number/range/date отдаётся числовая сводка ("numeric"); перечень
+    отдельных значений ("values") — только с ?values=1.
+
+    Ответ кэшируется до нового ответа или изменения схемы (app/results_cache.py)
+    и отдаётся с ETag; при совпадении If-None-Match — 304.
+    """
+    survey = _get_survey(survey_id)
     if not survey:
         return jsonify({"error": "not_found"}), 404
 
+    with_values = request.args.get("values") == "1"
+
+    def compute(watermark):
+        payload = _results_payload(survey, watermark, with_values)
+        return current_app.json.dumps(payload).encode("utf-8")
+
+    etag, body = cached_results(("api", with_values), survey, compute)
+    return conditional_response(etag, body, mimetype="application/json")
+
+
+def _results_payload(survey, watermark, with_values):
+    compiled = get_compiled_survey(survey)
     result = {
         "survey": survey_to_dict(survey),
+        "responses_count": watermark.responses_count,
         "questions": [],
     }
 
-    for question in survey.questions.order_by(Question.id).all():
+    # весь опрос — двумя запросами к счётчикам (app/results.py)
+    for block in survey_results(compiled, with_values=with_values):
+        question = block["question"]
         q_block = {
             "id": question.id,
             "text": question.text,
             "type": question.type,
-        }
-        if question.type == "single_choice":
-            stats = (
-                db.session.query(
-                    Option.id,
-                    Option.text,
-                    func.count(Answer.id).label("answers_count"),
-                )
-                .outerjoin(Answer, Answer.option_id == Option.id)
-                .filter(Option.question_id == question.id)
-                .group_by(Option.id, Option.text)
-                .all()
-            )
-
-            total = sum(row.answers_count for row in stats) or 1
-            q_block["options"] = [
+            "options": [
                 {
-                    "id": row.id,
-                    "text": row.text,
-                    "count": row.answers_count,
-                    "percent": round(row.answers_count * 100.0 / total, 2),
+                    "id": row["option_id"],
+                    "text": row["option_text"],
+                    "count": row["count"],
+                    "percent": row["percent"],
                 }
-                for row in stats
-            ]
-            q_block["text_answers"] = []
-        else:
-            answers = (
-                Answer.query
-                .filter(
-                    Answer.question_id == question.id,
-                    Answer.text_answer.isnot(None),
-                    Answer.text_answer != "",
-                )
-                .all()
+                for row in block["options_stats"]
+            ],
+        }
+        if question.type in NUMERIC_TYPES:
+            q_block["numeric"] = block["numeric_stats"]
+        if question.type not in CHOICE_TYPES:
+            if with_values or question.type not in NUMERIC_TYPES:
+                q_block["values"] = block["value_stats"]
+            # сами тексты — постранично через /questions/<id>/text_answers
+            q_block["text_answers_count"] = block["text_count"]
+            q_block["text_answers_url"] = url_for(
+                "api.api_question_text_answers",
+                survey_id=survey.id,
+                question_id=question.id,
             )
-            q_block["options"] = []
-            q_block["text_answers"] = [a.text_answer for a in answers]
 
         result["questions"].append(q_block)
 
-    return jsonify(result)
+    return result
+
+
+@api_bp.route("/surveys/<int:survey_id>/crosstab", methods=["GET"])
+@api_auth_required
+def api_survey_crosstab(survey_id):
+    """
+    Таблица сопряжённости: ?rows=<question_id>&cols=<question_id>.
+
+    Оба вопроса — вариантные или со свободным значением (не long_text);
+    у вопроса со свободным значением — не больше CROSSTAB_MAX_VALUES разных
+    ответов, иначе 400 axis_too_wide. Кэшируется так же, как результаты опроса.
+    """
+    survey = _get_survey(survey_id)
+    if not survey:
+        return jsonify({"error": "not_found"}), 404
+
+    compiled = get_compiled_survey(survey)
+    questions = {q.id: q for q in compiled.questions}
+    row_question = questions.get(request.args.get("rows", type=int))
+    col_question = questions.get(request.args.get("cols", type=int))
+    if row_question is None or col_question is None:
+        return jsonify({"error": "questions_required"}), 400
+    if row_question.type not in CROSSTAB_TYPES or col_question.type not in CROSSTAB_TYPES:
+        return jsonify({"error": "unsupported_question_type"}), 400
+
+    def compute(watermark):
+        try:
+            table = crosstab(row_question, col_question)
+        except ValueError as exc:
+            # отказ кэшируется так же — до нового ответа ось не сузится
+            return 400, current_app.json.dumps({"error": "axis_too_wide", "detail": str(exc)}).encode("utf-8")
+        table["rows_question"] = {"id": row_question.id, "text": row_question.text, "type": row_question.type}
+        table["cols_question"] = {"id": col_question.id, "text": col_question.text, "type": col_question.type}
+        return 200, current_app.json.dumps(table).encode("utf-8")
+
+    etag, (status, body) = cached_results(("crosstab", row_question.id, col_question.id), survey, compute)
+    if status != 200:
+        return current_app.response_class(body, status=status, mimetype="application/json")
+    return conditional_response(etag, body, mimetype="application/json")
+
+
+@api_bp.route("/surveys/<int:survey_id>/timeseries", methods=["GET"])
+@api_auth_required
+def api_survey_timeseries(survey_id):
+    """
+    Число ответов по корзинам времени.
+
+    ?bucket=minute|hour|day (по умолчанию hour), ?from=&to= — ISO-время
+    (по умолчанию — последние часы/дни до текущего момента),
+    ?option=<option_id> — число выборов варианта вместо числа ответов.
+    """
+    survey = _get_survey(survey_id)
+    if not survey:
+        return jsonify({"error": "not_found"}), 404
+
+    bucket = request.args.get("bucket", "hour")
+    if bucket not in timeseries.BUCKETS:
+        return jsonify({"error": "unsupported_bucket"}), 400
+
+    try:
+        end = _parse_utc(request.args["to"]) if "to" in request.args else datetime.utcnow()
+        start = (
+            _parse_utc(request.args["from"]) if "from" in request.args
+            else end - timeseries.DEFAULT_SPANS[bucket]
+        )
+    except ValueError:
+        return jsonify({"error": "invalid_range"}), 400
+    if start >= end:
+        return jsonify({"error": "invalid_range"}), 400
+    if timeseries.points_count(bucket, start, end) > timeseries.MAX_POINTS:
+        return jsonify({"error": "range_too_large"}), 400
+
+    option_id = request.args.get("option", type=int)
+    if option_id is not None:
+        compiled = get_compiled_survey(survey)
+        if not any(o.id == option_id for q in compiled.questions for o in q.options):
+            return jsonify({"error": "not_found"}), 404
+
+    series = timeseries.response_series(survey.id, bucket, start, end, option_id=option_id)
+    return jsonify({
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "option_id": option_id,
+        "total": sum(count for _, count in series),
+        "points": [{"t": moment.isoformat(), "count": count} for moment, count in series],
+    })
+
+
+@api_bp.route("/surveys/<int:survey_id>/search", methods=["GET"])
+@api_auth_required
+def api_survey_search(survey_id):
+    """
+    Полнотекстовый поиск по свободным ответам опроса.
+
+    ?q=<запрос>&question=<question_id>&limit=<до SEARCH_MAX_RESULTS>
+    Ответ: {"items": [{answer_id, response_id, question_id, text, rank}]}.
+    """
+    survey = _get_survey(survey_id)
+    if not survey:
+        return jsonify({"error": "not_found"}), 404
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "query_required"}), 400
+
+    limit = request.args.get("limit", 20, type=int)
+    limit = max(1, min(limit, current_app.config["SEARCH_MAX_RESULTS"]))
+
+    items = search_answers(
+        get_compiled_survey(survey), query,
+        question_id=request.args.get("question", type=int), limit=limit,
+    )
+    return jsonify({"items": items})
+
+
+@api_bp.route("/surveys/<int:survey_id>/questions/<int:question_id>/text_answers", methods=["GET"])
+@api_auth_required
+def api_question_text_answers(survey_id, question_id):
+    """
+    Текстовые ответы на вопрос постранично.
+
+    ?cursor=<next_cursor из предыдущей страницы>&limit=<до TEXT_ANSWERS_MAX_PAGE>
+    Ответ: {"items": [...], "next_cursor": "<response_id>.<answer_key>" | null}.
+    """
+    question = Question.query.filter_by(id=question_id, survey_id=survey_id).first()
+    if not question:
+        return jsonify({"error": "not_found"}), 404
+
+    try:
+        after = _parse_text_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify({"error": "bad_cursor"}), 400
+    limit = request.args.get("limit", 100, type=int)
+    limit = max(1, min(limit, current_app.config["TEXT_ANSWERS_MAX_PAGE"]))
+
+    items, next_cursor = text_answers_page(question.id, after=after, limit=limit)
+    if next_cursor is not None:
+        next_cursor = "%d.%d" % next_cursor
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+def _parse_text_cursor(raw):
+    """Курсор "<response_id>.<answer_key>" → пара; ValueError, если не разобрать."""
+    if not raw:
+        return None
+    response_id, dot, answer_key = raw.partition(".")
+    if not dot:
+        raise ValueError(raw)
+    return int(response_id), int(answer_key)
+
+
+@api_bp.route("/surveys/<int:survey_id>/export", methods=["GET"])
+@api_auth_required
+def api_survey_export(survey_id):
+    """
+    Потоковая выгрузка сырых ответов: строка на респондента.
+
+    ?format=ndjson (по умолчанию) или csv. Ответы читаются серверным
+    курсором, поэтому память не зависит от размера опроса.
+
+    ?format=parquet — колоночный файл, который кэшируется на диске до
+    следующего ответа (app/exports.py); отдаётся с ETag. Пока файл большого
+    опроса собирается в фоне, отдаётся предыдущий готовый, а если его нет —
+    202 {"status": "building"} с Retry-After.
+    """
+    survey = _get_survey(survey_id)
+    if not survey:
+        return jsonify({"error": "not_found"}), 404
+
+    export_format = request.args.get("format", "ndjson")
+    if export_format == "parquet":
+        return _parquet_response(survey)
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "unsupported_format"}), 400
+
+    generate, mimetype = EXPORT_FORMATS[export_format]
+    compiled = get_compiled_survey(survey)
+    return current_app.response_class(
+        stream_with_context(generate(compiled)),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition":
+                f"attachment; filename=survey-{survey_id}.{export_format}",
+        },
+    )
+
+
+def _parquet_response(survey):
+    try:
+        path = parquet_export(get_compiled_survey(survey), results_watermark(survey))
+    except ImportError:
+        # pyarrow не установлен
+        return jsonify({"error": "format_unavailable"}), 501
+    if path is None:
+        return jsonify({"status": "building"}), 202, {"Retry-After": "5"}
+
+    return send_file(
+        path,
+        mimetype="application/vnd.apache.parquet",
+        as_attachment=True,
+        download_name=f"survey-{survey.id}.parquet",
+        etag=os.path.basename(path),
+        conditional=True,
+    )
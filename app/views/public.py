@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, abort, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, abort, current_app, session
+from sqlalchemy import select, exists
 from extensions import db, limiter
-from models import Survey, Response, Answer, Option, Question
+from models import Survey, Response
+from app.page_cache import cached_page, conditional_response
+from app.schema_cache import get_compiled_survey, get_active_surveys
+from app.journal import journal
+from app.submissions import parse_form_answers, save_response, make_record
 
 public_bp = Blueprint("public", __name__)
 
@@ -9,12 +14,21 @@ public_bp = Blueprint("public", __name__)
 def index():
     ip = request.remote_addr
 
-    # все активные опросы
-    active_surveys = Survey.query.filter_by(is_active=True).all()
-
-    # все ответы этого IP
-    responses = Response.query.filter_by(ip_address=ip).all()
-    completed_ids = {r.survey_id for r in responses}
+    # активные опросы — общий список воркера с коротким TTL
+    active_surveys = get_active_surveys()
+
+    # пройденные этим IP — только id, полусоединение через EXISTS
+    completed_ids = set(
+        db.session.scalars(
+            select(Survey.id).where(
+                Survey.is_active.is_(True),
+                exists().where(
+                    Response.survey_id == Survey.id,
+                    Response.ip_address == ip,
+                ),
+            )
+        )
+    )
 
     available_surveys = [s for s in active_surveys if s.id not in completed_ids]
     completed_surveys = [s for s in active_surveys if s.id in completed_ids]
@@ -40,8 +54,17 @@ def show_survey(survey_id):
         if existing:
             return redirect(url_for("public.thank_you", survey_id=survey_id))
 
-
-    return render_template("public/survey_fill.html", survey=survey)
+    # страница зависит только от версии схемы и шапки (вошёл ли админ),
+    # поэтому рендерим её один раз на версию и отдаём со строгим ETag
+    admin_username = session.get("admin_username") if session.get("admin_logged_in") else None
+    etag, body = cached_page(
+        ("survey_fill", survey.id, survey.schema_version, admin_username),
+        lambda: render_template(
+            "public/survey_fill.html",
+            survey=get_compiled_survey(survey),
+        ),
+    )
+    return conditional_response(etag, body)
 
 
 @limiter.limit("5/minute")
@@ -53,65 +76,20 @@ def submit_survey(survey_id):
 
     ip = request.remote_addr
 
-    if not current_app.config.get("ALLOW_MULTIPLE_RESPONSES", False):
-        existing = Response.query.filter_by(survey_id=survey_id, ip_address=ip).first()
-        if existing:
-            return redirect(url_for("public.thank_you", survey_id=survey_id))
+    # вся форма проверяется в памяти по скомпилированной схеме опроса
+    compiled = get_compiled_survey(survey)
+    answers = parse_form_answers(compiled.answer_schema, request.form)
+
+    # повторный ответ с того же IP отсекает уникальный индекс;
+    # при ALLOW_MULTIPLE_RESPONSES ответ в этом правиле не участвует
+    unique = not current_app.config.get("ALLOW_MULTIPLE_RESPONSES", False)
 
-    response = Response(survey_id=survey_id, ip_address=ip)
-    db.session.add(response)
-    db.session.flush()
-
-    for question in survey.questions.order_by(Question.id).all():
-        if question.type == "single_choice":
-            field_name = f"question_{question.id}"
-            option_id = request.form.get(field_name)
-            if option_id:
-                try:
-                    option_id_int = int(option_id)
-                except ValueError:
-                    continue
-                option = Option.query.filter_by(
-                    id=option_id_int,
-                    question_id=question.id
-                ).first()
-                if option:
-                    answer = Answer(
-                        response_id=response.id,
-                        question_id=question.id,
-                        option_id=option.id
-                    )
-                    db.session.add(answer)
-        elif question.type == "multiple_choice":
-            field_name = f"question_{question.id}_multi"
-            option_ids = request.form.getlist(field_name)
-            for oid in option_ids:
-                try:
-                    oid_int = int(oid)
-                except:
-                    continue
-                option = Option.query.filter_by(id=oid_int, question_id=question.id).first()
-                if option:
-                    db.session.add(Answer(
-                        response_id=response.id,
-                        question_id=question.id,
-                        option_id=option.id
-                    ))
-
-        elif question.type in ["text", "long_text", "number", "range", "date"]:
-            field_name = f"question_{question.id}"
-            value = request.form.get(field_name, "").strip()
-            if value:
-                db.session.add(Answer(
-                    response_id=response.id,
-                    question_id=question.id,
-                    text_answer=value
-                ))
-        else:
-            continue
-
-
-    db.session.commit()
+    if current_app.config.get("SUBMISSION_INGEST_MODE") == "journal":
+        # подтверждаем сразу, в БД ответ попадёт фоновым сбросом журнала
+        journal.append(make_record(survey_id, ip, answers, unique=unique))
+    else:
+        save_response(survey_id, ip, answers, unique=unique)
+        db.session.commit()
     return redirect(url_for("public.thank_you", survey_id=survey_id))
 
 
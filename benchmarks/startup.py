@@ -0,0 +1,76 @@
+"""
+Время старта воркера: импорт wsgi (create_app) в свежем процессе — так же,
+как его загружает воркер gunicorn, — и повторный create_app() в уже
+прогретом процессе.
+
+    DATABASE_URL=... python benchmarks/startup.py [--runs 10]
+
+База для замера не нужна: create_app не подключается к БД, DATABASE_URL
+нужен только конфигу.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# печатает время импорта wsgi и список импортированных тяжёлых модулей
+COLD_START = """
+import sys, time
+started = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - started
+heavy = [m for m in ("alembic", "flask_migrate", "pyarrow") if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def cold_starts(runs):
+    timings = []
+    heavy = ""
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START],
+            cwd=PROJECT_ROOT, check=True, capture_output=True, text=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ""
+    return timings, heavy
+
+
+def warm_create_app(runs):
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import create_app
+
+    create_app()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        create_app()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name, timings):
+    print(
+        f"{name:<28} median {statistics.median(timings) * 1000:7.1f} ms   "
+        f"min {min(timings) * 1000:7.1f} ms   max {max(timings) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    timings, heavy = cold_starts(args.runs)
+    report("import wsgi (новый процесс)", timings)
+    print(f"{'':<28} тяжёлые модули: {heavy or 'нет'}")
+    report("create_app() (прогретый)", warm_create_app(args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,3 +15,77 @@ class Config:
 
     # если 1 — разрешаем много раз проходить опросы с одного IP (для тестов)
     ALLOW_MULTIPLE_RESPONSES = os.environ.get("ALLOW_MULTIPLE_RESPONSES", "0") == "1"
+
+    # размер кэша скомпилированных схем опросов (на воркер)
+    SCHEMA_CACHE_SIZE = int(os.environ.get("SCHEMA_CACHE_SIZE", "256"))
+
+    # режим приёма ответов: direct — запись в БД в запросе,
+    # journal — в локальный журнал с фоновой пакетной записью в БД
+    SUBMISSION_INGEST_MODE = os.environ.get("SUBMISSION_INGEST_MODE", "direct")
+    # каталог сегментов журнала (по умолчанию <instance>/journal)
+    JOURNAL_DIR = os.environ.get("JOURNAL_DIR")
+    # не дольше этого (сек) ответ ждёт записи в БД
+    JOURNAL_MAX_FLUSH_DELAY = float(os.environ.get("JOURNAL_MAX_FLUSH_DELAY", "2"))
+    # сбрасываем раньше, если накопилось столько ответов
+    JOURNAL_BATCH_SIZE = int(os.environ.get("JOURNAL_BATCH_SIZE", "500"))
+
+    # хранение ответов: rows — строка answer на ответ, packed — все ответы
+    # респондента одним JSONB в response.packed_answers (app/answers.py)
+    ANSWER_STORAGE = os.environ.get("ANSWER_STORAGE", "rows")
+
+    # размер кэша отрендеренных страниц опросов (на воркер)
+    PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "512"))
+
+    # время жизни (сек) списка активных опросов, общего для запросов воркера
+    ACTIVE_SURVEYS_TTL = float(os.environ.get("ACTIVE_SURVEYS_TTL", "5"))
+
+    # хранилище лимитов Flask-Limiter; shm:///path — общая для всех воркеров
+    # узла таблица в разделяемой памяти (ratelimit_storage.py)
+    RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter")
+
+    # максимум ответов в одном запросе /api/surveys/<id>/responses:batch
+    API_BATCH_MAX_SIZE = int(os.environ.get("API_BATCH_MAX_SIZE", "1000"))
+
+    # доудалять опросы, чьё фоновое удаление оборвал рестарт воркера
+    # (app/survey_purge.py); запускается первым запросом воркера
+    SURVEY_PURGE_RESUME = os.environ.get("SURVEY_PURGE_RESUME", "1") == "1"
+
+    # максимум вопросов в импортируемом JSON-описании опроса
+    SURVEY_IMPORT_MAX_QUESTIONS = int(os.environ.get("SURVEY_IMPORT_MAX_QUESTIONS", "1000"))
+
+    # на сколько строк разложен каждый счётчик результатов: параллельные
+    # ответы на один вариант обновляют разные строки (app/tallies.py)
+    TALLY_SHARDS = int(os.environ.get("TALLY_SHARDS", "8"))
+
+    # кэш посчитанных результатов опросов (на воркер) и окно (сек), в течение
+    # которого после новых ответов ещё отдаются прежние результаты; 0 — всегда свежие
+    RESULTS_CACHE_SIZE = int(os.environ.get("RESULTS_CACHE_SIZE", "256"))
+    RESULTS_CACHE_STALE_SECONDS = float(os.environ.get("RESULTS_CACHE_STALE_SECONDS", "0"))
+
+    # числовая сводка по number/range/date: процентили и число корзин гистограммы
+    RESULTS_PERCENTILES = [
+        float(p) for p in os.environ.get("RESULTS_PERCENTILES", "25,50,75,90").split(",") if p.strip()
+    ]
+    RESULTS_HISTOGRAM_BINS = int(os.environ.get("RESULTS_HISTOGRAM_BINS", "10"))
+
+    # максимум разных значений на оси таблицы сопряжённости со свободными
+    # значениями (text, number, date): таблица плотная, растёт как строки × столбцы
+    CROSSTAB_MAX_VALUES = int(os.environ.get("CROSSTAB_MAX_VALUES", "100"))
+
+    # каталог кэша Parquet-выгрузок (по умолчанию <instance>/exports)
+    EXPORT_CACHE_DIR = os.environ.get("EXPORT_CACHE_DIR")
+    # Parquet собирается прямо в запросе, только если ответов не больше
+    # этого; больший опрос — в фоне, а клиент получает 202 и Retry-After
+    EXPORT_PARQUET_SYNC_MAX_RESPONSES = int(os.environ.get("EXPORT_PARQUET_SYNC_MAX_RESPONSES", "20000"))
+
+    # поиск по свободным ответам: postgres — tsvector + GIN в БД,
+    # memory — инвертированный индекс в памяти воркера (разработка, тесты)
+    TEXT_SEARCH_BACKEND = os.environ.get("TEXT_SEARCH_BACKEND", "postgres")
+    SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "100"))
+
+    # максимальный размер страницы текстовых ответов в API
+    TEXT_ANSWERS_MAX_PAGE = int(os.environ.get("TEXT_ANSWERS_MAX_PAGE", "1000"))
+
+    # опросов на странице списка в админке
+    ADMIN_SURVEYS_PER_PAGE = int(os.environ.get("ADMIN_SURVEYS_PER_PAGE", "50"))
@@ -1,10 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+import ratelimit_storage  # noqa: F401 — регистрирует схему shm:// для RATELIMIT_STORAGE_URI
+
 db = SQLAlchemy()
-migrate = Migrate()
 
 limiter = Limiter(
     key_func=get_remote_address,
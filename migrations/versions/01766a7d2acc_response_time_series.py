@@ -0,0 +1,70 @@
+"""response time series
+
+Revision ID: 01766a7d2acc
+Revises: 15529ae6da83
+Create Date: 2026-10-18 18:12:23.792483
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '01766a7d2acc'
+down_revision = '15529ae6da83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('survey_hourly_tally',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('response_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id', 'bucket', 'shard')
+    )
+    op.create_table('option_hourly_tally',
+    sa.Column('option_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('answer_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['option_id'], ['option.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('option_id', 'bucket', 'shard')
+    )
+    with op.batch_alter_table('option_hourly_tally', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_option_hourly_tally_survey_id'), ['survey_id'], unique=False)
+
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.create_index('ix_response_survey_created_at', ['survey_id', 'created_at'], unique=False)
+
+    # свёртки по уже собранным ответам (то же, что `flask tallies rebuild`)
+    op.execute("""
+        INSERT INTO survey_hourly_tally (survey_id, bucket, shard, response_count)
+        SELECT survey_id, date_trunc('hour', created_at), 0, count(*)
+        FROM response
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO option_hourly_tally (option_id, bucket, shard, survey_id, answer_count)
+        SELECT a.option_id, date_trunc('hour', r.created_at), 0, r.survey_id, count(*)
+        FROM answer a JOIN response r ON r.id = a.response_id
+        WHERE a.option_id IS NOT NULL AND r.created_at IS NOT NULL
+        GROUP BY 1, 2, 4
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.drop_index('ix_response_survey_created_at')
+
+    with op.batch_alter_table('option_hourly_tally', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_option_hourly_tally_survey_id'))
+
+    op.drop_table('option_hourly_tally')
+
+    op.drop_table('survey_hourly_tally')
@@ -0,0 +1,43 @@
+"""hot query indexes
+
+Revision ID: 10971ef3769f
+Revises: dc55497e78f0
+Create Date: 2026-10-18 18:20:45.516506
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '10971ef3769f'
+down_revision = 'dc55497e78f0'
+branch_labels = None
+depends_on = None
+
+
+# (имя, таблица, колонки)
+INDEXES = [
+    ("ix_answer_question_id_response_id", "answer", ["question_id", "response_id"]),
+    ("ix_answer_response_id", "answer", ["response_id"]),
+    ("ix_answer_option_id", "answer", ["option_id"]),
+    ("ix_option_question_id", "option", ["question_id"]),
+    ("ix_question_survey_id", "question", ["survey_id"]),
+    ("ix_response_ip_address_survey_id", "response", ["ip_address", "survey_id"]),
+]
+
+
+def upgrade():
+    # CONCURRENTLY строит индекс без блокировки записи в таблицу, но не
+    # работает внутри транзакции — отсюда autocommit_block. Если сборка
+    # прервётся, PostgreSQL оставит индекс INVALID: его нужно удалить
+    # (DROP INDEX CONCURRENTLY) и повторить upgrade.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
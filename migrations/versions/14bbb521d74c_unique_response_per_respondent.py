@@ -0,0 +1,61 @@
+"""unique response per respondent
+
+Revision ID: 14bbb521d74c
+Revises: 7eede12bbf34
+Create Date: 2026-10-18 18:41:37.902215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '14bbb521d74c'
+down_revision = '7eede12bbf34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_unique', sa.Boolean(), server_default=sa.true(), nullable=False))
+
+    # уже накопленные повторы: «уникальным» остаётся только первый ответ
+    # респондента, иначе уникальные индексы не построятся
+    op.execute("""
+        UPDATE response SET is_unique = false
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY survey_id, ip_address ORDER BY id
+                ) AS rn
+                FROM response
+                WHERE ip_address IS NOT NULL
+            ) dup
+            WHERE dup.rn > 1
+        )
+    """)
+    op.execute("""
+        UPDATE response SET is_unique = false
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY survey_id, client_token ORDER BY id
+                ) AS rn
+                FROM response
+                WHERE client_token IS NOT NULL AND is_unique
+            ) dup
+            WHERE dup.rn > 1
+        )
+    """)
+
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.create_index('uq_response_survey_client_token', ['survey_id', 'client_token'], unique=True, postgresql_where=sa.text('is_unique'))
+        batch_op.create_index('uq_response_survey_ip', ['survey_id', 'ip_address'], unique=True, postgresql_where=sa.text('is_unique'))
+
+
+def downgrade():
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.drop_index('uq_response_survey_ip', postgresql_where=sa.text('is_unique'))
+        batch_op.drop_index('uq_response_survey_client_token', postgresql_where=sa.text('is_unique'))
+        batch_op.drop_column('is_unique')
@@ -0,0 +1,94 @@
+"""result tallies
+
+Revision ID: 15529ae6da83
+Revises: 14bbb521d74c
+Create Date: 2026-10-18 18:07:47.289916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '15529ae6da83'
+down_revision = '14bbb521d74c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('survey_tally',
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('response_count', sa.BigInteger(), nullable=False),
+    sa.Column('last_response_id', sa.Integer(), nullable=True),
+    sa.Column('last_response_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('survey_id', 'shard')
+    )
+    op.create_table('value_tally',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('value_key', sa.String(length=32), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Text(), nullable=True),
+    sa.Column('answer_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id', 'value_key', 'shard')
+    )
+    with op.batch_alter_table('value_tally', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_value_tally_survey_id'), ['survey_id'], unique=False)
+
+    op.create_table('option_tally',
+    sa.Column('option_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('survey_id', sa.Integer(), nullable=False),
+    sa.Column('answer_count', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['option_id'], ['option.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['survey_id'], ['survey.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('option_id', 'shard')
+    )
+    with op.batch_alter_table('option_tally', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_option_tally_survey_id'), ['survey_id'], unique=False)
+
+    # счётчики по уже собранным ответам (то же, что `flask tallies rebuild`)
+    op.execute("""
+        INSERT INTO survey_tally (survey_id, shard, response_count, last_response_id, last_response_at)
+        SELECT survey_id, 0, count(*), max(id), max(created_at)
+        FROM response
+        GROUP BY survey_id
+    """)
+    op.execute("""
+        INSERT INTO option_tally (option_id, shard, survey_id, answer_count)
+        SELECT a.option_id, 0, q.survey_id, count(*)
+        FROM answer a JOIN question q ON q.id = a.question_id
+        WHERE a.option_id IS NOT NULL
+        GROUP BY a.option_id, q.survey_id
+    """)
+    op.execute("""
+        INSERT INTO value_tally (question_id, value_key, shard, survey_id, value, answer_count)
+        SELECT a.question_id,
+               CASE WHEN q.type IN ('text', 'number', 'range', 'date') THEN md5(a.text_answer) ELSE '' END,
+               0,
+               q.survey_id,
+               CASE WHEN q.type IN ('text', 'number', 'range', 'date') THEN a.text_answer END,
+               count(*)
+        FROM answer a JOIN question q ON q.id = a.question_id
+        WHERE q.type NOT IN ('single_choice', 'multiple_choice')
+          AND a.option_id IS NULL AND a.text_answer IS NOT NULL AND a.text_answer <> ''
+        GROUP BY 1, 2, 4, 5
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('option_tally', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_option_tally_survey_id'))
+
+    op.drop_table('option_tally')
+
+    with op.batch_alter_table('value_tally', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_value_tally_survey_id'))
+
+    op.drop_table('value_tally')
+    op.drop_table('survey_tally')
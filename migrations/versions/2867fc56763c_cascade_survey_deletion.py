@@ -0,0 +1,59 @@
+"""cascade survey deletion
+
+Revision ID: 2867fc56763c
+Revises: 10971ef3769f
+Create Date: 2026-10-18 18:24:27.449472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2867fc56763c'
+down_revision = '10971ef3769f'
+branch_labels = None
+depends_on = None
+
+
+# (таблица, имя ограничения, колонка, ссылка)
+FOREIGN_KEYS = [
+    ("question", "question_survey_id_fkey", "survey_id", "survey(id)"),
+    ("option", "option_question_id_fkey", "question_id", "question(id)"),
+    ("response", "response_survey_id_fkey", "survey_id", "survey(id)"),
+    ("answer", "answer_response_id_fkey", "response_id", "response(id)"),
+    ("answer", "answer_question_id_fkey", "question_id", "question(id)"),
+    ("answer", "answer_option_id_fkey", "option_id", "option(id)"),
+]
+
+
+def _replace_foreign_keys(on_delete):
+    # замена FK с NOT VALID не сканирует таблицы: ACCESS EXCLUSIVE держится
+    # мгновения. Проверка существующих строк — отдельным VALIDATE (SHARE UPDATE
+    # EXCLUSIVE, запись не блокирует), и обязательно после коммита замены,
+    # иначе эксклюзивная блокировка дожила бы до конца проверки
+    for table, name, column, target in FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE {table} DROP CONSTRAINT {name}, "
+            f"ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target}{on_delete} NOT VALID"
+        )
+    # autocommit_block коммитит транзакцию миграции до VALIDATE
+    with op.get_context().autocommit_block():
+        for table, name, _, _ in FOREIGN_KEYS:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def upgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('purged_responses', sa.Integer(), server_default='0', nullable=False))
+
+    _replace_foreign_keys(" ON DELETE CASCADE")
+
+
+def downgrade():
+    _replace_foreign_keys("")
+
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.drop_column('purged_responses')
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,26 @@
+"""survey schema version
+
+Revision ID: 7eede12bbf34
+Revises: c4d97cf27bfc
+Create Date: 2026-10-18 18:05:12.318412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7eede12bbf34'
+down_revision = 'c4d97cf27bfc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('schema_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('survey', schema=None) as batch_op:
+        batch_op.drop_column('schema_version')
@@ -0,0 +1,67 @@
+"""answer full text search
+
+Revision ID: a9baa0c7fbb8
+Revises: 01766a7d2acc
+Create Date: 2026-10-18 18:14:00.763593
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9baa0c7fbb8'
+down_revision = '01766a7d2acc'
+branch_labels = None
+depends_on = None
+
+
+# строк answer, дозаполняемых за одну транзакцию
+BACKFILL_CHUNK_SIZE = 10000
+
+
+def upgrade():
+    # Не GENERATED-колонка: её добавление переписало бы всю таблицу answer
+    # под ACCESS EXCLUSIVE. Nullable-колонка без значения по умолчанию
+    # добавляется мгновенно; новые и изменённые строки заполняет триггер,
+    # старые — порции UPDATE, каждая в своей транзакции.
+    op.add_column('answer', sa.Column('text_search', postgresql.TSVECTOR(), nullable=True))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION answer_text_search_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.text_search := to_tsvector('russian'::regconfig, coalesce(NEW.text_answer, ''));
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER answer_text_search
+        BEFORE INSERT OR UPDATE OF text_answer ON answer
+        FOR EACH ROW EXECUTE FUNCTION answer_text_search_update()
+    """)
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = connection.scalar(sa.text("SELECT max(id) FROM answer")) or 0
+        for first_id in range(1, last_id + 1, BACKFILL_CHUNK_SIZE):
+            connection.execute(sa.text("""
+                UPDATE answer
+                SET text_search = to_tsvector('russian'::regconfig, coalesce(text_answer, ''))
+                WHERE id >= :first_id AND id < :next_id AND text_search IS NULL
+            """), {"first_id": first_id, "next_id": first_id + BACKFILL_CHUNK_SIZE})
+
+        # как в 10971ef3769f: прерванная сборка оставляет индекс INVALID —
+        # удалить его (DROP INDEX CONCURRENTLY) и повторить upgrade
+        op.create_index(
+            'ix_answer_text_search', 'answer', ['text_search'], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_answer_text_search', table_name='answer', postgresql_concurrently=True)
+    op.execute("DROP TRIGGER answer_text_search ON answer")
+    op.execute("DROP FUNCTION answer_text_search_update()")
+    op.drop_column('answer', 'text_search')
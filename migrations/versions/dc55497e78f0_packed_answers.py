@@ -0,0 +1,27 @@
+"""packed answers
+
+Revision ID: dc55497e78f0
+Revises: a9baa0c7fbb8
+Create Date: 2026-10-18 18:17:43.804295
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'dc55497e78f0'
+down_revision = 'a9baa0c7fbb8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('packed_answers', postgresql.JSONB(none_as_null=True, astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    # упакованные ответы пропадут — перед откатом: flask answers unpack
+    with op.batch_alter_table('response', schema=None) as batch_op:
+        batch_op.drop_column('packed_answers')
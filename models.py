@@ -1,4 +1,6 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 
@@ -24,26 +26,43 @@ class Survey(db.Model):
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
+    # растёт при любом изменении вопросов/вариантов — ключ кэша схемы
+    schema_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # опрос удаляется в фоне (app/survey_purge.py): с этого момента он скрыт
+    # отовсюду, а purged_responses — сколько его ответов уже удалено
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    purged_responses = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     questions = db.relationship(
         "Question",
         backref="survey",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
     responses = db.relationship(
         "Response",
         backref="survey",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
+    # вопросы по порядку — списком, для загрузки всего дерева опроса
+    # фиксированным числом запросов (app/schema_cache.load_survey_tree);
+    # dynamic-отношение выше — для запросов вида survey.questions.count().
+    # Порядок начинается с внешнего ключа: selectin-загрузка
+    # (WHERE survey_id IN (...)) идёт по ix_question_survey_id, а не полным
+    # проходом первичного ключа ради ORDER BY id
+    question_list = db.relationship(
+        "Question", viewonly=True, order_by="(Question.survey_id, Question.id)"
+    )
 
 
 class Question(db.Model):
     __tablename__ = "question"
 
     id = db.Column(db.Integer, primary_key=True)
-    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id"), nullable=False)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True)
     text = db.Column(db.String(500), nullable=False)
     # допустимые типы:
     #   single_choice   – один вариант из списка
@@ -57,14 +76,20 @@ class Question(db.Model):
         "Option",
         backref="question",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
     answers = db.relationship(
         "Answer",
         backref="question",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
+    # варианты по порядку — списком (см. Survey.question_list)
+    option_list = db.relationship(
+        "Option", viewonly=True, order_by="(Option.question_id, Option.id)"
+    )
 
 
 
@@ -72,44 +97,175 @@ class Option(db.Model):
     __tablename__ = "option"
 
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), nullable=False, index=True)
     text = db.Column(db.String(255), nullable=False)
 
     answers = db.relationship(
         "Answer",
         backref="option",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
 
 
 class Response(db.Model):
     __tablename__ = "response"
+    __table_args__ = (
+        # повторный ответ отсекает сама БД: INSERT … ON CONFLICT DO NOTHING
+        db.Index(
+            "uq_response_survey_ip",
+            "survey_id", "ip_address",
+            unique=True,
+            postgresql_where=db.text("is_unique"),
+        ),
+        db.Index(
+            "uq_response_survey_client_token",
+            "survey_id", "client_token",
+            unique=True,
+            postgresql_where=db.text("is_unique"),
+        ),
+        # поминутные ряды ответов читаются по диапазону времени опроса
+        db.Index("ix_response_survey_created_at", "survey_id", "created_at"),
+        # «проходил ли этот IP»: по всем опросам (главная) и по одному опросу
+        db.Index("ix_response_ip_address_survey_id", "ip_address", "survey_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id"), nullable=False)
+    survey_id = db.Column(db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     ip_address = db.Column(db.String(45))
     client_token = db.Column(db.String(128))
+    # участвует ли ответ в правиле «один ответ на респондента»
+    # (False — ответ принят при ALLOW_MULTIPLE_RESPONSES)
+    is_unique = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    # ответы в упакованном виде (ANSWER_STORAGE=packed, app/answers.py):
+    # [[question_id, option_id | "текст"], ...]; в ORM не загружается
+    packed_answers = db.deferred(db.Column(JSONB(none_as_null=True)))
 
     answers = db.relationship(
         "Answer",
         backref="response",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="dynamic",
     )
 
 
 class Answer(db.Model):
     __tablename__ = "answer"
+    __table_args__ = (
+        db.Index("ix_answer_text_search", "text_search", postgresql_using="gin"),
+        # ответы на вопрос в порядке респондента: страницы текстов,
+        # таблицы сопряжённости, пересчёт счётчиков
+        db.Index("ix_answer_question_id_response_id", "question_id", "response_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
-    response_id = db.Column(db.Integer, db.ForeignKey("response.id"), nullable=False)
-    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
+    response_id = db.Column(db.Integer, db.ForeignKey("response.id", ondelete="CASCADE"), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), nullable=False)
 
     # для вопросов с вариантами
-    option_id = db.Column(db.Integer, db.ForeignKey("option.id"), nullable=True)
+    option_id = db.Column(db.Integer, db.ForeignKey("option.id", ondelete="CASCADE"), nullable=True, index=True)
 
     # для вопросов со свободным ответом
     text_answer = db.Column(db.Text, nullable=True)
+
+    # полнотекстовый вектор ответа (app/search.py); заполняет триггер
+    # answer_text_search (ниже) при вставке и смене text_answer, в ORM не загружается
+    text_search = db.deferred(db.Column(TSVECTOR))
+
+
+# Вектор считает триггер, а не GENERATED-колонка: добавление вычисляемой
+# колонки переписало бы всю таблицу answer под эксклюзивной блокировкой, а
+# обычную nullable-колонку миграция добавляет мгновенно и дозаполняет
+# порциями (a9baa0c7fbb8). Здесь — для таблиц, созданных create_all.
+event.listen(Answer.__table__, "after_create", DDL("""
+    CREATE OR REPLACE FUNCTION answer_text_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.text_search := to_tsvector('russian'::regconfig, coalesce(NEW.text_answer, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""))
+event.listen(Answer.__table__, "after_create", DDL("""
+    CREATE TRIGGER answer_text_search
+    BEFORE INSERT OR UPDATE OF text_answer ON answer
+    FOR EACH ROW EXECUTE FUNCTION answer_text_search_update()
+"""))
+
+
+# ---------- СЧЁТЧИКИ ДЛЯ РЕЗУЛЬТАТОВ ----------
+# Обновляются в той же транзакции, что и запись ответов (app/tallies.py).
+# Каждый счётчик разложен на несколько строк (shard): параллельные
+# транзакции прибавляют к разным строкам и не ждут друг друга на «горячих»
+# вариантах; значение счётчика — сумма по shard.
+
+class SurveyTally(db.Model):
+    __tablename__ = "survey_tally"
+
+    survey_id = db.Column(
+        db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    response_count = db.Column(db.BigInteger, nullable=False, default=0)
+    last_response_id = db.Column(db.Integer)
+    last_response_at = db.Column(db.DateTime)
+
+
+class OptionTally(db.Model):
+    __tablename__ = "option_tally"
+
+    option_id = db.Column(
+        db.Integer, db.ForeignKey("option.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    survey_id = db.Column(
+        db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    answer_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ValueTally(db.Model):
+    __tablename__ = "value_tally"
+
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("question.id", ondelete="CASCADE"), primary_key=True
+    )
+    # md5 значения; '' — вопрос long_text, для него храним только количество
+    value_key = db.Column(db.String(32), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    survey_id = db.Column(
+        db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    value = db.Column(db.Text)
+    answer_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# Почасовые свёртки — для рядов «ответов за час/день» за месяцы без чтения
+# response. bucket — начало часа (UTC); шардирование — как у счётчиков выше.
+
+class SurveyHourlyTally(db.Model):
+    __tablename__ = "survey_hourly_tally"
+
+    survey_id = db.Column(
+        db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket = db.Column(db.DateTime, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    response_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class OptionHourlyTally(db.Model):
+    __tablename__ = "option_hourly_tally"
+
+    option_id = db.Column(
+        db.Integer, db.ForeignKey("option.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket = db.Column(db.DateTime, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    survey_id = db.Column(
+        db.Integer, db.ForeignKey("survey.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    answer_count = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,242 @@
+"""
+Хранилище счётчиков Flask-Limiter в разделяемой памяти узла (схема shm://).
+
+Все воркеры gunicorn одного узла отображают (mmap) один и тот же файл,
+поэтому лимиты считаются общими, а не «на воркер» — без Redis и других
+внешних сервисов.
+
+Файл — хэш-таблица фиксированного размера: buckets корзин по SLOTS_PER_BUCKET
+слотов. Ключ попадает в одну корзину, поиск — линейный проход по её слотам,
+то есть O(1) на обращение. Корзина блокируется диапазонной блокировкой
+fcntl (между процессами) и локом потока (внутри процесса). Место под новый
+ключ — пустой или истёкший слот, а если таких нет — слот с самым ранним
+сроком жизни; так память ограничена, а простаивающие ключи вытесняются.
+
+Пример: RATELIMIT_STORAGE_URI=shm:///tmp/survey_ratelimit?buckets=8192
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from math import floor
+from urllib.parse import urlparse, parse_qs
+
+from limits.storage.base import (
+    SlidingWindowCounterSupport,
+    Storage,
+    TimestampedSlidingWindow,
+)
+
+
+# слот: хэш ключа (0 — пусто), срок жизни (unix time), счётчик
+_SLOT = struct.Struct("<Qdq")
+SLOTS_PER_BUCKET = 8
+_HEADER = struct.Struct("<8sI")
+_MAGIC = b"SRVYRL01"
+
+
+# fcntl-блокировки принадлежат процессу, потоки одного процесса
+# разводим обычным локом
+_thread_lock = threading.Lock()
+
+
+def _key_hash(key):
+    value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parsed = urlparse(uri or "shm:///tmp/survey_ratelimit")
+        query = parse_qs(parsed.query)
+        self.path = parsed.path
+        self.buckets = int(options.get("buckets") or query.get("buckets", ["4096"])[0])
+
+        self._bucket_size = SLOTS_PER_BUCKET * _SLOT.size
+        self._size = _HEADER.size + self.buckets * self._bucket_size
+        self._open()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    def _open(self):
+        # один дескриптор на всё время жизни: закрытие любого дескриптора файла
+        # снимает все fcntl-блокировки процесса на нём
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # размечаем только пустой файл; остальные процессы ждут на блокировке.
+        # Чужой непустой файл не трогаем: его уже отобразили другие воркеры
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            if size == 0:
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, self.buckets), 0)
+                compatible = True
+            else:
+                header = os.pread(self._fd, _HEADER.size, 0)
+                compatible = size == self._size and \
+                    _HEADER.unpack(header) == (_MAGIC, self.buckets)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        if not compatible:
+            os.close(self._fd)
+            raise ValueError(f"{self.path}: несовместимый файл лимитов")
+        self._map = mmap.mmap(self._fd, self._size)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    # ---------- КОРЗИНЫ ----------
+
+    def _locate(self, key):
+        h = _key_hash(key)
+        offset = _HEADER.size + (h % self.buckets) * self._bucket_size
+        return h, offset
+
+    def _locked(self, offset, action):
+        with _thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._bucket_size, offset)
+            try:
+                return action()
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._bucket_size, offset)
+
+    def _find(self, h, offset, now):
+        """Слот ключа: (смещение, срок, счётчик) или None, если ключа нет."""
+        for i in range(SLOTS_PER_BUCKET):
+            slot = offset + i * _SLOT.size
+            slot_hash, expiry, count = _SLOT.unpack_from(self._map, slot)
+            if slot_hash == h:
+                if expiry <= now:
+                    return None
+                return slot, expiry, count
+        return None
+
+    def _claim(self, h, offset, now):
+        """Слот под ключ: свой, пустой, истёкший или самый «старый» в корзине."""
+        victim, victim_expiry = None, None
+        for i in range(SLOTS_PER_BUCKET):
+            slot = offset + i * _SLOT.size
+            slot_hash, expiry, _ = _SLOT.unpack_from(self._map, slot)
+            if slot_hash == h or slot_hash == 0 or expiry <= now:
+                return slot
+            if victim is None or expiry < victim_expiry:
+                victim, victim_expiry = slot, expiry
+        return victim
+
+    # ---------- ИНТЕРФЕЙС limits.Storage ----------
+
+    def incr(self, key, expiry, amount=1):
+        h, offset = self._locate(key)
+
+        def action():
+            now = time.time()
+            found = self._find(h, offset, now)
+            if found is None:
+                slot, count, expires_at = self._claim(h, offset, now), amount, now + expiry
+            else:
+                slot, expires_at, count = found
+                count += amount
+            _SLOT.pack_into(self._map, slot, h, expires_at, count)
+            return count
+
+        return self._locked(offset, action)
+
+    def decr(self, key, amount=1):
+        h, offset = self._locate(key)
+
+        def action():
+            found = self._find(h, offset, time.time())
+            if found is None:
+                return 0
+            slot, expires_at, count = found
+            count = max(count - amount, 0)
+            _SLOT.pack_into(self._map, slot, h, expires_at, count)
+            return count
+
+        return self._locked(offset, action)
+
+    def get(self, key):
+        h, offset = self._locate(key)
+        found = self._locked(offset, lambda: self._find(h, offset, time.time()))
+        return found[2] if found else 0
+
+    def get_expiry(self, key):
+        h, offset = self._locate(key)
+        now = time.time()
+        found = self._locked(offset, lambda: self._find(h, offset, now))
+        return found[1] if found else now
+
+    def clear(self, key):
+        h, offset = self._locate(key)
+
+        def action():
+            found = self._find(h, offset, time.time())
+            if found is not None:
+                _SLOT.pack_into(self._map, found[0], 0, 0.0, 0)
+
+        self._locked(offset, action)
+
+    def check(self):
+        return True
+
+    def reset(self):
+        with _thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                cleared = 0
+                for slot in range(_HEADER.size, self._size, _SLOT.size):
+                    slot_hash, expiry, _ = _SLOT.unpack_from(self._map, slot)
+                    if slot_hash and expiry > now:
+                        cleared += 1
+                self._map[_HEADER.size:] = bytes(self._size - _HEADER.size)
+                return cleared
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    # ---------- СКОЛЬЗЯЩЕЕ ОКНО (sliding-window-counter) ----------
+    # Та же схема, что у limits.storage.MemoryStorage: два счётчика
+    # «предыдущее/текущее окно» и взвешенная сумма.
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count, previous_ttl, current_count, _ = self._sliding_window_info(
+            previous_key, current_key, expiry, now
+        )
+        if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+            return False
+
+        current_count = self.incr(current_key, 2 * expiry, amount=amount)
+        if floor(previous_count * previous_ttl / expiry + current_count) > limit:
+            # другой процесс успел раньше — откатываем своё попадание
+            self.decr(current_key, amount)
+            return False
+        return True
+
+    def _sliding_window_info(self, previous_key, current_key, expiry, now):
+        previous_count = self.get(previous_key)
+        current_count = self.get(current_key)
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return self._sliding_window_info(previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
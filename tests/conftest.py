@@ -25,6 +25,7 @@ def app():
         TESTING=True,
         WTF_CSRF_ENABLED=False,
         ALLOW_MULTIPLE_RESPONSES=True,  # чтобы спокойно многократно проходить опросы
+        SURVEY_PURGE_RESUME=False,  # фоновое доудаление не вмешивается в тесты
     )
 
     with flask_app.app_context():
@@ -69,6 +70,17 @@ def client(app):
     return app.test_client()
 
 
+@pytest.fixture
+def admin_client(client, db_session):
+    """HTTP-клиент, вошедший в админку как admin / admin."""
+    from app.admins import ensure_admin
+
+    ensure_admin("admin", "admin", reset_password=True)
+    db.session.commit()
+    client.post("/admin/login", data={"username": "admin", "password": "admin"})
+    return client
+
+
 @pytest.fixture
 def db_session(app):
     """Удобная ссылка на сессию БД."""
@@ -56,3 +56,69 @@ def test_add_question(client, db_session):
 
     assert rv.status_code == 200
     assert survey.questions.count() == 0
+
+
+def test_surveys_list_keyset_pages_with_counts(app, admin_client, db_session):
+    from sqlalchemy import event
+    from app.submissions import save_response
+
+    surveys = [models.Survey(title=f"Survey {i}") for i in range(5)]
+    question = models.Question(text="Q", type="text", survey=surveys[3])
+    db.session.add_all(surveys)
+    db.session.commit()
+    for _ in range(3):
+        save_response(surveys[3].id, None, [(question.id, None, "x")], unique=False)
+    db.session.commit()
+
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    previous, app.config["ADMIN_SURVEYS_PER_PAGE"] = app.config["ADMIN_SURVEYS_PER_PAGE"], 2
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        first = admin_client.get("/admin/surveys").get_data(as_text=True)
+        first_queries = len(statements)
+        second = admin_client.get(f"/admin/surveys?before={surveys[3].id}").get_data(as_text=True)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+        app.config["ADMIN_SURVEYS_PER_PAGE"] = previous
+
+    # новые сверху; ссылка на следующую страницу — по id последнего
+    assert "Survey 4" in first and "Survey 3" in first and "Survey 2" not in first
+    assert f"before={surveys[3].id}" in first
+    assert "Survey 2" in second and "Survey 1" in second and "Survey 4" not in second
+    assert '<td class="text-end">3</td>' in first
+
+    # страница — запрос опросов и один запрос счётчиков, без N+1
+    assert first_queries == 2
+    assert len(statements) - first_queries == 2
+
+
+def test_questions_list_loads_tree_in_fixed_queries(app, admin_client, db_session):
+    from sqlalchemy import event
+
+    def page_queries(survey):
+        url = f"/admin/surveys/{survey.id}/questions"
+        statements = []
+        capture = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            html = admin_client.get(url).get_data(as_text=True)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+        return html, len(statements)
+
+    small = models.Survey(title="Small")
+    models.Option(text="only", question=models.Question(text="Q", type="single_choice", survey=small))
+    big = models.Survey(title="Big")
+    for i in range(10):
+        question = models.Question(text=f"Q{i}", type="single_choice", survey=big)
+        for j in range(3):
+            models.Option(text=f"opt {i}.{j}", question=question)
+    db.session.add_all([small, big])
+    db.session.commit()
+
+    _, small_queries = page_queries(small)
+    html, big_queries = page_queries(big)
+
+    assert "opt 9.2" in html and html.index("Q0") < html.index("Q9")
+    assert big_queries == small_queries == 3
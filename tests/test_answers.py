@@ -0,0 +1,132 @@
+from sqlalchemy import func, select
+
+import models
+from extensions import db
+from app.answers import pack_existing, unpack_existing
+from app.exports import iter_response_rows
+from app.results import crosstab, survey_results, text_answers_page
+from app.schema_cache import get_compiled_survey
+from app.submissions import make_record, save_response, save_responses
+from app.tallies import rebuild_tallies
+
+
+def setup_survey():
+    survey = models.Survey(title="Packed", is_active=True)
+    color = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=color)
+    blue = models.Option(text="Blue", question=color)
+    pets = models.Question(text="Pets", type="multiple_choice", survey=survey)
+    cat = models.Option(text="Cat", question=pets)
+    dog = models.Option(text="Dog", question=pets)
+    age = models.Question(text="Age", type="number", survey=survey)
+    story = models.Question(text="Story", type="long_text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+    return survey, (color, red, blue, pets, cat, dog, age, story)
+
+
+def submit(survey, questions):
+    color, red, blue, pets, cat, dog, age, story = questions
+    save_response(survey.id, None, [
+        (color.id, red.id, None), (pets.id, cat.id, None), (pets.id, dog.id, None),
+        (age.id, None, "30"), (story.id, None, "first story"),
+    ], unique=False)
+    save_responses([
+        make_record(survey.id, None, [
+            (color.id, blue.id, None), (pets.id, dog.id, None), (age.id, None, "30"),
+        ], unique=False),
+        make_record(survey.id, None, [
+            (color.id, red.id, None), (age.id, None, "41"), (story.id, None, "second story"),
+        ], unique=False),
+    ])
+    db.session.commit()
+
+
+def snapshot(survey):
+    compiled = get_compiled_survey(survey)
+    by_id = {q.id: q for q in compiled.questions}
+    color, pets, age, story = sorted(by_id)
+    # без id — снимки разных опросов сравнимы между собой
+    return {
+        "results": [
+            (
+                [(o["option_text"], o["count"]) for o in b["options_stats"]],
+                b["value_stats"],
+                b["text_count"],
+            )
+            for b in survey_results(compiled)
+        ],
+        "export": [
+            [values.get(q_id) for q_id in sorted(by_id)]
+            for _, _, values in iter_response_rows(compiled)
+        ],
+        "texts": text_answers_page(story, limit=1)[0] + text_answers_page(story, limit=5)[0],
+        "crosstab": crosstab(by_id[color], by_id[pets])["counts"],
+    }
+
+
+def answer_count():
+    return db.session.scalar(select(func.count()).select_from(models.Answer))
+
+
+def test_packed_storage_reads_like_rows(app, db_session):
+    survey, questions = setup_survey()
+    submit(survey, questions)
+    expected = snapshot(survey)
+    assert answer_count() == 11
+
+    other, other_questions = setup_survey()
+    previous, app.config["ANSWER_STORAGE"] = app.config["ANSWER_STORAGE"], "packed"
+    try:
+        submit(other, other_questions)
+    finally:
+        app.config["ANSWER_STORAGE"] = previous
+
+    # ответы второго опроса — по одной строке response, без строк answer
+    assert answer_count() == 11
+    packed = db.session.scalars(
+        select(models.Response.packed_answers).where(models.Response.survey_id == other.id)
+    ).all()
+    assert len(packed) == 3 and all(packed)
+    assert snapshot(other) == expected
+
+
+def test_pack_and_unpack_existing(app, db_session):
+    survey, questions = setup_survey()
+    submit(survey, questions)
+    expected = snapshot(survey)
+
+    assert pack_existing(survey.id) == 3
+    assert answer_count() == 0
+    assert snapshot(survey) == expected
+
+    rebuild_tallies(survey.id)
+    db.session.commit()
+    assert snapshot(survey) == expected
+
+    assert unpack_existing(survey.id) == 3
+    assert answer_count() == 11
+    assert db.session.scalar(
+        select(func.count()).where(models.Response.packed_answers.isnot(None))
+    ) == 0
+    assert snapshot(survey) == expected
+
+
+def test_text_answers_page_keeps_several_answers_of_one_response(app, db_session):
+    for storage in ("rows", "packed"):
+        survey, questions = setup_survey()
+        story = questions[-1]
+        previous, app.config["ANSWER_STORAGE"] = app.config["ANSWER_STORAGE"], storage
+        try:
+            # JSON API принимает несколько текстовых ответов на вопрос
+            save_response(survey.id, None, [(story.id, None, f"a{i}") for i in range(3)], unique=False)
+            save_response(survey.id, None, [(story.id, None, "b0")], unique=False)
+            db.session.commit()
+        finally:
+            app.config["ANSWER_STORAGE"] = previous
+
+        texts, cursor = text_answers_page(story.id, limit=2)
+        while cursor is not None:
+            page, cursor = text_answers_page(story.id, after=cursor, limit=2)
+            texts += page
+        assert texts == ["a0", "a1", "a2", "b0"], storage
@@ -1,5 +1,8 @@
+import json
+
 import models
 from extensions import db
+from app.tallies import rebuild_tallies
 
 
 API_TEST_TOKEN = "test-api-token"  # тот же, что в docker-compose для сервиса tests
@@ -22,4 +25,154 @@ def test_api_get_surveys(client, db_session):
 
     # ответ в JSON или просто строка — так надёжнее всего:
     # проверяем, что название опроса вообще есть в ответе
-    assert b"API Test" in rv.data
\ No newline at end of file
+    assert b"API Test" in rv.data
+
+def test_api_submit_response(client, db_session):
+    s = models.Survey(title="API Submit", is_active=True)
+    q1 = models.Question(text="Q1", type="single_choice", survey=s)
+    opt = models.Option(text="Yes", question=q1)
+    q2 = models.Question(text="Q2", type="text", survey=s)
+    db.session.add(s)
+    db.session.commit()
+
+    rv = client.post(
+        f"/api/surveys/{s.id}/responses",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+        json={
+            "client_token": "device-1",
+            "answers": [
+                {"question_id": q1.id, "option_id": opt.id},
+                {"question_id": q1.id, "option_id": 999999},
+                {"question_id": q2.id, "text_answer": "  hello  "},
+                {"question_id": "bad"},
+            ],
+        },
+    )
+    assert rv.status_code == 201
+
+    resp = models.Response.query.one()
+    assert resp.client_token == "device-1"
+    answers = {(a.question_id, a.option_id, a.text_answer) for a in resp.answers}
+    assert answers == {(q1.id, opt.id, None), (q2.id, None, "hello")}
+
+
+def test_api_submit_response_already_answered(client, db_session):
+    s = models.Survey(title="API Once", is_active=True)
+    q = models.Question(text="Q", type="text", survey=s)
+    db.session.add(s)
+    db.session.commit()
+
+    def submit(token, ip):
+        return client.post(
+            f"/api/surveys/{s.id}/responses",
+            headers={"X-API-TOKEN": API_TEST_TOKEN},
+            json={"client_token": token, "answers": [{"question_id": q.id, "text_answer": "x"}]},
+            environ_base={"REMOTE_ADDR": ip},
+        )
+
+    assert submit("device-1", "10.0.0.1").status_code == 201
+    # тот же токен с другого IP и тот же IP с другим токеном — отклоняются
+    assert submit("device-1", "10.0.0.2").get_json() == {"status": "already_answered"}
+    assert submit("device-2", "10.0.0.1").get_json() == {"status": "already_answered"}
+    assert submit("device-3", "10.0.0.3").status_code == 201
+
+    assert models.Response.query.count() == 2
+    assert models.Answer.query.count() == 2
+
+
+def test_api_submit_responses_batch(client, db_session):
+    s = models.Survey(title="Batch", is_active=True)
+    q1 = models.Question(text="Q1", type="single_choice", survey=s)
+    opt = models.Option(text="Yes", question=q1)
+    q2 = models.Question(text="Q2", type="text", survey=s)
+    db.session.add(s)
+    db.session.commit()
+    db.session.add(models.Response(survey_id=s.id, client_token="old"))
+    db.session.commit()
+
+    def item(token, **extra):
+        return {
+            "client_token": token,
+            "answers": [
+                {"question_id": q1.id, "option_id": opt.id},
+                {"question_id": q2.id, "text_answer": f"from {token}"},
+            ],
+            **extra,
+        }
+
+    rv = client.post(
+        f"/api/surveys/{s.id}/responses:batch",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+        json=[
+            item("t1", created_at="2026-01-02T03:04:05+00:00"),
+            item("t2"),
+            item("t1"),
+            item("old"),
+            {"answers": []},
+            item("t3", created_at="yesterday"),
+        ],
+    )
+    assert rv.status_code == 200
+    assert [i["status"] for i in rv.get_json()["items"]] == [
+        "ok", "ok", "duplicate", "already_answered", "invalid", "invalid",
+    ]
+
+    t1 = models.Response.query.filter_by(client_token="t1").one()
+    assert t1.created_at.isoformat() == "2026-01-02T03:04:05"
+    assert t1.ip_address is None
+    assert t1.answers.count() == 2
+    assert models.Answer.query.count() == 4
+
+
+def test_api_submit_responses_batch_ndjson(client, db_session):
+    s = models.Survey(title="Batch NDJSON", is_active=True)
+    q = models.Question(text="Q", type="text", survey=s)
+    db.session.add(s)
+    db.session.commit()
+
+    lines = [
+        json.dumps({"client_token": f"k{i}", "answers": [{"question_id": q.id, "text_answer": str(i)}]})
+        for i in range(3)
+    ]
+    rv = client.post(
+        f"/api/surveys/{s.id}/responses:batch",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+        data="\n".join(lines + ["{broken"]) + "\n",
+        content_type="application/x-ndjson",
+    )
+    assert [i["status"] for i in rv.get_json()["items"]] == ["ok", "ok", "ok", "invalid"]
+    assert models.Response.query.count() == 3
+
+
+def test_api_results_paginates_text_answers(client, db_session):
+    s = models.Survey(title="Texts", is_active=True)
+    q = models.Question(text="Why?", type="long_text", survey=s)
+    db.session.add(s)
+    db.session.commit()
+    for i in range(5):
+        r = models.Response(survey_id=s.id)
+        db.session.add(r)
+        db.session.flush()
+        db.session.add(models.Answer(response_id=r.id, question_id=q.id, text_answer=f"t{i}"))
+    rebuild_tallies(s.id)
+    db.session.commit()
+
+    rv = client.get(f"/api/surveys/{s.id}/results", headers={"X-API-TOKEN": API_TEST_TOKEN})
+    block = rv.get_json()["questions"][0]
+    assert block["text_answers_count"] == 5
+    assert "text_answers" not in block
+
+    texts, url = [], block["text_answers_url"] + "?limit=2"
+    while True:
+        page = client.get(url, headers={"X-API-TOKEN": API_TEST_TOKEN}).get_json()
+        texts += page["items"]
+        if page["next_cursor"] is None:
+            break
+        url = f"{block['text_answers_url']}?limit=2&cursor={page['next_cursor']}"
+
+    assert texts == ["t0", "t1", "t2", "t3", "t4"]
+
+    for cursor in ("3", "3.", "x.1"):
+        rv = client.get(f"{block['text_answers_url']}?cursor={cursor}",
+                        headers={"X-API-TOKEN": API_TEST_TOKEN})
+        assert rv.status_code == 400 and rv.get_json()["error"] == "bad_cursor"
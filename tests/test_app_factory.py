@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import models
+from extensions import db
+from conftest import PROJECT_ROOT
+
+
+# запускается в свежем процессе, как воркер gunicorn: повторный create_app
+# в процессе тестов перепривязал бы к себе общие расширения (journal и т. п.)
+WORKER_BOOT = """
+import sys
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+connections = []
+event.listen(Engine, "engine_connect", lambda *args: connections.append(args))
+import wsgi
+print(len(connections), "alembic" in sys.modules, sorted(wsgi.app.blueprints))
+"""
+
+
+def test_worker_boot_does_no_database_io_and_skips_migration_tooling():
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER_BOOT],
+        cwd=PROJECT_ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    connections, alembic_loaded, blueprints = output.split(maxsplit=2)
+    assert connections == "0"
+    assert alembic_loaded == "False"
+    assert "'admin'" in blueprints and "'api'" in blueprints
+
+
+def test_admin_ensure_command_is_idempotent(app, db_session):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["admin", "ensure", "--username", "boss", "--password", "first"])
+    assert "создан" in result.output
+    result = runner.invoke(args=["admin", "ensure", "--username", "boss", "--password", "second"])
+    assert "уже есть" in result.output
+
+    admins = models.Admin.query.filter_by(username="boss").all()
+    assert len(admins) == 1 and admins[0].check_password("first")
+
+    result = runner.invoke(
+        args=["admin", "ensure", "--username", "boss", "--password", "second", "--reset-password"]
+    )
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    assert models.Admin.query.filter_by(username="boss").one().check_password("second")
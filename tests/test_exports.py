@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import os
+import threading
+
+import pyarrow.parquet as pq
+
+import models
+from extensions import db
+from app.submissions import save_response
+from app.tallies import rebuild_tallies
+
+
+API_TEST_TOKEN = "test-api-token"
+
+
+def setup_survey_with_responses():
+    survey = models.Survey(title="Export", is_active=True)
+    single = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=single)
+    multi = models.Question(text="Pets", type="multiple_choice", survey=survey)
+    cat = models.Option(text="Cat", question=multi)
+    dog = models.Option(text="Dog", question=multi)
+    text = models.Question(text="Comment", type="text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+
+    r1 = models.Response(survey_id=survey.id, ip_address="1.1.1.1")
+    db.session.add(r1)
+    db.session.flush()
+    db.session.add_all([
+        models.Answer(response_id=r1.id, question_id=single.id, option_id=red.id),
+        models.Answer(response_id=r1.id, question_id=multi.id, option_id=cat.id),
+        models.Answer(response_id=r1.id, question_id=multi.id, option_id=dog.id),
+        models.Answer(response_id=r1.id, question_id=text.id, text_answer="hi, there"),
+    ])
+    # ответ без единого заполненного вопроса тоже попадает в выгрузку
+    r2 = models.Response(survey_id=survey.id, ip_address="2.2.2.2")
+    db.session.add(r2)
+    db.session.commit()
+    return survey, (single, multi, text), (r1, r2)
+
+
+def test_export_ndjson(client, db_session):
+    survey, (single, multi, text), (r1, r2) = setup_survey_with_responses()
+
+    rv = client.get(
+        f"/api/surveys/{survey.id}/export",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+    )
+    assert rv.status_code == 200
+    assert rv.mimetype == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+    assert [row["response_id"] for row in rows] == [r1.id, r2.id]
+    assert rows[0]["answers"] == {
+        str(single.id): "Red",
+        str(multi.id): ["Cat", "Dog"],
+        str(text.id): "hi, there",
+    }
+    assert rows[1]["answers"] == {}
+
+
+def test_export_csv(client, db_session):
+    survey, (single, multi, text), (r1, r2) = setup_survey_with_responses()
+
+    rv = client.get(
+        f"/api/surveys/{survey.id}/export?format=csv",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+    )
+    assert rv.status_code == 200
+
+    rows = list(csv.reader(io.StringIO(rv.get_data(as_text=True))))
+    assert rows[0] == [
+        "response_id", "created_at",
+        f"{single.id}: Color", f"{multi.id}: Pets", f"{text.id}: Comment",
+    ]
+    assert rows[1][0] == str(r1.id)
+    assert rows[1][2:] == ["Red", "Cat; Dog", "hi, there"]
+    assert rows[2][2:] == ["", "", ""]
+
+
+def test_export_unknown_format(client, db_session):
+    survey, _, _ = setup_survey_with_responses()
+    rv = client.get(
+        f"/api/surveys/{survey.id}/export?format=xml",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+    )
+    assert rv.status_code == 400
+
+
+def test_export_parquet_cached_until_new_response(app, client, db_session, tmp_path):
+    survey, (single, multi, text), (r1, r2) = setup_survey_with_responses()
+    previous, app.config["EXPORT_CACHE_DIR"] = app.config["EXPORT_CACHE_DIR"], str(tmp_path)
+    url = f"/api/surveys/{survey.id}/export?format=parquet"
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+    try:
+        rv = client.get(url, headers=headers)
+        assert rv.status_code == 200
+        table = pq.read_table(io.BytesIO(rv.data))
+
+        assert table.column("response_id").to_pylist() == [r1.id, r2.id]
+        assert table.column(f"q{single.id}").to_pylist() == ["Red", None]
+        assert table.column(f"q{multi.id}").to_pylist() == [["Cat", "Dog"], None]
+        assert table.schema.field(f"q{single.id}").type.value_type == "string"
+        assert table.schema.field(f"q{text.id}").metadata[b"question"] == b"Comment"
+
+        etag = rv.headers["ETag"]
+        rv.close()
+        rv = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert rv.status_code == 304
+        rv.close()
+
+        save_response(survey.id, None, [], unique=False)
+        db.session.commit()
+        rv = client.get(url, headers=headers)
+        assert len(pq.read_table(io.BytesIO(rv.data))) == 3
+        rv.close()
+        # прежнее поколение ещё может отдавать другой воркер — оно остаётся
+        assert len(os.listdir(tmp_path)) == 2
+
+        # третье поколение: удаляется самое старое, если оно давно не менялось
+        oldest = min(tmp_path.iterdir(), key=lambda p: p.stat().st_mtime)
+        os.utime(oldest, (0, 0))
+        save_response(survey.id, None, [], unique=False)
+        db.session.commit()
+        client.get(url, headers=headers).close()
+        assert len(os.listdir(tmp_path)) == 2 and not oldest.exists()
+    finally:
+        app.config["EXPORT_CACHE_DIR"] = previous
+
+
+def test_export_parquet_of_large_survey_builds_in_background(app, client, db_session, tmp_path):
+    survey, _, (r1, r2) = setup_survey_with_responses()
+    rebuild_tallies(survey.id)
+    db.session.commit()
+    url = f"/api/surveys/{survey.id}/export?format=parquet"
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+    previous = app.config["EXPORT_CACHE_DIR"], app.config["EXPORT_PARQUET_SYNC_MAX_RESPONSES"]
+    app.config["EXPORT_CACHE_DIR"], app.config["EXPORT_PARQUET_SYNC_MAX_RESPONSES"] = str(tmp_path), 1
+    try:
+        rv = client.get(url, headers=headers)
+        assert rv.status_code == 202
+        assert rv.headers["Retry-After"]
+        for thread in threading.enumerate():
+            if thread.name == f"parquet-export-{survey.id}":
+                thread.join(timeout=10)
+
+        def join_builds():
+            for thread in threading.enumerate():
+                if thread.name == f"parquet-export-{survey.id}":
+                    thread.join(timeout=10)
+
+        join_builds()
+        rv = client.get(url, headers=headers)
+        assert rv.status_code == 200
+        assert pq.read_table(io.BytesIO(rv.data)).column("response_id").to_pylist() == [r1.id, r2.id]
+        rv.close()
+        # маркер сборки убран
+        assert [name.endswith(".parquet") for name in os.listdir(tmp_path)] == [True]
+
+        # пока идёт сборка (маркер опроса занят), новые ответы не запускают
+        # новых сборок — отдаётся последний готовый файл
+        marker = tmp_path / f"survey-{survey.id}.building"
+        marker.touch()
+        for _ in range(3):
+            save_response(survey.id, None, [], unique=False)
+            db.session.commit()
+            rv = client.get(url, headers=headers)
+            assert rv.status_code == 200
+            assert len(pq.read_table(io.BytesIO(rv.data))) == 2
+            rv.close()
+        assert not [t for t in threading.enumerate() if t.name == f"parquet-export-{survey.id}"]
+        assert len(os.listdir(tmp_path)) == 2
+
+        # сборка закончилась — следующий запрос запускает одну новую
+        marker.unlink()
+        client.get(url, headers=headers).close()
+        join_builds()
+        rv = client.get(url, headers=headers)
+        assert len(pq.read_table(io.BytesIO(rv.data))) == 5
+        rv.close()
+        assert not marker.exists()
+    finally:
+        app.config["EXPORT_CACHE_DIR"], app.config["EXPORT_PARQUET_SYNC_MAX_RESPONSES"] = previous
@@ -0,0 +1,129 @@
+import re
+
+import pytest
+from sqlalchemy import event, inspect
+
+import models
+from extensions import db
+from app.submissions import save_response
+
+
+API_HEADERS = {"X-API-Token": "test-api-token"}
+
+# таблицы, которые растут с числом ответов и не должны читаться целиком
+HOT_TABLES = ("response", "answer", "question", "option")
+
+
+def setup_survey():
+    survey = models.Survey(title="Indexes", is_active=True)
+    color = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=color)
+    pets = models.Question(text="Pets", type="multiple_choice", survey=survey)
+    cat = models.Option(text="Cat", question=pets)
+    story = models.Question(text="Story", type="long_text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+
+    save_response(survey.id, "10.0.0.1", [
+        (color.id, red.id, None), (pets.id, cat.id, None), (story.id, None, "story"),
+    ])
+    db.session.commit()
+    return survey, color, pets, story
+
+
+@pytest.fixture
+def captured_selects(app):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+
+def indexed_columns():
+    """Первые колонки индексов таблиц HOT_TABLES — то, что индекс может обслужить."""
+    inspector = inspect(db.engine)
+    leading = {}
+    for table in HOT_TABLES:
+        columns = {index["column_names"][0] for index in inspector.get_indexes(table)}
+        columns |= set(inspector.get_pk_constraint(table)["constrained_columns"][:1])
+        leading[table] = columns - {None}
+    return leading
+
+
+def full_scans(plan, leading, join_filter=""):
+    """
+    Таблицы, которые узел плана (и его потомки) читает целиком, хотя их
+    условие не может обслужить ни один индекс.
+
+    Проверка структурная, а не «какой план выбрал планировщик»: на почти
+    пустых таблицах он вправе пройти их целиком (или по первичному ключу
+    ради ORDER BY) и при подходящем индексе. Такой проход допустим, если
+    условие узла — Filter или Join Filter вложенного цикла над ним — стоит
+    на первой колонке существующего индекса этой таблицы.
+    """
+    scanned = set()
+    relation = plan.get("Relation Name")
+    full = plan["Node Type"] == "Seq Scan" or (
+        plan["Node Type"] in ("Index Scan", "Index Only Scan") and "Index Cond" not in plan
+    )
+    if full and relation in leading:
+        conditions = f"{plan.get('Filter', '')} {join_filter}"
+        alias = re.escape(plan.get("Alias", relation))
+        if not any(re.search(rf"\b{alias}\.{column}\b", conditions) for column in leading[relation]):
+            scanned.add(relation)
+    for child in plan.get("Plans", ()):
+        scanned |= full_scans(child, leading, plan.get("Join Filter", join_filter))
+    return scanned
+
+
+def unindexed_tables(statement, parameters, leading):
+    """Таблицы из HOT_TABLES, которые запрос читает целиком, а не по индексу."""
+    connection = db.session.connection()
+    # на почти пустой тестовой базе полный проход и hash/merge join всегда
+    # дешевле — запрещаем их, чтобы план был ближе к плану на больших таблицах
+    for setting in ("enable_seqscan", "enable_hashjoin", "enable_mergejoin"):
+        connection.exec_driver_sql(f"SET LOCAL {setting} = off")
+    (plan,) = connection.exec_driver_sql(
+        "EXPLAIN (VERBOSE, FORMAT JSON) " + statement, parameters
+    ).scalar()
+    db.session.rollback()
+    return sorted(full_scans(plan["Plan"], leading))
+
+
+def test_hot_queries_use_indexes(app, admin_client, db_session, captured_selects):
+    survey, color, pets, story = setup_survey()
+
+    previous, app.config["ALLOW_MULTIPLE_RESPONSES"] = app.config["ALLOW_MULTIPLE_RESPONSES"], False
+    try:
+        captured_selects.clear()
+        urls = [
+            "/",
+            f"/survey/{survey.id}",
+            f"/api/surveys/{survey.id}",
+            f"/api/surveys/{survey.id}/results?values=1",
+            f"/api/surveys/{survey.id}/crosstab?rows={color.id}&cols={pets.id}",
+            f"/api/surveys/{survey.id}/questions/{story.id}/text_answers",
+            f"/api/surveys/{survey.id}/export?format=csv",
+            f"/admin/surveys/{survey.id}/questions",
+            f"/admin/surveys/{survey.id}/results",
+        ]
+        for url in urls:
+            response = admin_client.get(url, headers=API_HEADERS)
+            assert response.status_code == 200, url
+            response.get_data()
+    finally:
+        app.config["ALLOW_MULTIPLE_RESPONSES"] = previous
+
+    assert captured_selects
+    leading = indexed_columns()
+    offenders = [
+        (statement, tables)
+        for statement, parameters in captured_selects
+        if (tables := unindexed_tables(statement, parameters, leading))
+    ]
+    assert offenders == []
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+import pytest
+
+import models
+from extensions import db
+from app.journal import journal
+from app.submissions import make_record
+
+
+@pytest.fixture
+def journal_mode(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "SUBMISSION_INGEST_MODE", "journal")
+    monkeypatch.setitem(app.config, "JOURNAL_DIR", str(tmp_path))
+    # фоновый поток не успеет сработать сам — сбрасываем вручную
+    monkeypatch.setitem(app.config, "JOURNAL_MAX_FLUSH_DELAY", 3600)
+    yield tmp_path
+    journal.close()
+
+
+def setup_survey():
+    survey = models.Survey(title="Journal", is_active=True)
+    q = models.Question(text="Q", type="text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+    return survey, q
+
+
+def test_submit_goes_through_journal(client, db_session, journal_mode):
+    survey, q = setup_survey()
+
+    for value in ("a", "b", "c"):
+        rv = client.post(f"/survey/{survey.id}", data={f"question_{q.id}": value})
+        assert rv.status_code == 302
+
+    # ответы подтверждены, но ещё лежат в журнале
+    assert models.Response.query.count() == 0
+    assert any(name.endswith(".open") for name in os.listdir(journal_mode))
+
+    assert journal.flush() == 3
+    db.session.expire_all()
+
+    assert models.Response.query.count() == 3
+    assert sorted(a.text_answer for a in models.Answer.query) == ["a", "b", "c"]
+    assert os.listdir(journal_mode) == []
+
+
+def test_api_submit_through_journal_dedupes_on_flush(client, db_session, journal_mode):
+    survey, q = setup_survey()
+
+    for _ in range(2):
+        rv = client.post(
+            f"/api/surveys/{survey.id}/responses",
+            headers={"X-API-TOKEN": "test-api-token"},
+            json={"client_token": "t1", "answers": [{"question_id": q.id, "text_answer": "x"}]},
+        )
+        assert rv.status_code == 202
+
+    journal.flush()
+    db.session.expire_all()
+    assert models.Response.query.count() == 1
+
+
+def test_recovers_segments_of_dead_worker(client, db_session, journal_mode):
+    survey, q = setup_survey()
+
+    # сегмент умершего писателя с недописанной последней строкой
+    record = make_record(survey.id, "10.0.0.1", [(q.id, None, "recovered")])
+    segment = journal_mode / "4194305-1.open"
+    segment.write_text(json.dumps(record) + "\n" + '{"survey_id": ', encoding="utf-8")
+    # сегмент, захваченный умершим процессом до коммита
+    record2 = make_record(survey.id, "10.0.0.2", [(q.id, None, "claimed")])
+    (journal_mode / "4194305-2.ready.4194306").write_text(json.dumps(record2) + "\n")
+
+    assert journal.flush() == 2
+    db.session.expire_all()
+
+    assert sorted(a.text_answer for a in models.Answer.query) == ["claimed", "recovered"]
+    assert os.listdir(journal_mode) == []
+
+
+def test_recovers_segment_of_previous_process_with_same_pid(client, db_session, journal_mode):
+    # после рестарта контейнера новый воркер получает тот же pid
+    survey, q = setup_survey()
+    record = make_record(survey.id, "10.0.0.1", [(q.id, None, "before restart")])
+    (journal_mode / f"{os.getpid()}_1-1.open").write_text(json.dumps(record) + "\n")
+
+    assert journal.flush() == 1
+    db.session.expire_all()
+    assert [a.text_answer for a in models.Answer.query] == ["before restart"]
+
+
+def test_rejected_record_goes_to_dead_letter(client, db_session, journal_mode):
+    survey, q = setup_survey()
+    first = make_record(survey.id, "10.0.0.1", [(q.id, None, "first")])
+    last = make_record(survey.id, "10.0.0.3", [(q.id, None, "last")])
+    # вопрос удалён, пока ответ лежал в журнале
+    orphan = make_record(survey.id, "10.0.0.2", [(q.id + 1000, None, "orphan")])
+    lines = [json.dumps(r) for r in (first, orphan, last)]
+    (journal_mode / "4194305_1-1.ready").write_text("\n".join(lines) + "\n")
+
+    assert journal.flush() == 2
+    db.session.expire_all()
+    assert sorted(a.text_answer for a in models.Answer.query) == ["first", "last"]
+
+    assert os.listdir(journal_mode) == ["4194305_1-1.dead"]
+    dead = (journal_mode / "4194305_1-1.dead").read_text().splitlines()
+    assert [json.loads(line)["answers"] for line in dead] == [orphan["answers"]]
+    # dead letter повторно не разбирается
+    assert journal.flush() == 0
+
+
+def test_start_recovers_without_new_submissions(client, db_session, journal_mode):
+    survey, q = setup_survey()
+    record = make_record(survey.id, "10.0.0.1", [(q.id, None, "recovered")])
+    (journal_mode / "4194305_1-1.open").write_text(json.dumps(record) + "\n")
+
+    journal.start()
+    deadline = time.monotonic() + 5
+    while os.listdir(journal_mode) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    db.session.expire_all()
+    assert [a.text_answer for a in models.Answer.query] == ["recovered"]
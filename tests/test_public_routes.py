@@ -1,5 +1,7 @@
+from sqlalchemy import event
 import models
 from extensions import db
+from app.schema_cache import bump_schema_version, invalidate_active_surveys
 
 
 def setup_basic_survey():
@@ -42,3 +44,141 @@ def test_survey_submit(client, db_session):
     resp = models.Response.query.first()
     assert resp is not None
     assert resp.answers.first().text_answer == "10"
+
+
+def setup_choice_survey(questions_count):
+    survey = models.Survey(title="Choice Test", is_active=True)
+    for i in range(questions_count):
+        q = models.Question(text=f"Q{i}", type="multiple_choice", survey=survey)
+        for j in range(3):
+            models.Option(text=f"O{j}", question=q)
+    db.session.add(survey)
+    db.session.commit()
+    return survey
+
+
+def choice_form(survey):
+    """Отмечаем первые два варианта в каждом вопросе."""
+    form = {}
+    for q in survey.questions.order_by(models.Question.id):
+        options = q.options.order_by(models.Option.id).all()
+        form[f"question_{q.id}_multi"] = [str(options[0].id), str(options[1].id)]
+    return form
+
+
+def count_statements(action):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    return len(statements)
+
+
+def test_survey_submit_multiple_choice(client, db_session):
+    survey = setup_choice_survey(2)
+    form = choice_form(survey)
+    # чужой вариант и мусор должны быть отброшены
+    form[next(iter(form))] += ["999999", "abc"]
+
+    rv = client.post(f"/survey/{survey.id}", data=form)
+    assert rv.status_code == 302
+
+    resp = models.Response.query.first()
+    assert resp.answers.count() == 4
+
+
+def test_survey_submit_statement_count_is_constant(client, db_session):
+    small = setup_choice_survey(2)
+    big = setup_choice_survey(40)
+    small_url, small_form = f"/survey/{small.id}", choice_form(small)
+    big_url, big_form = f"/survey/{big.id}", choice_form(big)
+
+    small_count = count_statements(lambda: client.post(small_url, data=small_form))
+    big_count = count_statements(lambda: client.post(big_url, data=big_form))
+
+    assert small_count == big_count
+    assert models.Answer.query.count() == 2 * 2 + 40 * 2
+
+
+def test_survey_submit_once_per_ip(app, client, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, "ALLOW_MULTIPLE_RESPONSES", False)
+    survey = setup_basic_survey()
+    field = f"question_{survey.questions.first().id}"
+
+    first = client.post(f"/survey/{survey.id}", data={field: "10"})
+    second = client.post(f"/survey/{survey.id}", data={field: "20"})
+
+    assert first.status_code == second.status_code == 302
+    assert models.Response.query.count() == 1
+    assert models.Answer.query.one().text_answer == "10"
+
+
+def test_survey_submit_multiple_allowed(client, db_session):
+    survey = setup_basic_survey()
+    field = f"question_{survey.questions.first().id}"
+
+    client.post(f"/survey/{survey.id}", data={field: "10"})
+    client.post(f"/survey/{survey.id}", data={field: "20"})
+
+    assert models.Response.query.filter_by(is_unique=False).count() == 2
+
+
+def test_survey_display_conditional_get(client, db_session):
+    survey = setup_basic_survey()
+    url = f"/survey/{survey.id}"
+
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert not etag.startswith("W/")
+
+    rv = client.get(url, headers={"If-None-Match": etag})
+    assert rv.status_code == 304
+    assert rv.data == b""
+
+    # изменение схемы опроса даёт новую страницу и новый ETag
+    db.session.add(models.Question(text="Another?", type="text", survey_id=survey.id))
+    bump_schema_version(survey.id)
+    db.session.commit()
+
+    rv = client.get(url, headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert rv.headers["ETag"] != etag
+    assert b"Another?" in rv.data
+
+
+def test_survey_display_redirects_after_answer(app, client, db_session, monkeypatch):
+    monkeypatch.setitem(app.config, "ALLOW_MULTIPLE_RESPONSES", False)
+    survey = setup_basic_survey()
+    url = f"/survey/{survey.id}"
+    etag = client.get(url).headers["ETag"]
+
+    client.post(url, data={f"question_{survey.questions.first().id}": "10"})
+
+    rv = client.get(url, headers={"If-None-Match": etag})
+    assert rv.status_code == 302
+
+
+def test_index_splits_available_and_completed(client, db_session):
+    done = models.Survey(title="Done survey", is_active=True)
+    todo = models.Survey(title="Todo survey", is_active=True)
+    hidden = models.Survey(title="Hidden survey", is_active=False)
+    db.session.add_all([done, todo, hidden])
+    db.session.commit()
+    db.session.add(models.Response(survey_id=done.id, ip_address="10.1.1.1"))
+    db.session.add(models.Response(survey_id=todo.id, ip_address="10.9.9.9"))
+    db.session.commit()
+    invalidate_active_surveys()
+
+    html = client.get("/", environ_base={"REMOTE_ADDR": "10.1.1.1"}).get_data(as_text=True)
+    available, completed = html.split("Пройденные опросы")
+
+    assert "Todo survey" in available and "Done survey" not in available
+    assert "Done survey" in completed and "Todo survey" not in completed
+    assert "Hidden survey" not in html
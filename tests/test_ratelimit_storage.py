@@ -0,0 +1,95 @@
+import multiprocessing
+import time
+
+import pytest
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from ratelimit_storage import SharedMemoryStorage, SLOTS_PER_BUCKET
+
+
+@pytest.fixture
+def storage_uri(tmp_path):
+    return f"shm://{tmp_path}/ratelimit?buckets=16"
+
+
+def test_registered_scheme(storage_uri):
+    storage = storage_from_string(storage_uri)
+    assert isinstance(storage, SharedMemoryStorage)
+    assert storage.buckets == 16
+
+
+def test_incr_get_expiry_clear(storage_uri):
+    storage = SharedMemoryStorage(storage_uri)
+
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+    assert storage.incr("k", 60, amount=2) == 3
+    assert storage.get("k") == 3
+    assert time.time() < storage.get_expiry("k") <= time.time() + 60
+
+    storage.clear("k")
+    assert storage.get("k") == 0
+
+
+def test_mismatched_file_is_rejected_not_reinitialized(storage_uri, tmp_path):
+    storage = SharedMemoryStorage(storage_uri)
+    storage.incr("k", 60)
+    path = tmp_path / "ratelimit"
+    size = path.stat().st_size
+
+    with pytest.raises(ValueError, match="несовместимый файл лимитов"):
+        SharedMemoryStorage(f"shm://{path}?buckets=32")
+
+    assert path.stat().st_size == size
+    assert storage.get("k") == 1
+
+
+def test_expired_key_restarts(storage_uri):
+    storage = SharedMemoryStorage(storage_uri)
+    storage.incr("k", 0)
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+
+
+def test_memory_is_bounded_and_idle_keys_evicted(storage_uri, tmp_path):
+    storage = SharedMemoryStorage(storage_uri)
+    size = (tmp_path / "ratelimit").stat().st_size
+
+    for i in range(16 * SLOTS_PER_BUCKET * 4):
+        storage.incr(f"key-{i}", 60 + i)
+
+    assert (tmp_path / "ratelimit").stat().st_size == size
+    # свежие ключи на месте, самые «старые» вытеснены
+    assert storage.get(f"key-{16 * SLOTS_PER_BUCKET * 4 - 1}") == 1
+    assert sum(storage.get(f"key-{i}") for i in range(16 * SLOTS_PER_BUCKET)) < 16 * SLOTS_PER_BUCKET
+
+
+def _hammer(uri, count):
+    storage = SharedMemoryStorage(uri)
+    for _ in range(count):
+        storage.incr("shared", 60)
+
+
+def test_counters_shared_between_processes(storage_uri):
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_hammer, args=(storage_uri, 200)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert SharedMemoryStorage(storage_uri).get("shared") == 800
+
+
+def test_sliding_window_limiter(storage_uri):
+    limiter = SlidingWindowCounterRateLimiter(SharedMemoryStorage(storage_uri))
+    item = RateLimitItemPerMinute(5)
+
+    assert all(limiter.hit(item, "127.0.0.1") for _ in range(5))
+    assert not limiter.hit(item, "127.0.0.1")
+    # другой воркер видит тот же счётчик
+    other = SlidingWindowCounterRateLimiter(SharedMemoryStorage(storage_uri))
+    assert not other.hit(item, "127.0.0.1")
+    assert other.hit(item, "10.0.0.1")
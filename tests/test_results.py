@@ -0,0 +1,239 @@
+from sqlalchemy import event
+
+import models
+from extensions import db
+from app.results import numeric_summary, survey_results
+from app.submissions import save_response
+from app.schema_cache import bump_schema_version, get_compiled_survey
+
+
+API_TEST_TOKEN = "test-api-token"
+
+
+def setup_survey():
+    survey = models.Survey(title="Results", is_active=True)
+    single = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=single)
+    blue = models.Option(text="Blue", question=single)
+    multi = models.Question(text="Pets", type="multiple_choice", survey=survey)
+    cat = models.Option(text="Cat", question=multi)
+    dog = models.Option(text="Dog", question=multi)
+    number = models.Question(text="Age", type="number", survey=survey)
+    essay = models.Question(text="Story", type="long_text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+
+    answers = [
+        [(single, red, None), (multi, cat, None), (multi, dog, None), (number, None, "30"), (essay, None, "long one")],
+        [(single, red, None), (multi, cat, None), (number, None, "30"), (essay, None, "long two")],
+        [(single, blue, None), (number, None, "41"), (essay, None, "")],
+    ]
+    for items in answers:
+        save_response(
+            survey.id, None,
+            [(q.id, o.id if o else None, t) for q, o, t in items],
+            unique=False,
+        )
+    db.session.commit()
+    return survey
+
+
+def test_survey_results_blocks(db_session):
+    survey = setup_survey()
+    single, multi, number, essay = survey_results(get_compiled_survey(survey))
+
+    assert [(r["option_text"], r["count"], r["percent"]) for r in single["options_stats"]] == [
+        ("Red", 2, 66.67), ("Blue", 1, 33.33),
+    ]
+    assert [(r["option_text"], r["count"]) for r in multi["options_stats"]] == [("Cat", 2), ("Dog", 1)]
+    assert number["value_stats"] == [
+        {"value": "30", "count": 2, "percent": 66.67},
+        {"value": "41", "count": 1, "percent": 33.33},
+    ]
+    assert essay["value_stats"] == []
+    assert essay["text_count"] == 2
+
+
+def test_survey_results_query_count_is_fixed(db_session):
+    survey = setup_survey()
+    compiled = get_compiled_survey(survey)
+
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        survey_results(compiled)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+
+
+def test_api_results_include_multiple_choice_and_values(client, db_session):
+    survey = setup_survey()
+
+    rv = client.get(f"/api/surveys/{survey.id}/results?values=1", headers={"X-API-TOKEN": API_TEST_TOKEN})
+    single, multi, number, essay = rv.get_json()["questions"]
+
+    assert [o["count"] for o in multi["options"]] == [2, 1]
+    assert number["values"][0] == {"value": "30", "count": 2, "percent": 66.67}
+    assert essay["text_answers_count"] == 2
+    assert "values" not in single
+
+
+def test_admin_results_page(admin_client, db_session):
+    survey = setup_survey()
+
+    rv = admin_client.get(f"/admin/surveys/{survey.id}/results")
+    html = rv.get_data(as_text=True)
+
+    assert rv.status_code == 200
+    assert "Cat" in html and "long two" in html and "41" in html
+
+
+def test_admin_results_etag_depends_on_session(admin_client, db_session):
+    from app.admins import ensure_admin
+
+    survey = setup_survey()
+    url = f"/admin/surveys/{survey.id}/results"
+    first = admin_client.get(url)
+    etag = first.headers["ETag"]
+
+    assert etag.startswith("W/")
+    assert "private" in first.headers["Cache-Control"]
+    assert admin_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # те же результаты, но вошёл другой админ — страница другая, не 304
+    ensure_admin("editor", "secret")
+    db.session.commit()
+    admin_client.post("/admin/login", data={"username": "editor", "password": "secret"})
+    rv = admin_client.get(url, headers={"If-None-Match": etag})
+    assert rv.status_code == 200
+    assert "editor" in rv.get_data(as_text=True)
+
+
+def test_api_results_etag_and_invalidation(client, db_session):
+    survey = setup_survey()
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+    url = f"/api/surveys/{survey.id}/results"
+
+    first = client.get(url, headers=headers)
+    etag = first.headers["ETag"].strip('"')
+    assert first.get_json()["responses_count"] == 3
+
+    rv = client.get(url, headers={**headers, "If-None-Match": f'"{etag}"'})
+    assert rv.status_code == 304
+
+    save_response(survey.id, None, [], unique=False)
+    db.session.commit()
+
+    rv = client.get(url, headers={**headers, "If-None-Match": f'"{etag}"'})
+    assert rv.status_code == 200
+    assert rv.get_json()["responses_count"] == 4
+
+
+def test_results_stale_window_keeps_cached_payload(app, client, db_session):
+    survey = setup_survey()
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+    url = f"/api/surveys/{survey.id}/results"
+
+    stale, app.config["RESULTS_CACHE_STALE_SECONDS"] = app.config["RESULTS_CACHE_STALE_SECONDS"], 60
+    try:
+        client.get(url, headers=headers)
+        save_response(survey.id, None, [], unique=False)
+        db.session.commit()
+        assert client.get(url, headers=headers).get_json()["responses_count"] == 3
+
+        # изменение схемы окно не переживает
+        bump_schema_version(survey.id)
+        db.session.commit()
+        db.session.refresh(survey)
+        assert client.get(url, headers=headers).get_json()["responses_count"] == 4
+    finally:
+        app.config["RESULTS_CACHE_STALE_SECONDS"] = stale
+
+
+def test_numeric_summary_weights_distinct_values():
+    stats = numeric_summary("number", [("30", 2), ("41", 1), ("1,5", 1), ("abc", 3)], [50, 90], 2)
+
+    assert stats["count"] == 4 and stats["invalid"] == 3
+    assert (stats["min"], stats["max"]) == (1.5, 41)
+    assert stats["mean"] == 25.625
+    assert stats["percentiles"] == {"p50": 30.0, "p90": 37.7}
+    assert [b["count"] for b in stats["histogram"]] == [1, 3]
+
+
+def test_numeric_summary_dates():
+    stats = numeric_summary("date", [("2024-01-01", 1), ("2024-01-11", 1)], [50], 10)
+
+    assert stats["min"] == "2024-01-01"
+    assert stats["percentiles"]["p50"] == "2024-01-06"
+    assert stats["stddev"] == 5.0
+
+
+def test_api_results_numeric_summary_without_values(client, db_session):
+    survey = setup_survey()
+
+    rv = client.get(f"/api/surveys/{survey.id}/results", headers={"X-API-TOKEN": API_TEST_TOKEN})
+    number = rv.get_json()["questions"][2]
+
+    assert "values" not in number
+    assert number["numeric"]["count"] == 3
+    assert number["numeric"]["max"] == 41
+
+
+def test_api_crosstab(client, db_session):
+    survey = setup_survey()
+    single, multi, number, essay = get_compiled_survey(survey).questions
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+
+    rv = client.get(f"/api/surveys/{survey.id}/crosstab?rows={single.id}&cols={number.id}", headers=headers)
+    table = rv.get_json()
+
+    assert rv.status_code == 200
+    assert [r["label"] for r in table["rows"]] == ["Red", "Blue"]
+    assert [c["label"] for c in table["cols"]] == ["30", "41"]
+    assert table["counts"] == [[2, 0], [0, 1]]
+    assert table["row_percent"] == [[100.0, 0.0], [0.0, 100.0]]
+    assert (table["total"], table["dof"], table["chi_square"]) == (3, 1, 3.0)
+
+    rv = client.get(f"/api/surveys/{survey.id}/crosstab?rows={single.id}&cols={essay.id}", headers=headers)
+    assert rv.status_code == 400
+
+
+def test_api_crosstab_ignores_text_answers_on_choice_axis(client, db_session):
+    survey = setup_survey()
+    single, multi, number, essay = get_compiled_survey(survey).questions
+    # свободный текст в multiple_choice: через JSON API или после смены типа вопроса
+    red = single.options[0]
+    save_response(survey.id, None, [(single.id, red.id, None), (multi.id, None, "Hamster")], unique=False)
+    db.session.commit()
+
+    rv = client.get(
+        f"/api/surveys/{survey.id}/crosstab?rows={multi.id}&cols={single.id}",
+        headers={"X-API-TOKEN": API_TEST_TOKEN},
+    )
+    table = rv.get_json()
+
+    assert rv.status_code == 200
+    assert [r["label"] for r in table["rows"]] == ["Cat", "Dog"]
+    assert table["counts"] == [[2, 0], [1, 0]]
+
+
+def test_api_crosstab_rejects_too_many_free_values(app, client, db_session):
+    survey = setup_survey()
+    single, multi, number, essay = get_compiled_survey(survey).questions
+    url = f"/api/surveys/{survey.id}/crosstab?rows={single.id}&cols={number.id}"
+
+    # у Age два разных значения (30 и 41)
+    previous, app.config["CROSSTAB_MAX_VALUES"] = app.config["CROSSTAB_MAX_VALUES"], 1
+    try:
+        rv = client.get(url, headers={"X-API-TOKEN": API_TEST_TOKEN})
+    finally:
+        app.config["CROSSTAB_MAX_VALUES"] = previous
+
+    assert rv.status_code == 400
+    assert rv.get_json()["error"] == "axis_too_wide"
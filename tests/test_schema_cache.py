@@ -0,0 +1,65 @@
+from sqlalchemy import event
+
+import models
+from extensions import db
+from app.schema_cache import bump_schema_version, get_compiled_survey
+
+
+def setup_survey():
+    survey = models.Survey(title="Cached", is_active=True)
+    q = models.Question(text="Pick one", type="single_choice", survey=survey)
+    models.Option(text="Red", question=q)
+    models.Option(text="Blue", question=q)
+    db.session.add(survey)
+    db.session.commit()
+    return survey
+
+
+def test_compiled_survey_structure(db_session):
+    survey = setup_survey()
+    compiled = get_compiled_survey(survey)
+
+    assert compiled.version == 1
+    assert [q.text for q in compiled.questions] == ["Pick one"]
+    assert [o.text for o in compiled.questions[0].options] == ["Red", "Blue"]
+
+    q_type, option_ids = compiled.answer_schema[compiled.questions[0].id]
+    assert q_type == "single_choice"
+    assert option_ids == {o.id for o in compiled.questions[0].options}
+
+
+def test_fill_page_needs_no_schema_queries_when_cached(client, db_session):
+    survey = setup_survey()
+    url = f"/survey/{survey.id}"
+    client.get(url)
+
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        rv = client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert rv.status_code == 200
+    assert "Blue" in rv.get_data(as_text=True)
+    # только строка самого опроса
+    assert len(statements) == 1
+    assert "question" not in statements[0]
+
+
+def test_bump_schema_version_invalidates(client, db_session):
+    survey = setup_survey()
+    url = f"/survey/{survey.id}"
+    client.get(url)
+
+    q = models.Question(text="New question", type="text", survey_id=survey.id)
+    db.session.add(q)
+    bump_schema_version(survey.id)
+    db.session.commit()
+
+    assert survey.schema_version == 2
+    assert "New question" in client.get(url).get_data(as_text=True)
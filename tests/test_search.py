@@ -0,0 +1,93 @@
+import pytest
+
+import models
+from extensions import db
+from app.schema_cache import get_compiled_survey
+from app.search import search_answers
+from app.submissions import save_response
+
+
+API_TEST_TOKEN = "test-api-token"
+
+
+@pytest.fixture(params=["postgres", "memory"])
+def backend(app, request):
+    previous = app.config["TEXT_SEARCH_BACKEND"]
+    app.config["TEXT_SEARCH_BACKEND"] = request.param
+    yield request.param
+    app.config["TEXT_SEARCH_BACKEND"] = previous
+
+
+def setup_survey():
+    survey = models.Survey(title="Feedback", is_active=True)
+    why = models.Question(text="Почему?", type="long_text", survey=survey)
+    name = models.Question(text="Имя", type="text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+
+    for story, who in [
+        ("доставка быстрая доставка", "Анна"),
+        ("быстрая поддержка", "доставка"),
+        ("медленно и дорого", "Олег"),
+    ]:
+        save_response(survey.id, None, [(why.id, None, story), (name.id, None, who)], unique=False)
+    db.session.commit()
+    return survey, why
+
+
+def test_search_ranks_and_scopes_by_question(backend, db_session):
+    survey, why = setup_survey()
+    compiled = get_compiled_survey(survey)
+
+    hits = search_answers(compiled, "доставка")
+    assert [h["text"] for h in hits][0] == "доставка быстрая доставка"
+    assert len(hits) == 2
+
+    assert [h["text"] for h in search_answers(compiled, "доставка", question_id=why.id)] == [
+        "доставка быстрая доставка",
+    ]
+    assert search_answers(compiled, "быстрая поддержка")[0]["text"] == "быстрая поддержка"
+    assert search_answers(compiled, "самолёт") == []
+
+
+def test_memory_index_picks_up_new_answers(app, db_session):
+    previous, app.config["TEXT_SEARCH_BACKEND"] = app.config["TEXT_SEARCH_BACKEND"], "memory"
+    try:
+        survey, why = setup_survey()
+        compiled = get_compiled_survey(survey)
+        assert len(search_answers(compiled, "дорого")) == 1
+
+        save_response(survey.id, None, [(why.id, None, "очень дорого")], unique=False)
+        db.session.commit()
+        assert len(search_answers(compiled, "дорого")) == 2
+    finally:
+        app.config["TEXT_SEARCH_BACKEND"] = previous
+
+
+def test_api_search(client, db_session):
+    survey, why = setup_survey()
+    headers = {"X-API-TOKEN": API_TEST_TOKEN}
+
+    rv = client.get(f"/api/surveys/{survey.id}/search?q=поддержка", headers=headers)
+    assert [i["text"] for i in rv.get_json()["items"]] == ["быстрая поддержка"]
+
+    assert client.get(f"/api/surveys/{survey.id}/search", headers=headers).status_code == 400
+
+
+def test_admin_search_page(admin_client, db_session):
+    survey, why = setup_survey()
+
+    html = admin_client.get(f"/admin/surveys/{survey.id}/search?q=дорого").get_data(as_text=True)
+
+    assert "медленно и дорого" in html and "быстрая поддержка" not in html
+
+
+def test_admin_search_honors_max_results(app, admin_client, db_session):
+    survey, why = setup_survey()
+    previous, app.config["SEARCH_MAX_RESULTS"] = app.config["SEARCH_MAX_RESULTS"], 1
+    try:
+        html = admin_client.get(f"/admin/surveys/{survey.id}/search?q=доставка").get_data(as_text=True)
+    finally:
+        app.config["SEARCH_MAX_RESULTS"] = previous
+
+    assert "доставка быстрая доставка" in html and "быстрая поддержка" not in html
@@ -0,0 +1,113 @@
+import json
+
+from sqlalchemy import event, select
+
+import models
+from extensions import db
+from app.schema_cache import get_compiled_survey
+
+
+API_HEADERS = {"X-API-Token": "test-api-token"}
+
+DEFINITION = {
+    "title": "Imported",
+    "description": "From JSON",
+    "questions": [
+        {"text": "Color?", "type": "single_choice", "options": ["Red", {"text": "Blue"}]},
+        {"text": "Pets?", "type": "multiple_choice", "options": ["Cat", "Dog", "Fish"]},
+        {"text": "Why?", "type": "long_text"},
+    ],
+}
+
+
+def tree(survey_id):
+    compiled = get_compiled_survey(db.session.get(models.Survey, survey_id))
+    return [(q.text, q.type, [o.text for o in q.options]) for q in compiled.questions]
+
+
+def test_api_import_inserts_whole_definition_in_bulk(app, client, db_session):
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        response = client.post("/api/surveys:import", json=DEFINITION, headers=API_HEADERS)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    assert response.status_code == 201
+    survey_id = response.get_json()["id"]
+    survey = db.session.get(models.Survey, survey_id)
+    assert (survey.title, survey.description, survey.is_active) == ("Imported", "From JSON", False)
+    assert tree(survey_id) == [
+        ("Color?", "single_choice", ["Red", "Blue"]),
+        ("Pets?", "multiple_choice", ["Cat", "Dog", "Fish"]),
+        ("Why?", "long_text", []),
+    ]
+    # по одному INSERT на таблицу, сколько бы ни было вопросов и вариантов
+    inserts = [s.split("(")[0].strip() for s in statements if s.startswith("INSERT")]
+    assert inserts == ["INSERT INTO survey", "INSERT INTO question", "INSERT INTO option"]
+
+
+def test_api_survey_detail_reimports_losslessly(client, db_session):
+    source_id = client.post("/api/surveys:import", json=DEFINITION, headers=API_HEADERS).get_json()["id"]
+    db.session.get(models.Survey, source_id).is_active = True
+    db.session.commit()
+
+    detail = client.get(f"/api/surveys/{source_id}", headers=API_HEADERS).get_json()
+    response = client.post("/api/surveys:import", json=detail, headers=API_HEADERS)
+
+    assert response.status_code == 201
+    assert tree(response.get_json()["id"]) == tree(source_id)
+
+
+def test_api_import_rejects_invalid_definition(client, db_session):
+    bad = dict(DEFINITION, questions=[{"text": "Why?", "type": "essay"}])
+    response = client.post("/api/surveys:import", json=bad, headers=API_HEADERS)
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "invalid_definition"
+    assert "essay" in response.get_json()["detail"]
+
+    # вопрос с вариантами без вариантов — неответимый, не создаём
+    lossy = dict(DEFINITION, questions=[{"text": "Pets?", "type": "multiple_choice", "options": []}])
+    response = client.post("/api/surveys:import", json=lossy, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert "вариант" in response.get_json()["detail"]
+
+    # не-bool is_active не должен опубликовать опрос
+    for value in ("false", "0", [0]):
+        response = client.post("/api/surveys:import", json=dict(DEFINITION, is_active=value), headers=API_HEADERS)
+        assert response.status_code == 400
+        assert "is_active" in response.get_json()["detail"]
+    assert db.session.scalar(select(models.Survey.id)) is None
+
+
+def test_clone_copies_questions_and_options_server_side(app, client, db_session):
+    source_id = client.post("/api/surveys:import", json=DEFINITION, headers=API_HEADERS).get_json()["id"]
+
+    response = client.post(f"/api/surveys/{source_id}:clone", json={"title": "Copy"}, headers=API_HEADERS)
+    assert response.status_code == 201
+    clone_id = response.get_json()["id"]
+
+    assert db.session.get(models.Survey, clone_id).title == "Copy"
+    assert tree(clone_id) == tree(source_id)
+    source_ids = {q.id for q in get_compiled_survey(db.session.get(models.Survey, source_id)).questions}
+    clone_ids = {q.id for q in get_compiled_survey(db.session.get(models.Survey, clone_id)).questions}
+    assert not source_ids & clone_ids
+
+    assert client.post("/api/surveys/999999:clone", headers=API_HEADERS).status_code == 404
+
+
+def test_admin_import_and_clone(admin_client, db_session):
+
+    html = admin_client.post("/admin/surveys/import", data={"definition": "{not json"}).get_data(as_text=True)
+    assert "Описание не принято" in html
+
+    response = admin_client.post("/admin/surveys/import", data={"definition": json.dumps(DEFINITION)})
+    assert response.status_code == 302
+    source = models.Survey.query.filter_by(title="Imported").one()
+
+    response = admin_client.post(f"/admin/surveys/{source.id}/clone")
+    assert response.status_code == 302
+    clone = models.Survey.query.filter_by(title="Imported (копия)").one()
+    assert tree(clone.id) == tree(source.id)
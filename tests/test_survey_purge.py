@@ -0,0 +1,122 @@
+import threading
+
+from sqlalchemy import event, func, select
+
+import models
+from extensions import db
+from app import survey_purge
+from app.submissions import save_response
+from app.survey_purge import mark_deleted, purge_status
+
+
+def setup_survey(responses=5):
+    survey = models.Survey(title="Purge", is_active=True)
+    color = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=color)
+    story = models.Question(text="Story", type="text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+    for i in range(responses):
+        save_response(survey.id, None, [(color.id, red.id, None), (story.id, None, f"s{i}")], unique=False)
+    db.session.commit()
+    return survey
+
+
+def count(model):
+    return db.session.scalar(select(func.count()).select_from(model))
+
+
+def test_admin_delete_hides_survey_and_purges_in_background(app, admin_client, db_session):
+    survey = setup_survey()
+    survey_id = survey.id
+    kept = setup_survey(responses=1)
+
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        response = admin_client.post(f"/admin/surveys/{survey_id}/delete")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert response.status_code == 302
+
+    # запрос ответы не читает — только помечает опрос
+    assert not [s for s in statements if "FROM response" in s or "FROM answer" in s]
+
+    # опрос скрыт сразу, ещё до конца удаления
+    assert admin_client.get(f"/survey/{survey_id}").status_code == 404
+    assert admin_client.get(f"/api/surveys/{survey_id}/results", headers={"X-API-Token": "test-api-token"}).status_code == 404
+    assert admin_client.get(f"/admin/surveys/{survey_id}/results").status_code == 404
+
+    for thread in threading.enumerate():
+        if thread.name == f"survey-purge-{survey_id}":
+            thread.join(timeout=10)
+
+    db.session.expire_all()
+    assert db.session.get(models.Survey, survey_id) is None
+    assert admin_client.get(f"/admin/surveys/{survey_id}/delete/status").get_json() == {"status": "deleted"}
+    # остался только второй опрос — с ответами, вопросами и счётчиками
+    assert count(models.Response) == 1
+    assert count(models.Answer) == 2
+    assert count(models.Question) == 2
+    assert db.session.scalar(select(models.SurveyTally.survey_id)) == kept.id
+
+
+def test_purge_in_chunks_reports_progress_and_resumes_from_cli(app, db_session, monkeypatch):
+    survey = setup_survey(responses=5)
+    survey_id = survey.id
+    mark_deleted(survey)
+    db.session.commit()
+    assert purge_status(survey_id) == {"status": "deleting", "purged_responses": 0, "total_responses": 5}
+
+    # воркер «упал» после первой порции
+    monkeypatch.setattr(survey_purge, "PURGE_CHUNK_SIZE", 2)
+    real_commit = db.session.commit
+
+    def crash_after_first_chunk():
+        real_commit()
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(db.session, "commit", crash_after_first_chunk)
+    try:
+        survey_purge.purge_survey(survey_id)
+    except RuntimeError:
+        pass
+    monkeypatch.undo()
+
+    assert purge_status(survey_id) == {"status": "deleting", "purged_responses": 2, "total_responses": 5}
+    assert count(models.Response) == 3
+
+    monkeypatch.setattr(survey_purge, "PURGE_CHUNK_SIZE", 2)
+    result = app.test_cli_runner().invoke(args=["surveys", "purge"])
+    assert result.exit_code == 0, result.output
+    assert f"Опрос {survey_id}: удалено респондентов 3" in result.output
+
+    assert purge_status(survey_id) == {"status": "deleted"}
+    assert count(models.Response) == 0
+    assert count(models.Answer) == 0
+    assert count(models.Option) == 0
+
+
+def test_worker_resumes_interrupted_purge_after_restart(app, client, db_session, monkeypatch):
+    survey = setup_survey(responses=3)
+    survey_id = survey.id
+    mark_deleted(survey)
+    db.session.commit()
+
+    # пока опрос удаляет другой процесс, второй его не трогает
+    with survey_purge._purge_lock(survey_id) as locked:
+        assert locked
+        assert survey_purge.purge_survey(survey_id) is None
+
+    # «новый» воркер: доудаление запускает его первый запрос
+    monkeypatch.setitem(app.config, "SURVEY_PURGE_RESUME", True)
+    monkeypatch.setattr(survey_purge, "_resumed_in", None)
+    client.get("/")
+    for thread in threading.enumerate():
+        if thread.name == "survey-purge-resume":
+            thread.join(timeout=10)
+
+    db.session.expire_all()
+    assert purge_status(survey_id) == {"status": "deleted"}
+    assert count(models.Response) == 0
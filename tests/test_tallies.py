@@ -0,0 +1,104 @@
+from sqlalchemy import select
+
+import models
+from extensions import db
+from app.results import survey_results, response_stats
+from app.schema_cache import get_compiled_survey
+from app.submissions import make_record, save_response, save_responses
+from app.tallies import rebuild_tallies
+
+
+def setup_survey():
+    survey = models.Survey(title="Tallies", is_active=True)
+    single = models.Question(text="Color", type="single_choice", survey=survey)
+    red = models.Option(text="Red", question=single)
+    blue = models.Option(text="Blue", question=single)
+    number = models.Question(text="Age", type="number", survey=survey)
+    essay = models.Question(text="Story", type="long_text", survey=survey)
+    db.session.add(survey)
+    db.session.commit()
+    return survey, (single, red, blue, number, essay)
+
+
+def tally_rows():
+    return {
+        "survey": db.session.execute(
+            select(models.SurveyTally.survey_id, models.SurveyTally.response_count)
+        ).all(),
+        "options": db.session.execute(
+            select(models.OptionTally.option_id, models.OptionTally.answer_count)
+        ).all(),
+    }
+
+
+def stats(survey):
+    return [
+        (b["options_stats"], b["value_stats"], b["text_count"])
+        for b in survey_results(get_compiled_survey(survey))
+    ]
+
+
+def test_submissions_update_tallies_in_same_transaction(app, db_session):
+    survey, (single, red, blue, number, essay) = setup_survey()
+
+    save_response(survey.id, None, [(single.id, red.id, None), (number.id, None, "7")], unique=False)
+    save_responses([
+        make_record(survey.id, None, [(single.id, red.id, None), (essay.id, None, "a")], unique=False),
+        make_record(survey.id, None, [(single.id, blue.id, None), (number.id, None, "7")], unique=False),
+    ])
+    db.session.rollback()
+
+    # откат записи ответов откатывает и счётчики
+    assert tally_rows() == {"survey": [], "options": []}
+
+    save_response(survey.id, None, [(single.id, red.id, None), (number.id, None, "7")], unique=False)
+    save_responses([
+        make_record(survey.id, None, [(single.id, red.id, None), (essay.id, None, "a")], unique=False),
+        make_record(survey.id, None, [(single.id, blue.id, None), (number.id, None, "7")], unique=False),
+    ])
+    db.session.commit()
+
+    count, last_id, _ = response_stats(survey.id)
+    assert count == 3
+    assert last_id == db.session.scalar(select(db.func.max(models.Response.id)))
+
+    single_stats, number_stats, essay_stats = stats(survey)
+    assert [o["count"] for o in single_stats[0]] == [2, 1]
+    assert number_stats[1] == [{"value": "7", "count": 2, "percent": 100.0}]
+    assert essay_stats[2] == 1
+
+
+def test_rebuild_matches_live_tallies(app, db_session):
+    shards, app.config["TALLY_SHARDS"] = app.config["TALLY_SHARDS"], 4
+    try:
+        survey, (single, red, blue, number, essay) = setup_survey()
+        for i in range(20):
+            save_response(survey.id, None, [
+                (single.id, red.id if i % 3 else blue.id, None),
+                (number.id, None, str(i % 4)),
+                (essay.id, None, f"story {i}"),
+            ], unique=False)
+            db.session.commit()
+    finally:
+        app.config["TALLY_SHARDS"] = shards
+
+    live = stats(survey)
+    rebuild_tallies(survey.id)
+    db.session.commit()
+
+    assert stats(survey) == live
+    assert response_stats(survey.id)[0] == 20
+
+
+def test_rebuild_cli_restores_tallies(app, db_session):
+    survey, (single, red, blue, number, essay) = setup_survey()
+    r = models.Response(survey_id=survey.id)
+    db.session.add(r)
+    db.session.flush()
+    db.session.add(models.Answer(response_id=r.id, question_id=single.id, option_id=red.id))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["tallies", "rebuild", "--survey-id", str(survey.id)])
+
+    assert result.exit_code == 0
+    assert tally_rows() == {"survey": [(survey.id, 1)], "options": [(red.id, 1)]}